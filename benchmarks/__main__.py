@@ -0,0 +1,53 @@
+"""
+Benchmark suite of the lexer, parser and evaluator.
+
+Run from the repository root with ``python -m benchmarks``, save a
+baseline with ``--output baseline.json`` and fail on regressions with
+``--baseline baseline.json --threshold 0.1``.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.corpora import CORPORA
+from benchmarks.suite import STAGES, compare, run_suite
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Interpreter benchmark suite")
+    parser.add_argument("--corpus", action="append", choices=list(CORPORA),
+                        help="corpus to run, may be repeated (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of the corpus sizes")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the corpus generators")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage, the fastest is kept")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="tolerated relative slowdown against the baseline (default: 0.1)")
+    args = parser.parse_args()
+
+    results = run_suite(args.corpus, args.scale, args.seed, args.repeat)
+
+    print(f"{'corpus':<10}" + "".join(f"{stage + ' ms':>12}" for stage in STAGES) + f"{'peak KiB':>12}")
+    for corpus, measurements in results["results"].items():
+        print(f"{corpus:<10}"
+              + "".join(f"{measurements[stage] * 1000:12.2f}" for stage in STAGES)
+              + f"{measurements['peak_memory'] / 1024:12.0f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
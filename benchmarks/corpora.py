@@ -0,0 +1,90 @@
+"""
+Seeded generators of benchmark corpora. The same seed and size always
+give the same expressions, so timings of different revisions compare
+like with like.
+"""
+import random
+
+from typing import Callable, Dict, List
+
+
+def _number(rng: random.Random, decimals: int = 2) -> str:
+    if rng.random() < 0.5:
+        return str(rng.randint(1, 999))
+    return f"{rng.uniform(1, 1000):.{decimals}f}"
+
+
+def short_formulas(rng: random.Random, size: int) -> List[str]:
+    """Many small formulas with mixed operators and parentheses"""
+    formulas = []
+    for _ in range(size):
+        a, b, c, d = (_number(rng) for _ in range(4))
+        op_1, op_2 = rng.choice("+-*/"), rng.choice("+-*/")
+        formulas.append(f"({a} {op_1} {b}) {op_2} {c} - {d} % 7")
+    return formulas
+
+
+def flat_sums(rng: random.Random, size: int) -> List[str]:
+    """One long chain of additions and subtractions of size terms"""
+    terms = [_number(rng)]
+    for _ in range(size - 1):
+        terms.append(rng.choice("+-"))
+        terms.append(_number(rng))
+    return [" ".join(terms)]
+
+
+def nested_parens(rng: random.Random, size: int) -> List[str]:
+    """A single operand wrapped in size levels of parentheses"""
+    inner = f"{_number(rng)} * {_number(rng)}"
+    return ["(" * size + inner + ")" * size]
+
+
+def unary_chains(rng: random.Random, size: int) -> List[str]:
+    """Operands preceded by long runs of unary signs"""
+    chains = []
+    for _ in range(max(size // 100, 1)):
+        signs = "".join(rng.choice("+-") for _ in range(100))
+        chains.append(f"{signs}{_number(rng)}")
+    return [" * ".join(chains)]
+
+
+def exponents(rng: random.Random, size: int) -> List[str]:
+    """Formulas dominated by powers, including fractional and negative ones"""
+    formulas = []
+    for _ in range(size):
+        base = rng.randint(2, 50)
+        exponent = rng.choice(["2", "3", "0.5", "-1", "1.5", "(1/3)"])
+        formulas.append(f"{base} ^ {exponent} ^ {rng.choice(['1', '2'])} + {_number(rng)} ^ 2")
+    return formulas
+
+
+def decimals(rng: random.Random, size: int) -> List[str]:
+    """Formulas over long decimal literals that exercise full precision"""
+    formulas = []
+    for _ in range(size):
+        a, b, c = (_number(rng, decimals=20) for _ in range(3))
+        formulas.append(f"{a} * {b} / {c} - {a}")
+    return formulas
+
+
+CORPORA: Dict[str, Callable[[random.Random, int], List[str]]] = {
+    "short": short_formulas,
+    "flat": flat_sums,
+    "nested": nested_parens,
+    "unary": unary_chains,
+    "exponent": exponents,
+    "decimal": decimals,
+}
+
+
+def generate(name: str, size: int, seed: int = 0) -> List[str]:
+    """
+    Generate a corpus
+
+    :param name: name of the corpus, a key of CORPORA
+    :param size: number of formulas, or of terms for single
+     expression corpora such as flat sums and nested parentheses
+    :param seed: seed of the generator
+    :return: expressions of the corpus
+    """
+    return CORPORA[name](random.Random(f"{name}:{seed}"), size)
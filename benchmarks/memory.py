@@ -0,0 +1,45 @@
+"""
+Memory used by parsed expressions, reported in bytes per tree node.
+
+Run from the repository root with ``python -m benchmarks.memory``.
+"""
+import argparse
+import tracemalloc
+
+from expr_calc.calc import Calc
+
+
+def bytes_per_node(program: str) -> float:
+    """
+    Lex and parse program with tracing enabled and divide the memory
+    still held by the tree, including its tokens, by its number of nodes
+
+    :param program: expression to be parsed
+    :return: average number of bytes allocated per node
+    """
+    calc: Calc = Calc(cache_size=0)
+
+    tracemalloc.start()
+    tree = calc._parse(calc.lexer.scan(program))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return size / len(tree.traverse())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tree memory benchmark")
+    parser.add_argument("--terms", type=int, default=100_000, help="number of terms per expression")
+    args = parser.parse_args()
+
+    corpora = {
+        "flat sum": "1+" * (args.terms - 1) + "1",
+        "mixed operators": "(2.5*x-3)/y^2+" * (args.terms // 5) + "1",
+        "unary chain": "-" * args.terms + "1",
+    }
+    for name, program in corpora.items():
+        print(f"{name:<16} {bytes_per_node(program):8.1f} bytes/node")
+
+
+if __name__ == "__main__":
+    main()
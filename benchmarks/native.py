@@ -0,0 +1,67 @@
+"""
+Time per call of Tree.eval, compiled Programs and native functions
+evaluating the same formulas.
+
+Run from the repository root with ``python -m benchmarks.native``.
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks.suite import best_time
+from expr_calc.calc import Calc
+
+from typing import Dict, List
+
+
+FORMULAS = [
+    "x * 2 + 1",
+    "(x + y) ^ 2 - (x + y) * 3 % 7",
+    "-(x - 1.25) * (y + 0.75) / (x * y + 2)",
+    "((x * 1.05 - y) * 1.05 - y) * 1.05 - y",
+]
+
+
+def bench_formula(formula: str, rows: List[Dict[str, Decimal]], repeat: int) -> Dict[str, float]:
+    """
+    Evaluate a formula over every row with each strategy
+
+    :param formula: expression over x and y
+    :param rows: values of x and y
+    :param repeat: number of runs, the fastest is kept
+    :return: microseconds per call of each strategy
+    """
+    calc: Calc = Calc()
+    tree = calc.parse(formula)
+    program = calc.compile(formula)
+    native = calc.compile_native(formula)
+    assert all(tree.eval(row) == program.run(row) == native(row) for row in rows)
+
+    timings = {
+        "Tree.eval": best_time(lambda: [tree.eval(row) for row in rows], repeat),
+        "Program.run": best_time(lambda: [program.run(row) for row in rows], repeat),
+        "native": best_time(lambda: [native(row) for row in rows], repeat),
+    }
+    return {name: elapsed / len(rows) * 1e6 for name, elapsed in timings.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Native compilation benchmark")
+    parser.add_argument("--rows", type=int, default=10_000, help="evaluations per formula")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the variable values")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = [{"x": Decimal(rng.randint(1, 10_000)) / 100, "y": Decimal(rng.randint(1, 10_000)) / 100}
+            for _ in range(args.rows)]
+
+    print(f"{'formula':<42}{'Tree.eval':>12}{'Program.run':>14}{'native':>10}{'speedup':>10}")
+    for formula in FORMULAS:
+        timings = bench_formula(formula, rows, args.repeat)
+        print(f"{formula:<42}{timings['Tree.eval']:10.2f}us{timings['Program.run']:12.2f}us"
+              f"{timings['native']:8.2f}us{timings['Tree.eval'] / timings['native']:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Cold-start time of one-shot evaluations, each run starts a fresh
+interpreter with ``python -m expr_calc -e``. The time over a bare
+``python -c pass`` is held to a budget, and the one-shot path must not
+import any of the modules that only other modes need.
+
+Run from the repository root with ``python -m benchmarks.startup``,
+exits with an error if the budget is exceeded. The budget holds for the
+fastest of 20 runs on an otherwise idle machine on which a bare CPython
+3.11 starts in about 15ms, and scales with the speed of the machine, so
+pass a larger ``--budget`` on slower ones. Timings are too noisy for the
+test suite, which only checks the modules that are imported.
+"""
+import argparse
+import compileall
+import os
+import subprocess
+import sys
+import time
+
+from typing import Dict, List
+
+
+ONE_SHOT = ["-m", "expr_calc", "-e", "(1 + 2) * 3.5 ^ 2 % 7"]
+BARE = ["-c", "pass"]
+
+# milliseconds a one-shot evaluation may add to the start of a bare interpreter
+STARTUP_BUDGET = 40.0
+
+# modules of other modes or of optional features, none is needed by -e,
+# which also evaluates without the optimiser
+NOT_IMPORTED = ("argparse", "dataclasses", "concurrent.futures", "multiprocessing", "asyncio",
+                "hashlib", "fractions", "numpy", "expr_calc.parallel", "expr_calc.store",
+                "expr_calc.server", "expr_calc.expression", "expr_calc.native", "expr_calc.vectorized",
+                "expr_calc.dag", "expr_calc.optimizer", "expr_calc.stats", "threading")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(args: List[str], *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *options, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def best_wall_time(args: List[str], runs: int) -> float:
+    """
+    Time fresh interpreters running args
+
+    :param args: arguments of the interpreter
+    :param runs: number of runs, the fastest is kept
+    :return: seconds of the fastest run
+    """
+    best = float("inf")
+    for _ in range(runs):
+        began = time.perf_counter()
+        run(args)
+        best = min(best, time.perf_counter() - began)
+    return best
+
+
+def import_times(args: List[str]) -> Dict[str, int]:
+    """
+    Imports of a fresh interpreter running args, from -X importtime
+
+    :param args: arguments of the interpreter
+    :return: cumulative microseconds of every imported module
+    """
+    times = {}
+    for line in run(args, "-X", "importtime").stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="One-shot cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="runs, the fastest is kept")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                        help=f"milliseconds allowed over a bare interpreter (default: {STARTUP_BUDGET})")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to show")
+    args = parser.parse_args()
+
+    # stale bytecode would be compiled on every start and skew the timings
+    compileall.compile_dir(os.path.join(ROOT, "expr_calc"), quiet=1)
+
+    bare = best_wall_time(BARE, args.runs) * 1000
+    one_shot = best_wall_time(ONE_SHOT, args.runs) * 1000
+    overhead = one_shot - bare
+    imports = import_times(ONE_SHOT)
+    unwanted = [name for name in NOT_IMPORTED if name in imports]
+
+    print(f"bare interpreter {bare:8.1f}ms")
+    print(f"one-shot -e      {one_shot:8.1f}ms")
+    print(f"overhead         {overhead:8.1f}ms (budget {args.budget:.1f}ms)")
+    print(f"slowest of {len(imports)} imports, cumulative:")
+    for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<36}{cumulative / 1000:8.1f}ms")
+
+    if unwanted:
+        print(f"one-shot path imports {', '.join(unwanted)}", file=sys.stderr)
+    if overhead > args.budget:
+        print(f"startup overhead of {overhead:.1f}ms exceeds the budget of {args.budget:.1f}ms", file=sys.stderr)
+    sys.exit(1 if unwanted or overhead > args.budget else 0)
+
+
+if __name__ == "__main__":
+    main()
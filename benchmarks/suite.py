@@ -0,0 +1,172 @@
+"""
+Per-stage timings and peak memory of the interpreter over the corpora
+of benchmarks.corpora, with comparison against a saved baseline.
+"""
+import gc
+import platform
+import time
+import tracemalloc
+
+from benchmarks.corpora import CORPORA, generate
+from expr_calc.calc import Calc
+from expr_calc.lexer import Lexer
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+# number of formulas, or of terms for single expression corpora, at scale 1
+SIZES = {
+    "short": 2_000,
+    "flat": 20_000,
+    "nested": 5_000,
+    "unary": 20_000,
+    "exponent": 1_000,
+    "decimal": 1_000,
+}
+
+STAGES = ("lex", "parse", "eval", "calc")
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Time func repeat times with the garbage collector disabled
+
+    :param func: function to be timed
+    :param repeat: number of runs
+    :return: fastest run in seconds, the least disturbed by noise
+    """
+    best = float("inf")
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            began = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - began)
+    finally:
+        if enabled:
+            gc.enable()
+    return best
+
+
+def peak_memory(func: Callable[[], Any]) -> int:
+    """
+    Peak memory allocated while running func
+
+    :param func: function to be measured
+    :return: peak of traced memory in bytes
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def stage_times(calc: Calc, expressions: Sequence[str], repeat: int = 5) -> Dict[str, float]:
+    """
+    Time the lex, parse and eval stages separately. Stages are fed the
+    output of the previous one, computed up front, so that each timing
+    only covers its own stage: Lexer.lex, Calc._parse over lexed tokens
+    and Tree.eval over parsed trees. The tokens and trees are released
+    when this returns
+
+    :param calc: calculator whose parser is timed
+    :param expressions: expressions of the corpus
+    :param repeat: number of runs of each stage, the fastest is kept
+    :return: seconds per stage
+    """
+    lexed = [Lexer(expression).lex() for expression in expressions]
+    trees = [calc._parse(tokens) for tokens in lexed]
+
+    def lex() -> None:
+        for expression in expressions:
+            Lexer(expression).lex()
+
+    def parse() -> None:
+        for tokens in lexed:
+            calc._parse(tokens)
+
+    def evaluate() -> None:
+        for tree in trees:
+            tree.eval()
+
+    return {
+        "lex": best_time(lex, repeat),
+        "parse": best_time(parse, repeat),
+        "eval": best_time(evaluate, repeat),
+    }
+
+
+def bench_corpus(expressions: Sequence[str], repeat: int = 5) -> Dict[str, float]:
+    """
+    Time each stage of the interpreter separately over a corpus with
+    stage_times. calc is the whole pipeline through Calc.eval without
+    caching, its peak memory is measured once the tokens and trees of
+    the stage timings are released
+
+    :param expressions: expressions of the corpus
+    :param repeat: number of runs of each stage, the fastest is kept
+    :return: seconds per stage and peak memory of the pipeline in bytes
+    """
+    calc: Calc = Calc(cache_size=0)
+
+    def pipeline() -> None:
+        for expression in expressions:
+            calc.program = expression
+            calc.eval()
+
+    results = stage_times(calc, expressions, repeat)
+    results["calc"] = best_time(pipeline, repeat)
+    results["peak_memory"] = peak_memory(pipeline)
+    return results
+
+
+def run_suite(corpora: Optional[Sequence[str]] = None, scale: float = 1.0,
+              seed: int = 0, repeat: int = 5) -> Dict[str, Any]:
+    """
+    Benchmark every corpus
+
+    :param corpora: names of the corpora to run, all of them if not given
+    :param scale: multiplier of the corpus sizes in SIZES
+    :param seed: seed of the corpus generators
+    :param repeat: number of runs of each stage
+    :return: JSON serialisable results with the settings they were run with
+    """
+    corpora = corpora or list(CORPORA)
+    results = {}
+    for name in corpora:
+        expressions = generate(name, max(int(SIZES[name] * scale), 1), seed)
+        results[name] = bench_corpus(expressions, repeat)
+
+    return {
+        "settings": {"scale": scale, "seed": seed, "repeat": repeat},
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.1) -> List[str]:
+    """
+    Find the measurements that got worse than the baseline by more than
+    threshold. Only corpora and stages present in both are compared
+
+    :param current: results of run_suite
+    :param baseline: saved results of an earlier run_suite
+    :param threshold: tolerated relative slowdown, 0.1 allows 10%
+    :return: description of every regression, empty if there are none
+    """
+    if current["settings"] != baseline["settings"]:
+        raise ValueError(f"Baseline was run with {baseline['settings']}, "
+                         f"not {current['settings']}")
+
+    regressions = []
+    for corpus, measurements in current["results"].items():
+        base = baseline["results"].get(corpus, {})
+        for metric, value in measurements.items():
+            if metric in base and value > base[metric] * (1 + threshold):
+                change = value / base[metric] - 1 if base[metric] else float("inf")
+                regressions.append(f"{corpus} {metric}: {base[metric]:.6g} -> {value:.6g} (+{change:.1%})")
+    return regressions
@@ -1,17 +1,161 @@
-from expr_calc.calc import Calc
-import argparse
+import sys
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Interpreter flags")
+from typing import List, Optional
+
+# modules are imported where they are needed, so that scripts calling
+# python -m expr_calc -e "..." only load the calculator itself, and never
+# argparse or the batch, parallel and store modules
+
+
+def evaluate_once(expression: str, backend: str = "decimal", precision: Optional[int] = None,
+                  postfix: bool = False) -> int:
+    """
+    Evaluate a single expression, print its result and return an exit status
+
+    :param expression: expression to be evaluated
+    :param backend: name of the numeric backend
+    :param precision: digits of precision of the decimal backend
+    :param postfix: the expression is a postfix program
+    :return: 0 on success, 1 if the expression failed
+    """
+    from expr_calc.calc import Calc
+    from expr_calc.batch import EXPRESSION_ERRORS, error_message
+
+    # the expression only has constants, folding them is the evaluation
+    # itself, so the optimiser is not even imported
+    calculator: Calc = Calc(expression, cache_size=0, optimize=False, backend=backend, precision=precision)
+    try:
+        print(calculator.eval_postfix() if postfix else calculator.eval())
+    except EXPRESSION_ERRORS as error:
+        print(f"error: {error_message(error)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def parse_args(argv: List[str]):
+    import argparse
+    from expr_calc.backends import BACKENDS
+
+    parser = argparse.ArgumentParser(prog="python -m expr_calc", description="Interpreter flags")
+    parser.add_argument(
+        "file",
+        nargs="?",
+        help="Evaluate the expressions of a file, one per line, "
+             "use - to read them from stdin (default: start the REPL)"
+    )
+    parser.add_argument(
+        "-e",
+        dest="expression",
+        help="Evaluate a single expression, print its result and exit"
+    )
     parser.add_argument(
         "--postfix",
-        dest="mode",
-        action="store_const",
-        const=True,
-        default=False,
-        help="Use postfix mode (default: False)"
+        action="store_true",
+        help="Read postfix (RPN) expressions such as 1 2 + 3 *, "
+             "negation is written ~ (default: infix)"
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop at the first expression that fails instead of "
+             "printing an error in place of its result"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=list(BACKENDS),
+        default="decimal",
+        help="Numeric backend (default: decimal)"
+    )
+    parser.add_argument(
+        "--precision",
+        type=int,
+        help="Digits of precision of the decimal backend"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Evaluate the file in this many processes, 0 uses one per CPU "
+             "(default: evaluate in this process)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10_000,
+        help="Number of lines sent to a worker at a time (default: 10000)"
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Print the throughput of each worker, or the statistics of "
+             "the shape cache, to stderr"
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Record stage timings and counters, shown by :stats in the REPL"
+    )
+    parser.add_argument(
+        "--shape-cache",
+        type=int,
+        default=0,
+        help="Cache this many plans by shape, the expression with its numbers "
+             "replaced by slots, shown by :shapes in the REPL and printed to "
+             "stderr with --report (default: 0, disabled)"
+    )
+    parser.add_argument(
+        "--store",
+        help="Read parsed expressions from a store built with python -m expr_calc.store"
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.expression is not None and args.file is not None:
+        parser.error("-e cannot be combined with a file")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+
+    # the usual scripted call has nothing else to parse, so argparse is skipped
+    if len(argv) == 2 and argv[0] == "-e":
+        sys.exit(evaluate_once(argv[1]))
+
+    args = parse_args(argv)
+    if args.expression is not None:
+        sys.exit(evaluate_once(args.expression, args.backend, args.precision, args.postfix))
 
-    calculator: Calc = Calc()
-    calculator.repl()
+    from expr_calc.calc import Calc
+    from expr_calc.errors import BatchError
+
+    store = None
+    if args.store:
+        from expr_calc.store import ExpressionStore
+        store = ExpressionStore(args.store)
+
+    calculator: Calc = Calc(backend=args.backend, precision=args.precision, instrument=args.stats, store=store,
+                            shape_cache_size=args.shape_cache)
+    if args.file is None:
+        calculator.repl(args.postfix)
+    elif args.workers is not None:
+        from expr_calc.parallel import run_parallel
+        try:
+            report = run_parallel(args.file, sys.stdout, args.workers or None, args.chunk_size,
+                                  args.fail_fast, args.backend, args.precision,
+                                  postfix=args.postfix, store=args.store)
+        except BatchError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        if args.report:
+            print(report, file=sys.stderr)
+    else:
+        from expr_calc.batch import run_batch
+        try:
+            run_batch(args.file, sys.stdout, calculator, args.fail_fast, postfix=args.postfix)
+        except BatchError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        if args.report and calculator.shapes is not None:
+            print(calculator.shapes.info(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
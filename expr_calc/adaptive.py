@@ -0,0 +1,407 @@
+from decimal import Context, Decimal, MAX_EMAX, MAX_PREC, MIN_EMIN, getcontext
+
+from expr_calc import operators
+from expr_calc.compiler import BINARY_OP, LOAD_NAME, LOAD_TEMP, POW_MOD, PUSH_CONST, STORE_TEMP, UNARY_OP, Program
+
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
+
+# programs, and plans per program, kept by an AdaptiveEvaluator, each is
+# emptied once it holds this many
+PLAN_SIZE = 256
+
+# scaling by a power of ten in this context never rounds
+EXACT = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+
+ONE = Decimal(1)
+
+# kinds of the bounds of the values of a plan
+VAR, CONST, SCALED_SUM, PRODUCT, POWER, REMAINDER, SAME = range(7)
+
+# operator functions of the decimal backend that plans compute with ints
+SUPPORTED = frozenset((operators.add, operators.sub, operators.mul, operators.div, operators.mod,
+                       operators.exp, operators.powmod, operators.negative, operators.positive))
+
+_MISSING = object()
+
+
+class _Fallback(Exception):
+    """Raised by a plan whose result is not proven to be the Decimal one"""
+
+
+def _div(a: int, b: int) -> int:
+    # Decimal keeps the ideal exponent of a quotient that is exact at it,
+    # any other quotient gets another exponent or is rounded
+    if not b:
+        raise _Fallback
+    quotient, remainder = divmod(a, b)
+    if remainder:
+        raise _Fallback
+    return quotient
+
+
+def _int_mod(a: int, b: int) -> int:
+    # remainder of operators.mod for integers, with the sign of the dividend
+    if not b:
+        raise _Fallback
+    remainder = abs(a) % abs(b)
+    return -remainder if a < 0 else remainder
+
+
+def _scaled_mod(a: int, b: int, limit: int) -> int:
+    # Decimal's remainder raises DivisionImpossible for quotients too long
+    # for the context unless both operands are integers
+    if not b:
+        raise _Fallback
+    quotient, remainder = divmod(abs(a), abs(b))
+    if quotient >= limit:
+        raise _Fallback
+    return -remainder if a < 0 else remainder
+
+
+def _power(a: int, n: int) -> int:
+    # powers of a zero with a fraction have exponent 0 rather than the ideal one
+    if not a:
+        raise _Fallback
+    return a ** n
+
+
+def _powmod(a: int, b: int, m: int) -> int:
+    # the conditions of the integer path of operators.powmod
+    if b < 0 or not m or not (a or b):
+        raise _Fallback
+    return operators.exact_powmod(a, b, m)
+
+
+def split(value: Decimal) -> Tuple[int, int]:
+    """
+    Split a finite Decimal into its signed coefficient and exponent,
+    the sign of a zero is lost
+
+    :param value: finite Decimal
+    :return: coefficient and exponent
+    """
+    if value.same_quantum(ONE):
+        return int(value), 0
+    exponent = value.as_tuple().exponent
+    return int(value.scaleb(-exponent, EXACT)), exponent
+
+
+def supports(program: Program) -> bool:
+    """
+    Check if a program only has the operators and constants that plans
+    can stand for, whatever the exponents of its variables
+
+    :param program: compiled program
+    :return: if plans can be built for it
+    """
+    for index, (opcode, arg) in enumerate(program.code):
+        if opcode == PUSH_CONST:
+            value = program.consts[arg]
+            if type(value) is not Decimal or not value.is_finite():
+                return False
+        elif opcode == BINARY_OP or opcode == UNARY_OP or opcode == POW_MOD:
+            func = program.funcs[arg]
+            if func not in SUPPORTED:
+                return False
+            # the instruction before an operator pushes its last operand
+            if func is operators.exp and program.code[index - 1][0] != PUSH_CONST:
+                return False
+        elif opcode != LOAD_NAME and opcode != LOAD_TEMP and opcode != STORE_TEMP:
+            return False
+    return True
+
+
+def _max_bound(bounds: List[Tuple[int, ...]], checked: List[int], limit: int) -> int:
+    """
+    Find the largest magnitude of the coefficients of the variables for
+    which no checked value can reach limit, by bisection
+
+    :param bounds: how the bound of each value is derived from others
+    :param checked: indices of the values computed by an operator
+    :param limit: first coefficient too long for the context
+    :return: largest magnitude, -1 if none fits
+    """
+    def fits(variable: int) -> bool:
+        values: List[int] = []
+        for kind, *args in bounds:
+            if kind == VAR:
+                value = variable
+            elif kind == CONST or kind == SAME:
+                value = args[0] if kind == CONST else values[args[0]]
+            elif kind == SCALED_SUM:
+                value = values[args[0]] * args[2] + values[args[1]] * args[3]
+            elif kind == PRODUCT:
+                value = values[args[0]] * values[args[1]]
+            elif kind == REMAINDER:
+                value = min(values[args[0]] * args[2], values[args[1]] * args[3])
+            else:
+                base, count = values[args[0]], args[1]
+                # limit is the cap, so huge powers are never built
+                value = base ** count if base < 2 or (base.bit_length() - 1) * count < limit.bit_length() else limit
+            values.append(min(value, limit))
+        return all(values[index] < limit for index in checked)
+
+    if not fits(0):
+        return -1
+    if all(kind != VAR for kind, *_ in bounds):
+        return 0
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def build_plan(program: Program, exponents: Sequence[int], context: Context) -> Optional[Tuple[Callable, int]]:
+    """
+    Translate a program of the decimal backend into a Python function
+    computing the coefficient of its result with ints, for variables
+    with the given exponents. Exponents of every value are known while
+    the plan is built, so operands are aligned by constant powers of
+    ten, constants are split once, and the exponent of every result is
+    checked against the limits of the context. Coefficients of the
+    variables are bounded so that no result of + - * ^ can be rounded,
+    which the function checks once per variable, while / and % check
+    that they are exact as they are computed
+
+    :param program: compiled program
+    :param exponents: exponent of each name of the program
+    :param context: Decimal context the program is run in
+    :return: function taking the coefficient of each name positionally
+     and the exponent of its result, None if the program has operators
+     or values that ints cannot stand for
+    """
+    limit = 10 ** context.prec
+    top = context.Emax - context.prec + 1     # largest exponent that is never clamped
+    stack: List[Tuple[str, int, int, Optional[Decimal]]] = []    # (source, exponent, bound, constant)
+    temps: Dict[int, Tuple[str, int, int, Optional[Decimal]]] = {}
+    bounds: List[Tuple[int, ...]] = []
+    checked: List[int] = []
+    lines: List[str] = []
+
+    def align(operand: Tuple[str, int, int, Optional[Decimal]], exponent: int) -> Tuple[str, int]:
+        source, own, _, _ = operand
+        scale = 10 ** (own - exponent)
+        return (f"{source} * {scale}" if scale > 1 else source), scale
+
+    for opcode, arg in program.code:
+        if opcode == PUSH_CONST:
+            value = program.consts[arg]
+            if type(value) is not Decimal or not value.is_finite():
+                return None
+            coefficient, exponent = split(value)
+            bounds.append((CONST, abs(coefficient)))
+            stack.append((f"({coefficient})" if coefficient < 0 else str(coefficient), exponent, len(bounds) - 1, value))
+            continue
+        elif opcode == LOAD_NAME:
+            bounds.append((VAR,))
+            stack.append((f"_v{arg}", exponents[arg], len(bounds) - 1, None))
+            continue
+        elif opcode == LOAD_TEMP:
+            stack.append(temps[arg])
+            continue
+        elif opcode == STORE_TEMP:
+            # every result is a local already
+            temps[arg] = stack[-1]
+            continue
+
+        func = program.funcs[arg]
+        if opcode == UNARY_OP:
+            source, exponent, bound, _ = stack.pop()
+            if func is operators.negative:
+                expression = f"-{source}"
+            elif func is operators.positive:
+                expression = source
+            else:
+                return None
+            bounds.append((SAME, bound))
+        elif opcode == POW_MOD:
+            modulus, power, base = stack.pop(), stack.pop(), stack.pop()
+            if func is not operators.powmod or base[1] or power[1] or modulus[1]:
+                return None
+            expression, exponent = f"_powmod({base[0]}, {power[0]}, {modulus[0]})", 0
+            bounds.append((SAME, modulus[2]))
+        elif opcode == BINARY_OP:
+            b, a = stack.pop(), stack.pop()
+            if func is operators.add or func is operators.sub or func is operators.mod:
+                exponent = min(a[1], b[1])
+                if max(a[1], b[1]) - exponent > context.prec:
+                    return None
+                (left, scale_a), (right, scale_b) = align(a, exponent), align(b, exponent)
+                if func is operators.mod:
+                    if a[1] == 0 and b[1] == 0:
+                        expression = f"_int_mod({left}, {right})"
+                    else:
+                        expression = f"_scaled_mod({left}, {right}, {limit})"
+                    bounds.append((REMAINDER, a[2], b[2], scale_a, scale_b))
+                else:
+                    expression = f"{left} {'+' if func is operators.add else '-'} {right}"
+                    bounds.append((SCALED_SUM, a[2], b[2], scale_a, scale_b))
+            elif func is operators.mul:
+                expression, exponent = f"{a[0]} * {b[0]}", a[1] + b[1]
+                bounds.append((PRODUCT, a[2], b[2]))
+            elif func is operators.div:
+                # an exact quotient is no larger than its dividend
+                expression, exponent = f"_div({a[0]}, {b[0]})", a[1] - b[1]
+                bounds.append((SAME, a[2]))
+            elif func is operators.exp:
+                power = b[3]
+                if power is None or not power.same_quantum(ONE) or power < 1:
+                    return None
+                count = int(power)
+                expression, exponent = f"{a[0]} ** {count}" if a[1] == 0 else f"_power({a[0]}, {count})", a[1] * count
+                bounds.append((POWER, a[2], count))
+            else:
+                return None
+        else:
+            return None
+
+        if not context.Emin <= exponent <= top:
+            return None
+        checked.append(len(bounds) - 1)
+        local = f"_t{len(lines)}"
+        lines.append(f"        {local} = {expression}")
+        stack.append((local, exponent, len(bounds) - 1, None))
+
+    variable = _max_bound(bounds, checked, limit)
+    if variable < 0:
+        return None
+    arguments = [f"_v{index}" for index in range(len(program.names))]
+    guards = [f"        if not -{variable} <= {argument} <= {variable}:\n            raise _Fallback"
+              for argument in arguments]
+    source = "\n".join([
+        "def _build(_div, _int_mod, _scaled_mod, _power, _powmod, _Fallback):",
+        f"    def evaluate({', '.join(arguments)}):",
+        *guards,
+        *lines,
+        f"        return {stack[-1][0]}",
+        "    return evaluate",
+    ])
+    namespace: Dict[str, Any] = {}
+    exec(compile(source, "<expr_calc adaptive>", "exec"), namespace)
+    return namespace["_build"](_div, _int_mod, _scaled_mod, _power, _powmod, _Fallback), stack[-1][1]
+
+
+class _Plans:
+
+    __slots__ = ("plans", "exponents", "quanta")
+
+    def __init__(self, count: int) -> None:
+        """
+        Plans of a program by exponents of its variables and context,
+        with the exponents of its last evaluation, which those of the
+        next are checked against first
+
+        :param count: number of names of the program
+        """
+        self.plans: Dict[Hashable, Optional[Tuple[Callable, int]]] = {}
+        self.exponents: Tuple[int, ...] = (0,) * count
+        self.quanta: Tuple[Decimal, ...] = (ONE,) * count
+
+    def run(self, program: Program, variables: Optional[Mapping[str, Any]]) -> Optional[Decimal]:
+        """
+        Evaluate a program with ints
+
+        :param program: program the plans were built for
+        :param variables: values of the identifiers in the program
+        :return: final value, None if it is not proven to be the Decimal one
+        """
+        context = program.backend.context or getcontext()
+        coefficients = []
+        exponents = []
+        for name, quantum, guess in zip(program.names, self.quanta, self.exponents):
+            try:
+                value = variables[name]
+            except (KeyError, TypeError):
+                # Program.run raises as it would have
+                return None
+            if type(value) is not Decimal or not value.is_finite():
+                return None
+            # unpacking the digits is slow, exponents rarely change
+            exponent = guess if value.same_quantum(quantum) else value.as_tuple().exponent
+            coefficients.append(int(value.scaleb(-exponent, EXACT)) if exponent else int(value))
+            exponents.append(exponent)
+
+        exponents = tuple(exponents)
+        if exponents != self.exponents:
+            self.exponents = exponents
+            self.quanta = tuple(ONE.scaleb(exponent, EXACT) for exponent in exponents)
+        key = (exponents, context.prec, context.Emin, context.Emax, context.clamp)
+        plan = self.plans.get(key, _MISSING)
+        if plan is _MISSING:
+            plan = build_plan(program, exponents, context)
+            if len(self.plans) >= PLAN_SIZE:
+                self.plans.clear()
+            self.plans[key] = plan
+        if plan is None:
+            return None
+
+        evaluate, exponent = plan
+        try:
+            coefficient = evaluate(*coefficients)
+        except _Fallback:
+            return None
+        # ints lose the sign of zeros
+        if not coefficient:
+            return None
+        return Decimal(coefficient).scaleb(exponent, EXACT) if exponent else Decimal(coefficient)
+
+
+class AdaptiveEvaluator:
+
+    def __init__(self) -> None:
+        """
+        Runs programs of the decimal backend with ints first, and with
+        Decimal only when ints cannot be proven to give the same result.
+        Every finite Decimal is an int coefficient scaled by a power of
+        ten, and + - * and powers of ints are exact, so as long as no
+        coefficient is longer than the precision and no exponent leaves
+        the limits of the context, nothing is rounded and no signal is
+        raised. Results are then identical to those of Program.run,
+        exponent included, while zero results, whose sign ints lose,
+        non-Decimal variables and anything else fall back to it. Plans
+        are built per program, exponents of the variables and context.
+        Counters are kept per evaluator, which is not shared by threads
+        """
+        self.programs: Dict[Program, Optional[_Plans]] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Set the counters back to zero"""
+        self.fast = 0
+        self.fallback = 0
+
+    @property
+    def fast_rate(self) -> float:
+        total = self.fast + self.fallback
+        return self.fast / total if total else 0.0
+
+    def run(self, program: Program, variables: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Evaluate a program, with ints if its plan proves the result
+        exact, otherwise with Program.run
+
+        :param program: compiled program of the decimal backend
+        :param variables: values of the identifiers in the program
+        :return: final value
+        """
+        plans = self.programs.get(program, _MISSING)
+        if plans is _MISSING:
+            plans = _Plans(len(program.names)) if supports(program) else None
+            if len(self.programs) >= PLAN_SIZE:
+                self.programs.clear()
+            self.programs[program] = plans
+        if plans is not None:
+            result = plans.run(program, variables)
+            if result is not None:
+                self.fast += 1
+                return result
+        self.fallback += 1
+        return program.run(variables)
+
+    def __str__(self) -> str:
+        return f"{self.fast} fast, {self.fallback} fallback ({self.fast_rate:.1%} fast)"
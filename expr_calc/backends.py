@@ -0,0 +1,280 @@
+import math
+import operator
+from contextlib import nullcontext
+from decimal import Context, Decimal, getcontext, localcontext
+
+from expr_calc import operators
+
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Dict, Hashable, Optional, Union
+
+if TYPE_CHECKING:
+    # fractions is imported by FractionBackend, most processes never need it
+    from fractions import Fraction
+
+
+def truncated_mod(a, b):
+    """Get the remainder of a and b with the sign of a, like Decimal does"""
+    remainder = abs(a) % abs(b)
+    return remainder if a >= 0 else -remainder
+
+
+def float_exp(a: float, b: float) -> float:
+    """Raise a to b, raising ValueError instead of returning a complex"""
+    return math.pow(a, b)
+
+
+def int_div(a, b):
+    """Divide a into b, keeping an int when the division is exact"""
+    if isinstance(a, int) and isinstance(b, int) and b and not a % b:
+        return a // b
+    return a / b
+
+
+def exact_power_fits(bits: int, power: int) -> bool:
+    """
+    Check that raising a base of this many bits to power stays within
+    operators.EXACT_POWER_BITS, or is trivial because the base is 0 or 1
+    in absolute value, so that an exact power cannot hang
+    """
+    return bits <= 1 or abs(power) * bits <= operators.EXACT_POWER_BITS
+
+
+def int_exp(a, b):
+    """
+    Raise a to b, keeping an int for non-negative integral powers unless
+    the result would be too large, those are floats and may overflow
+    """
+    if isinstance(a, int) and isinstance(b, int) and b >= 0 and exact_power_fits(a.bit_length(), b):
+        return a ** b
+    return math.pow(a, b)
+
+
+def int_mod(a, b):
+    """Get the remainder of a and b with the sign of a"""
+    if isinstance(a, int) and isinstance(b, int):
+        return truncated_mod(a, b)
+    return math.fmod(a, b)
+
+
+def fraction_exp(a: Union["Fraction", float], b: Union["Fraction", float]):
+    """
+    Raise a to b, exactly if both are Fractions, b is integral and the
+    result is not too large, as a float otherwise, which includes the
+    floats left by non-integral powers and math functions
+    """
+    from fractions import Fraction
+
+    if isinstance(a, Fraction) and isinstance(b, Fraction) and b.denominator == 1:
+        bits = max(a.numerator.bit_length(), a.denominator.bit_length())
+        if exact_power_fits(bits, b.numerator):
+            return a ** b
+    return math.pow(a, b)
+
+
+def int_powmod(a, b, m):
+    """Get the remainder of a ^ b and m, without computing a ^ b if all are ints"""
+    if isinstance(a, int) and isinstance(b, int) and isinstance(m, int) and b >= 0 and m:
+        return operators.exact_powmod(a, b, m)
+    return int_mod(int_exp(a, b), m)
+
+
+def fraction_powmod(a: Union["Fraction", float], b: Union["Fraction", float], m: Union["Fraction", float]):
+    """Get the remainder of a ^ b and m, without computing a ^ b if all are integral Fractions"""
+    from fractions import Fraction
+
+    if (isinstance(a, Fraction) and isinstance(b, Fraction) and isinstance(m, Fraction)
+            and a.denominator == b.denominator == m.denominator == 1 and b >= 0 and m):
+        return type(a)(operators.exact_powmod(a.numerator, b.numerator, m.numerator))
+    return truncated_mod(fraction_exp(a, b), m)
+
+
+def int_literal(lexeme: str) -> Union[int, float]:
+    """Build an int from a lexeme if it is integral and a float otherwise"""
+    value = Decimal(lexeme)
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+class Backend:
+
+    def __init__(self, name: str, literal: Callable[[str], Any],
+                 op_map: Dict[str, Callable], unary_op_map: Dict[str, Callable],
+                 context: Optional[Context] = None, powmod: Optional[Callable] = None) -> None:
+        """
+        Numeric backend deciding how literals are built and how
+        operators are applied
+
+        :param name: name of the backend
+        :param literal: constructor turning a number lexeme into a value
+        :param op_map: binary operator functions keyed by symbol
+        :param unary_op_map: unary operator functions keyed by symbol
+        :param context: Decimal context to evaluate in, the current
+         context of the thread is used if not given
+        :param powmod: function giving the same result as a ^ b % m,
+         used for that pattern so that a ^ b need not be computed
+        """
+        self.name = name
+        self.literal = literal
+        self.op_map = op_map
+        self.unary_op_map = unary_op_map
+        self.context = context
+        self.one = literal("1")
+        self.powmod = powmod or self.compose_powmod
+
+    def compose_powmod(self, a, b, m):
+        """Get the remainder of a ^ b and m with the backend's operators"""
+        return self.op_map['%'](self.op_map['^'](a, b), m)
+
+    def activate(self) -> ContextManager:
+        """
+        Context manager to evaluate under, which installs the Decimal
+        context of the backend if it has one
+
+        :return: context manager
+        """
+        if self.context is None:
+            return nullcontext()
+        return localcontext(self.context)
+
+    def context_key(self) -> Hashable:
+        """
+        Settings that change the result of folding constants, used
+        to key cached programs
+
+        :return: hashable summary of the settings
+        """
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name})"
+
+
+def decimal_context_key(context: Context) -> Hashable:
+    """
+    Settings of a Decimal context that change the result of a computation
+
+    :param context: Decimal context
+    :return: hashable summary of the settings
+    """
+    trapped = frozenset(signal for signal, enabled in context.traps.items() if enabled)
+    return context.prec, context.rounding, context.Emin, context.Emax, context.clamp, trapped
+
+
+class DecimalBackend(Backend):
+
+    def __init__(self, precision: Optional[int] = None, context: Optional[Context] = None) -> None:
+        """
+        Backend using Decimal arithmetic
+
+        :param precision: number of significant digits, if not given
+         the current Decimal context of the thread is used
+        :param context: Decimal context to evaluate in instead of a
+         precision, it is copied so later changes to it have no effect
+        """
+        if precision is not None and context is not None:
+            raise ValueError("precision and context cannot both be given")
+        if context is not None:
+            context = context.copy()
+            context.clear_flags()
+        elif precision is not None:
+            context = Context(prec=precision)
+        super().__init__("decimal", Decimal, operators.op_map, operators.unary_op_map,
+                         context, operators.powmod)
+
+    def context_key(self) -> Hashable:
+        return (self.name,) + decimal_context_key(self.context or getcontext())
+
+
+class FloatBackend(Backend):
+
+    def __init__(self) -> None:
+        """
+        Backend using native floats, remainders keep the sign of the
+        dividend as they do for Decimal
+        """
+        super().__init__("float", float, {
+            '+': operator.add,
+            '*': operator.mul,
+            '-': operator.sub,
+            '/': operator.truediv,
+            '^': float_exp,
+            '%': math.fmod
+        }, {
+            '+': operator.pos,
+            '-': operator.neg
+        })
+
+
+class IntBackend(Backend):
+
+    def __init__(self) -> None:
+        """
+        Backend using exact ints wherever the result is integral and
+        floats otherwise, such as for 1 / 3 or 2 ^ -1
+        """
+        super().__init__("int", int_literal, {
+            '+': operator.add,
+            '*': operator.mul,
+            '-': operator.sub,
+            '/': int_div,
+            '^': int_exp,
+            '%': int_mod
+        }, {
+            '+': operator.pos,
+            '-': operator.neg
+        }, powmod=int_powmod)
+
+
+class FractionBackend(Backend):
+
+    def __init__(self) -> None:
+        """
+        Backend using exact rationals, only non-integral powers
+        fall back to floats
+        """
+        from fractions import Fraction
+
+        super().__init__("fraction", Fraction, {
+            '+': operator.add,
+            '*': operator.mul,
+            '-': operator.sub,
+            '/': operator.truediv,
+            '^': fraction_exp,
+            '%': truncated_mod
+        }, {
+            '+': operator.pos,
+            '-': operator.neg
+        }, powmod=fraction_powmod)
+
+
+BACKENDS = {
+    "decimal": DecimalBackend,
+    "float": FloatBackend,
+    "int": IntBackend,
+    "fraction": FractionBackend,
+}
+
+
+def get_backend(backend: Union[str, Backend, None] = None, precision: Optional[int] = None) -> Backend:
+    """
+    Resolve a backend name into a Backend object
+
+    :param backend: name of a backend, a Backend, or None for Decimal
+    :param precision: digits of precision, only valid for Decimal
+    :return: Backend object
+    """
+    if isinstance(backend, Backend):
+        if precision is not None:
+            raise ValueError("precision can only be given with a backend name")
+        return backend
+
+    name = backend or "decimal"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name}, expected one of {', '.join(BACKENDS)}")
+    if name == "decimal":
+        return DecimalBackend(precision)
+    if precision is not None:
+        raise ValueError(f"The {name} backend has no precision setting")
+    return BACKENDS[name]()
+
+
+DEFAULT_BACKEND = DecimalBackend()
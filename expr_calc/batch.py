@@ -0,0 +1,115 @@
+import mmap
+import os
+import sys
+from decimal import DecimalException
+
+from expr_calc.calc import Calc
+from expr_calc.errors import BatchError, NoProgramLoaded
+
+from typing import IO, Iterable, Iterator, Optional
+
+
+# errors that belong to a single expression rather than to the batch
+EXPRESSION_ERRORS = (NoProgramLoaded, SyntaxError, NameError, ArithmeticError, ValueError)
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """
+    Lazily read the lines of a file, or of stdin if path is "-".
+    Files are memory-mapped so large inputs are paged in by the OS
+    instead of being read into memory up front
+
+    :param path: path of the file to read
+    :return: generator of lines without their line endings
+    """
+    if path == "-":
+        for line in sys.stdin:
+            yield line.rstrip("\r\n")
+        return
+
+    if os.path.getsize(path) == 0:     # empty files cannot be mapped
+        return
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for line in iter(mapped.readline, b""):
+            yield line.decode().rstrip("\r\n")
+
+
+def error_message(error: Exception) -> str:
+    """
+    Condense the message of an error into a single line
+
+    :param error: error raised while evaluating an expression
+    :return: last non-empty line of the message
+    """
+    if isinstance(error, DecimalException):    # message is a list of signals
+        return type(error).__name__
+    lines = str(error).strip().splitlines()
+    return lines[-1] if lines else type(error).__name__
+
+
+def evaluate_lines(lines: Iterable[str], calc: Optional[Calc] = None,
+                   fail_fast: bool = False, start: int = 1, postfix: bool = False) -> Iterator[str]:
+    """
+    Evaluate newline-delimited expressions with a single Calc, so that
+    repeated expressions are served from its cache. Blank lines give
+    blank results so output lines match input lines
+
+    :param lines: expressions, one per item
+    :param calc: calculator to evaluate with
+    :param fail_fast: raise BatchError on the first failing expression
+     instead of reporting the error in place of its result
+    :param start: line number of the first line, used in errors
+    :param postfix: lines are postfix programs, see Calc.eval_postfix
+    :return: generator of results as strings
+    """
+    calc = calc or Calc()
+
+    for line_number, line in enumerate(lines, start):
+        if not line or line.isspace():
+            yield ""
+            continue
+
+        try:
+            if postfix:
+                yield str(calc.eval_postfix(line))
+            else:
+                calc.program = line
+                yield str(calc.eval())
+        except EXPRESSION_ERRORS as error:
+            if fail_fast:
+                raise BatchError(f"line {line_number}: {error_message(error)}") from error
+            yield f"error: {error_message(error)}"
+
+
+def run_batch(path: str, output: IO[str], calc: Optional[Calc] = None,
+              fail_fast: bool = False, chunk_size: int = 4096, postfix: bool = False) -> int:
+    """
+    Evaluate every expression of a file, or of stdin if path is "-",
+    writing results to output in chunks of chunk_size lines
+
+    :param path: path of the file with one expression per line
+    :param output: text stream results are written to
+    :param calc: calculator to evaluate with
+    :param fail_fast: stop at the first failing expression
+    :param chunk_size: number of results buffered before each write
+    :param postfix: expressions are postfix programs
+    :return: number of expressions evaluated
+    """
+    buffer = []
+    count = 0
+    try:
+        for result in evaluate_lines(read_lines(path), calc, fail_fast, postfix=postfix):
+            buffer.append(result)
+            count += 1
+            if len(buffer) >= chunk_size:
+                buffer.append("")
+                output.write("\n".join(buffer))
+                buffer.clear()
+    finally:
+        # results before a failing line are still written
+        if buffer:
+            buffer.append("")
+            output.write("\n".join(buffer))
+        output.flush()
+    return count
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+from typing import Any, Hashable, NamedTuple, Optional
+
+
+class CacheInfo(NamedTuple):
+    """
+    Snapshot of the counters of an LRUCache
+    """
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache:
+
+    def __init__(self, maxsize: int = 128) -> None:
+        """
+        Bounded mapping that evicts the least recently used entry
+        once it holds more than maxsize entries
+
+        :param maxsize: maximum number of entries kept
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Fetch the entry for key and mark it as most recently used
+
+        :param key: key to look up
+        :return: cached value or None on a miss
+        """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store value under key, evicting the least recently used
+        entry if the cache is full
+
+        :param key: key to store the value under
+        :param value: value to be cached
+        :return:
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drop every entry and reset the counters
+        :return:
+        """
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._data))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,22 +1,321 @@
 from decimal import Decimal, getcontext
+from functools import partial
+from time import perf_counter
 
-from expr_calc.errors import NoProgramLoaded, ExcessiveDotError, TokenError
+from expr_calc.errors import NoProgramLoaded, ExcessiveDotError, TokenError, UndefinedVariable
 from expr_calc.token import Token, TokenType
-from expr_calc.operators import OP_LIST, unary_op_map
-from expr_calc.tree import Tree
+from expr_calc.operators import OP_LIST, RIGHT_ASSOCIATIVE, UNARY_PRECEDENCE, PAREN_PRECEDENCE
+from expr_calc.tree import DeferredError, DeferredPower, Tree, apply_deferred, lookup
 from expr_calc.lexer import Lexer
-
-from typing import List, Optional
+from expr_calc.functions import BUILTINS, FunctionRegistry, builtin_functions
+from expr_calc.compiler import Program, compile_tree
+from expr_calc.cache import LRUCache
+from expr_calc.backends import Backend, DecimalBackend, get_backend
+
+from typing import TYPE_CHECKING, IO, AbstractSet, Any, Callable, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    # stores are opened by the caller, and the optimiser, native code,
+    # vectorised and adaptive evaluation and statistics are imported by
+    # the methods using them, importing them here would slow down startup
+    from expr_calc.adaptive import AdaptiveEvaluator
+    from expr_calc.native import NativeFunction
+    from expr_calc.stats import Sample, Stats
+    from expr_calc.store import ExpressionStore
+
+
+# characters read from a file object at a time by Calc.eval_stream
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def parse_tokens(lexed: Iterable[Token], op_stack: Optional[List[Tuple[float, Token]]] = None,
+                 tree_stack: Optional[List[Tree]] = None, functions: Optional[FunctionRegistry] = None,
+                 operand: Callable[[Token], Any] = Tree,
+                 reduce: Optional[Callable[[Token, List[Any]], None]] = None) -> Tree:
+    """
+    Run the shunting-yard algorithm over lexed tokens. Every token
+    is pushed and popped at most once, so parsing is linear in the
+    number of tokens and never recurses. Nothing is kept between
+    calls, so any number of threads can parse at once. A function
+    call sits on the operator stack like an opening parenthesis, with
+    the operand stack height and the commas seen, and is reduced with
+    the function its name and argument count resolve to
+
+    :param lexed: tokens produced by the lexer
+    :param op_stack: empty list to use as operator stack
+    :param tree_stack: empty list to use as operand stack, the
+     stacks can be passed in to be inspected after parsing
+    :param functions: functions that can be called, by default the
+     built-in ones of the decimal backend
+    :param operand: turns a number or identifier into an operand
+    :param reduce: replaces the operands of an operator on the operand
+     stack with its result, by default reduce_operator builds the tree
+    :return: abstract syntax tree for the tokens passed, or the final
+     operand built by operand and reduce
+    """
+    tree_stack = [] if tree_stack is None else tree_stack  # used to build ast
+    op_stack = [] if op_stack is None else op_stack     # pending (precedence, operator or paren)
+    reduce = reduce_operator if reduce is None else reduce
+    functions = BUILTINS if functions is None else functions
+
+    for token in lexed:
+
+        if token.type_ is TokenType.NUMBER or token.type_ is TokenType.IDENTIFIER:
+            tree_stack.append(operand(token))
+
+        elif token.type_ is TokenType.BINARY_OP:
+            # reduce pending operators that bind at least as tight as
+            # the current one, ^ is right associative so only strictly
+            # tighter operators are reduced before it
+            precedence = OP_LIST[token.val]
+            if token.val in RIGHT_ASSOCIATIVE:
+                while op_stack and op_stack[-1][0] > precedence:
+                    reduce(op_stack.pop()[1], tree_stack)
+            else:
+                while op_stack and op_stack[-1][0] >= precedence:
+                    reduce(op_stack.pop()[1], tree_stack)
+            op_stack.append((precedence, token))
+
+        elif token.type_ is TokenType.UNARY_OP:
+            op_stack.append((UNARY_PRECEDENCE, token))
+
+        elif token.type_ is TokenType.L_PAREN:
+            # parentheses are never reduced by an operator
+            op_stack.append((PAREN_PRECEDENCE, token))
+
+        elif token.type_ is TokenType.FUNCTION:
+            # (precedence, name, height of the operand stack, commas)
+            op_stack.append((PAREN_PRECEDENCE, token, len(tree_stack), 0))
+
+        elif token.type_ is TokenType.COMMA:
+            while op_stack and op_stack[-1][0] != PAREN_PRECEDENCE:
+                reduce(op_stack.pop()[1], tree_stack)
+            if not op_stack or op_stack[-1][1].type_ is not TokenType.FUNCTION:
+                raise TokenError("Comma outside of a function call\n")
+            _, call, height, commas = op_stack[-1]
+            check_arguments(call.val, len(tree_stack) - height, commas + 1, tree_stack)
+            op_stack[-1] = (PAREN_PRECEDENCE, call, height, commas + 1)
+
+        elif token.type_ is TokenType.R_PAREN:
+            while op_stack and op_stack[-1][0] != PAREN_PRECEDENCE:
+                reduce(op_stack.pop()[1], tree_stack)
+            if not op_stack:
+                raise TokenError("Missing opening parenthesis\n")
+            entry = op_stack.pop()
+            if entry[1].type_ is TokenType.FUNCTION:
+                _, call, height, commas = entry
+                count = len(tree_stack) - height
+                if commas or count > 1:
+                    check_arguments(call.val, count, commas + 1, tree_stack)
+                reduce(Token(TokenType.FUNCTION, functions.resolve(call.val, count)), tree_stack)
+
+    while op_stack:
+        token = op_stack.pop()[1]
+        if token.type_ is TokenType.L_PAREN or token.type_ is TokenType.FUNCTION:
+            raise TokenError("Missing closing parenthesis\n")
+        reduce(token, tree_stack)
+
+    if not tree_stack:
+        raise NoProgramLoaded("No expression loaded\n")
+    if len(tree_stack) > 1:
+        second = tree_stack[1]
+        raise TokenError(f"Missing operator before {second.node.val if isinstance(second, Tree) else second}\n")
+
+    return tree_stack[0]
+
+
+def check_arguments(name: str, count: int, expected: int, tree_stack: List[Any]) -> None:
+    """
+    Check that every argument of a call parsed so far is a single
+    expression, as an empty argument or two operands without an
+    operator in between would shift the others
+
+    :param name: name of the function
+    :param count: number of operands pushed since the call was opened
+    :param expected: number of arguments the commas delimit
+    :param tree_stack: stack of finished operands
+    :return:
+    """
+    if count < expected:
+        raise TokenError(f"Missing argument of {name}\n")
+    if count > expected:
+        operand = tree_stack[len(tree_stack) - count + expected]
+        label = operand.node.val if isinstance(operand, Tree) else operand
+        raise TokenError(f"Missing operator before {label}\n")
+
+
+def reduce_operator(token: Token, tree_stack: List[Tree]) -> None:
+    """
+    Pop the operands of an operator or a call off the tree stack and
+    push the operator node in their place
+
+    :param token: operator token to be reduced
+    :param tree_stack: stack of finished subtrees
+    :return:
+    """
+    if token.type_ is TokenType.FUNCTION:
+        count = token.val.arity
+        arguments = tree_stack[len(tree_stack) - count:]
+        del tree_stack[len(tree_stack) - count:]
+        tree_stack.append(Tree(token, arguments))
+    elif token.type_ is TokenType.BINARY_OP:
+        if len(tree_stack) < 2:
+            raise TokenError(f"Operator {token.val} is missing an operand\n")
+        operand_b = tree_stack.pop()
+        tree_stack[-1] = Tree(token, (tree_stack[-1], operand_b))
+    else:
+        if not tree_stack:
+            raise TokenError(f"Operator {token.val} is missing an operand\n")
+        tree_stack[-1] = Tree(token, (tree_stack[-1],))
+
+
+def evaluate_tokens(lexed: Iterable[Token], backend: Backend, variables: Optional[Mapping[str, Any]] = None,
+                    op_stack: Optional[List[Tuple[float, Token]]] = None,
+                    value_stack: Optional[List[Any]] = None,
+                    functions: Optional[FunctionRegistry] = None) -> Any:
+    """
+    Evaluate infix tokens while they are parsed. Each operator is
+    applied as soon as its precedence allows it to be reduced, and its
+    operands are dropped, so no tree is built and memory is bounded by
+    the nesting depth of the expression rather than by its length.
+    Results are the same as those of the compiled program, a ^ b % m
+    included, and so is the error raised when evaluation fails
+
+    :param lexed: tokens produced by the lexer, possibly lazily
+    :param backend: numeric backend providing the operators
+    :param variables: values of the identifiers in the expression
+    :param op_stack: empty list to use as operator stack
+    :param value_stack: empty list to use as operand stack, the
+     stacks can be passed in to be inspected after evaluating
+    :param functions: functions that can be called, by default the
+     built-in ones of the backend
+    :return: final value
+    """
+    op_map, unary_op_map, powmod = backend.op_map, backend.unary_op_map, backend.powmod
+    power = op_map["^"]
+    value_stack = [] if value_stack is None else value_stack
+    # error raised while a power was deferred, the rest is then only parsed
+    failure: Optional[DeferredError] = None
+
+    def operand(token: Token) -> Any:
+        nonlocal failure
+        if failure is not None:
+            return None
+        if token.type_ is TokenType.NUMBER:
+            return token.val
+        try:
+            return lookup(token.val, variables)
+        except UndefinedVariable as error:
+            failure = DeferredError.after(error, value_stack)
+            if failure is None:
+                raise
+            return None
+
+    def reduce(token: Token, values: List[Any]) -> None:
+        nonlocal failure
+        if (token.type_ is TokenType.BINARY_OP and len(values) < 2) or (token.type_ is TokenType.UNARY_OP and not values):
+            raise TokenError(f"Operator {token.val} is missing an operand\n")
+        if failure is None:
+            try:
+                if token.type_ is TokenType.FUNCTION:
+                    count = token.val.arity
+                    arguments = [power(value.base, value.exponent) if value.__class__ is DeferredPower else value
+                                 for value in values[len(values) - count:]]
+                    result = token.val.call(*arguments)
+                    del values[len(values) - count:]
+                    values.append(result)
+                elif token.type_ is TokenType.BINARY_OP:
+                    result = apply_deferred(token.val, values[-2], values[-1], op_map, powmod)
+                    del values[-1]
+                    values[-1] = result
+                else:
+                    operand_a = values[-1]
+                    if operand_a.__class__ is DeferredPower:
+                        operand_a = power(operand_a.base, operand_a.exponent)
+                    values[-1] = unary_op_map[token.val](operand_a)
+                return
+            except Exception as error:
+                failure = DeferredError.after(error, values)
+                if failure is None:
+                    raise
+        failure.skip(token, values)
+
+    with backend.activate():
+        functions = builtin_functions(backend) if functions is None else functions
+        result = parse_tokens(lexed, op_stack, value_stack, functions, operand, reduce)
+        if failure is not None:
+            failure.raise_first(power)
+        if result.__class__ is DeferredPower:
+            result = power(result.base, result.exponent)
+    return result
+
+
+def optimise_tree(tree: Tree, backend: Backend) -> Tuple[Tree, int, AbstractSet[int]]:
+    """
+    Fold constants and remove identity operations, then share common
+    subexpressions so they are computed once. Constants are folded in
+    the context of the backend, or the current one if it has none
+
+    :param tree: abstract syntax tree, it is not modified
+    :param backend: numeric backend providing the operators
+    :return: optimised DAG, number of nodes removed and the ids of the
+     nodes with more than one parent
+    """
+    from expr_calc.dag import HashConser
+    from expr_calc.optimizer import optimize
+
+    optimised, removed = optimize(tree, backend)
+    conser = HashConser()
+    return conser.build(optimised), removed, conser.shared
 
 
 class Calc:
 
-    def __init__(self, program: str = "") -> None:
+    def __init__(self, program: str = "", cache_size: int = 128, optimize: bool = True,
+                 backend: Union[str, Backend, None] = None, precision: Optional[int] = None,
+                 instrument: bool = False, stats_hook: Optional[Callable[["Sample"], None]] = None,
+                 store: Optional["ExpressionStore"] = None,
+                 functions: Optional[FunctionRegistry] = None, shape_cache_size: int = 0,
+                 adaptive: bool = False) -> None:
         """
-        Calculator Object for interpreting expressions
+        Calculator Object for interpreting expressions. A Calc keeps the
+        program, tokens and tree of its last evaluation, so it should
+        not be shared between threads, expr_calc.expression has a
+        stateless API for that
 
         :param program: expression, also called program,
          to be interpreted
+        :param cache_size: maximum number of compiled programs kept
+         in the LRU cache, 0 disables caching
+        :param optimize: fold constants, remove identity operations and
+         share common subexpressions before compiling, results are
+         identical either way
+        :param backend: numeric backend, one of "decimal" (default),
+         "float", "int" or "fraction", or a Backend object
+        :param precision: digits of precision of this instance's Decimal
+         context, if not given the current context of the thread is used
+        :param instrument: record stage timings and counters of every
+         evaluation in self.stats, which is None when not instrumented
+        :param stats_hook: called with the measurements of every
+         evaluation, implies instrument
+        :param store: store of parsed expressions looked up on a cache
+         miss before lexing and parsing
+        :param functions: functions that can be called from programs,
+         by default a copy of the built-in ones of the backend, so
+         functions registered on self.functions are only known to this
+         calculator
+        :param shape_cache_size: maximum number of plans kept by shape,
+         0 disables shape caching. Plans are compiled once per shape,
+         the program with its numbers replaced by slots, and run with
+         the numbers of each program, so 12.5 * 3 + 7 and 9.1 * 44 + 2
+         are parsed once. Plans are not optimised, since folding would
+         bake in the numbers, and self.tree is only updated when a new
+         shape is parsed. Statistics are given by self.shapes.info()
+        :param adaptive: evaluate with ints first, and with Decimal only
+         when ints cannot be proven to give the very same result, which
+         pays off for programs with several operators per variable.
+         Requires the decimal backend, plans of shapes are always run
+         with Decimal. self.adaptive counts how often each was used
         """
         self.program = program
         self.stack = []
@@ -25,7 +324,37 @@ class Calc:
         self.shunted = []
         self.tree: Optional[Tree] = None
 
-        self.lexer: Lexer = Lexer(self.program)
+        self.backend: Backend = get_backend(backend, precision)
+        self.lexer: Lexer = Lexer(self.program, self.backend.literal)
+        self.cache: Optional[LRUCache] = LRUCache(cache_size) if cache_size else None
+        self.optimize = optimize
+        self.stats: Optional["Stats"] = None
+        if instrument or stats_hook:
+            from expr_calc import stats
+            self.stats = stats.Stats(stats_hook)
+        self.store = store
+        if functions is None:
+            functions = FunctionRegistry(builtin_functions(self.backend))
+        self.functions: FunctionRegistry = functions
+        self.shapes: Optional[LRUCache] = LRUCache(shape_cache_size) if shape_cache_size else None
+        self.adaptive: Optional["AdaptiveEvaluator"] = None
+        if adaptive:
+            if not isinstance(self.backend, DecimalBackend):
+                raise ValueError("adaptive evaluation requires the decimal backend")
+            from expr_calc import adaptive as adaptive_mode
+            self.adaptive = adaptive_mode.AdaptiveEvaluator()
+
+    @staticmethod
+    def normalise(program: str) -> str:
+        """
+        Collapse runs of whitespace so that programs which only differ
+        in spacing share a cache entry. Whitespace still separates
+        numbers, so it is collapsed rather than removed
+
+        :param program: program to be normalised
+        :return: normalised program used as cache key
+        """
+        return " ".join(program.split())
 
     def lex(self, program: str = "") -> List[Token]:
         if program and not program.isspace():
@@ -40,88 +369,305 @@ class Calc:
     def parse(self, program: str = "") -> Tree:
         """
         Parses the program given in order to create an abstract
-        syntax tree that can be evaluated into a value
+        syntax tree that can be evaluated into a value. Trees are
+        shared with the cache, so they should not be mutated
 
         :param program: optional program to be parsed
         :return: abstract syntax tree for the expression passed
         """
+        return self.compile(program).tree
 
-        if program and not program.isspace():
-            lexed = self.lex(program=program)
-        else:
-            lexed = self.lex()
-
-        tree_stack: List[Tree] = []     # used to build ast
-        op_tree_stack: List[Tree] = []   # temporary op tree
+    def compile(self, program: str = "") -> Program:
+        """
+        Parses the program and compiles the resulting tree into a
+        flat postfix Program which can be run repeatedly without
+        walking the tree again. Programs are cached by their normalised
+        source, on a hit lexing and parsing are skipped entirely. On a
+        miss the tree is read from the store if there is one, otherwise
+        tokens are streamed from the lexer straight into the parser, so
+        self.lexed is only updated by Calc.lex
+
+        :param program: optional program to be compiled
+        :return: compiled program
+        """
+        key = self._cache_key(program)
+        compiled = self._cache_get(key)
+        if compiled is None:
+            tree = self.store.get(self.program, self.backend.literal, self.functions) if self.store is not None else None
+            if tree is None:
+                tree = self._parse(self.lexer.scan(self.program, self.backend.literal))
+            else:
+                self.tree = tree
+            compiled = self._compile(tree)
+            if self.cache is not None:
+                self.cache.put(key, compiled)
+        return compiled
 
-        for token in lexed:
+    def compile_native(self, program: str = "") -> "NativeFunction":
+        """
+        Compile the program into a Python function for formulas that
+        are evaluated many times. Compiling takes far longer than a
+        single evaluation, and native functions are not cached
 
-            if token.type_ is TokenType.NUMBER:
-                tree_stack.append(Tree(token))
+        :param program: optional program to be compiled
+        :return: function taking a mapping of variables like eval
+        """
+        from expr_calc.native import compile_native
 
-            elif token.type_ is TokenType.BINARY_OP:
-                # make operands child node of the bin op
-                # if bin op is the same as prev, make the
-                # prev's operands a child node of the current bin op
+        tree = self.compile(program).tree
+        optimised, _, shared = self._optimise(tree)
+        return compile_native(optimised, self.backend, shared)
 
-                # check if curr bin op has less or equal
-                # precedence than ones in the operator stack
-                # if the operator stack is not empty
-                while op_tree_stack and op_tree_stack[-1].node.val in OP_LIST and\
-                        OP_LIST[op_tree_stack[-1].node.val] >= OP_LIST[token.val]:
+    def _cache_key(self, program: str = "") -> Hashable:
+        if program and not program.isspace():
+            self.program = program
 
-                    curr_node = op_tree_stack.pop()
-                    while tree_stack:
-                        curr_node.append_child(tree_stack.pop())
-                    tree_stack.append(curr_node)
-                op_tree_stack.append(Tree(token))
+        key = self.normalise(self.program)
+        if not key:
+            raise NoProgramLoaded("No expression loaded\n")
+        if self.optimize:
+            # folded constants depend on the context they were computed in
+            key = (key, self.backend.context_key())
+        return key
+
+    def _cache_get(self, key: Hashable) -> Optional[Program]:
+        if self.cache is None:
+            return None
+        compiled = self.cache.get(key)
+        if compiled is not None:
+            self.tree = compiled.tree
+        return compiled
+
+    def _compile(self, tree: Tree) -> Program:
+        optimised, removed, shared = self._optimise(tree)
+        return compile_tree(optimised, tree, removed, self.backend, shared)
+
+    def _optimise(self, tree: Tree) -> Tuple[Tree, int, AbstractSet[int]]:
+        """
+        Optimise a tree if optimisation is enabled, common
+        subexpressions are then shared so they are computed once
 
-            elif token.type_ is TokenType.UNARY_OP:
-                op_tree_stack.append(Tree(token))
+        :param tree: abstract syntax tree
+        :return: optimised tree, number of nodes removed and the ids
+         of the nodes with more than one parent
+        """
+        if not self.optimize:
+            return tree, 0, frozenset()
+        return optimise_tree(tree, self.backend)
 
-            elif token.type_ is TokenType.L_PAREN:
-                op_tree_stack.append(Tree(token))
+    def _parse(self, lexed: Iterable[Token], op_stack: Optional[List[Tuple[float, Token]]] = None,
+               tree_stack: Optional[List[Tree]] = None) -> Tree:
+        """
+        Parse tokens with parse_tokens and keep the tree in self.tree
 
-            elif token.type_ is TokenType.R_PAREN:
-                while op_tree_stack and op_tree_stack[-1].node.val != "(":
+        :param lexed: tokens produced by the lexer
+        :param op_stack: empty list to use as operator stack
+        :param tree_stack: empty list to use as operand stack
+        :return: abstract syntax tree for the tokens passed
+        """
+        self.tree = parse_tokens(lexed, op_stack, tree_stack, self.functions)
+        return self.tree
 
-                    curr_node = op_tree_stack.pop()
-                    if curr_node.node.type_ is TokenType.BINARY_OP:
-                        curr_node.appendleft_child(tree_stack.pop())
-                        curr_node.appendleft_child(tree_stack.pop())
-                    else:
-                        curr_node.appendleft_child(tree_stack.pop())
+    def eval(self, variables: Optional[Mapping[str, Any]] = None) -> float:
+        """
+        Lexes the program, parses it, and the evaluates it
+        to a single value. Repeated programs are served from the cache
 
-                    tree_stack.append(curr_node)
-                op_tree_stack.pop()
+        :param variables: values of the identifiers in the program
+        :return: final value
+        """
+        if self.shapes is not None:
+            return self._eval_shape(variables)
+        if self.stats is None:
+            compiled = self.compile()
+            return compiled.run(variables) if self.adaptive is None else self.adaptive.run(compiled, variables)
+        return self._eval_instrumented(variables)
+
+    def _eval_shape(self, variables: Optional[Mapping[str, Any]] = None) -> float:
+        """
+        Same as eval, but the plan is looked up by the shape of the
+        program and run with its numbers
 
-        while op_tree_stack:
+        :param variables: values of the identifiers in the program
+        :return: final value
+        """
+        began = perf_counter()
+        key, literals = Lexer.shape(self.program, self.backend.literal)
+        if not key:
+            raise NoProgramLoaded("No expression loaded\n")
+        lexed = perf_counter()
+
+        plan = self.shapes.get(key)
+        cached = plan is not None
+        if not cached:
+            tree = self._parse(self.lexer.scan(self.program, self.backend.literal))
+            plan = compile_tree(tree, backend=self.backend)
+            self.shapes.put(key, plan)
+
+        if self.stats is None:
+            return plan.run(variables, literals)
+
+        from expr_calc.stats import Sample
+
+        # a new shape is lexed again, parsed and compiled, all counted as compile
+        sample = Sample()
+        sample.cached = cached
+        compiled_at = perf_counter()
+        result = plan.run(variables, literals)
+        times = sample.times
+        times["lex"], times["compile"], times["eval"] = lexed - began, compiled_at - lexed, perf_counter() - compiled_at
+        sample.op_counts = plan.op_counts()
+        self.stats.record(sample)
+        return result
+
+    def _eval_instrumented(self, variables: Optional[Mapping[str, Any]] = None) -> float:
+        """
+        Same as eval, but the stages are run one at a time so that each
+        can be measured. Measurements of evaluations that raise are dropped
 
-            curr_node = op_tree_stack.pop()
-            if curr_node.node.type_ is TokenType.BINARY_OP:
-                curr_node.appendleft_child(tree_stack.pop())
-                curr_node.appendleft_child(tree_stack.pop())
-            else:
-                curr_node.appendleft_child(tree_stack.pop())
-            tree_stack.append(curr_node)
+        :param variables: values of the identifiers in the program
+        :return: final value
+        """
+        from expr_calc.stats import DepthList, Sample
+
+        sample = Sample()
+        times = sample.times
+        began = perf_counter()
+
+        key = self._cache_key()
+        compiled = self._cache_get(key)
+        if compiled is None:
+            tokens = list(self.lexer.scan(self.program, self.backend.literal))
+            lexed = perf_counter()
+            op_stack, tree_stack = DepthList(), DepthList()
+            tree = self._parse(tokens, op_stack, tree_stack)
+            parsed = perf_counter()
+            compiled = self._compile(tree)
+            if self.cache is not None:
+                self.cache.put(key, compiled)
+            compiled_at = perf_counter()
+
+            times["lex"], times["parse"], times["compile"] = lexed - began, parsed - lexed, compiled_at - parsed
+            sample.tokens = len(tokens)
+            sample.nodes = sum(token.type_ is not TokenType.L_PAREN and token.type_ is not TokenType.R_PAREN
+                               and token.type_ is not TokenType.COMMA for token in tokens)
+            sample.operator_depth, sample.operand_depth = op_stack.max_depth, tree_stack.max_depth
+        else:
+            sample.cached = True
+            compiled_at = perf_counter()
 
-        self.tree = tree_stack[0] if tree_stack else None
-        return self.tree
+        result = compiled.run(variables) if self.adaptive is None else self.adaptive.run(compiled, variables)
+        times["eval"] = perf_counter() - compiled_at
+        sample.op_counts = compiled.op_counts()
+        self.stats.record(sample)
+        return result
 
-    def eval(self) -> float:
+    def eval_stream(self, source: Union[str, IO[str], Iterable[str]],
+                    variables: Optional[Mapping[str, Any]] = None) -> Any:
         """
-        Lexes the program, parses it, and the evaluates it
-        to a single value
+        Evaluate a single infix expression too large to be held in
+        memory, such as a generated sum of millions of terms. The
+        expression is read in chunks, which may split tokens anywhere,
+        and evaluated while it is lexed, so memory is bounded by its
+        nesting depth. Nothing is cached and self.program is unchanged
+
+        :param source: file object opened in text mode, iterable of
+         text chunks, or a string
+        :param variables: values of the identifiers in the expression
+        :return: final value
+        """
+        if isinstance(source, str):
+            chunks: Iterable[str] = (source,)
+        elif hasattr(source, "read"):
+            chunks = iter(partial(source.read, STREAM_CHUNK_SIZE), "")
+        else:
+            chunks = source
+        return evaluate_tokens(Lexer.scan_stream(chunks, self.backend.literal), self.backend, variables,
+                               functions=self.functions)
 
+    def eval_postfix(self, program: str = "", variables: Optional[Mapping[str, Any]] = None) -> float:
+        """
+        Evaluate a postfix (RPN) program such as 2 x ^ 1 + without
+        parsing it. Tokens are evaluated as soon as they are lexed, so
+        no tree is built and memory is bounded by the depth of the
+        operand stack rather than by the length of the program. Results
+        and errors are the same as for the equivalent infix program,
+        a ^ b % m included, negation is written ~ as in 2 ~ for -2
+
+        :param program: optional postfix program to be evaluated
+        :param variables: values of the identifiers in the program
         :return: final value
         """
-        self.lex()
-        self.parse()
-        return self.tree.eval()
+        if program and not program.isspace():
+            self.program = program
+        if self.program.isspace() or not self.program:
+            raise NoProgramLoaded("No expression loaded\n")
+
+        op_map, unary_op_map, powmod = self.backend.op_map, self.backend.unary_op_map, self.backend.powmod
+        power = op_map["^"]
+        stack = []
+        push = stack.append
+        # error raised while a power was deferred, the rest is then only scanned
+        failure: Optional[DeferredError] = None
+
+        with self.backend.activate():
+            for token in self.lexer.scan_postfix(self.program, self.backend.literal):
+                type_ = token.type_
+                if type_ is TokenType.BINARY_OP and len(stack) < 2:
+                    raise TokenError(f"Operator {token.val} is missing an operand\n")
+                if type_ is TokenType.UNARY_OP and not stack:
+                    raise TokenError("Operator ~ is missing an operand\n")
+                if failure is None:
+                    try:
+                        if type_ is TokenType.NUMBER:
+                            push(token.val)
+                        elif type_ is TokenType.BINARY_OP:
+                            result = apply_deferred(token.val, stack[-2], stack[-1], op_map, powmod)
+                            del stack[-1]
+                            stack[-1] = result
+                        elif type_ is TokenType.UNARY_OP:
+                            operand_a = stack[-1]
+                            if operand_a.__class__ is DeferredPower:
+                                operand_a = power(operand_a.base, operand_a.exponent)
+                            stack[-1] = unary_op_map[token.val](operand_a)
+                        else:
+                            push(lookup(token.val, variables))
+                        continue
+                    except Exception as error:
+                        failure = DeferredError.after(error, stack)
+                        if failure is None:
+                            raise
+                failure.skip(token, stack)
+
+            if not stack:
+                raise NoProgramLoaded("No expression loaded\n")
+            if len(stack) > 1:
+                raise TokenError(f"Missing operator, {len(stack)} operands are left\n")
+            if failure is not None:
+                failure.raise_first(power)
+            result = stack[0]
+            if result.__class__ is DeferredPower:
+                result = power(result.base, result.exponent)
+        return result
+
+    def eval_batch(self, bindings: Mapping[str, Any], program: str = ""):
+        """
+        Evaluate the program once over whole arrays of variable values,
+        one vectorised operation per instruction. Requires NumPy
+
+        :param bindings: mapping of identifiers to arrays (or sequences)
+         of values, such as a dict of columns
+        :param program: optional program to be evaluated
+        :return: NumPy array with one result per row of bindings
+        """
+        from expr_calc.vectorized import eval_batch
+
+        return eval_batch(self.compile(program), bindings)
 
-    def repl(self) -> None:
+    def repl(self, postfix: bool = False) -> None:
         """
         Run a REPL to evaluate expressions on the fly
+        :param postfix: read postfix programs instead of infix ones
         :return: None
         """
         print("WELCOME TO EXPRESSION INTERPRETER!")
@@ -134,7 +680,32 @@ class Calc:
                     print("goodbye")
                     break
 
-                print(self.eval(), end="\n\n")
+                if self.program.strip() in (":stats", ":stats reset"):
+                    if self.stats is None:
+                        print("Instrumentation is disabled, start with Calc(instrument=True)", end="\n\n")
+                    elif self.program.strip() == ":stats":
+                        print(self.stats, end="\n\n")
+                    else:
+                        self.stats.reset()
+                    continue
+
+                if self.program.strip() in (":paths", ":paths reset"):
+                    if self.adaptive is None:
+                        print("Adaptive evaluation is disabled, start with Calc(adaptive=True)", end="\n\n")
+                    elif self.program.strip() == ":paths":
+                        print(self.adaptive, end="\n\n")
+                    else:
+                        self.adaptive.reset()
+                    continue
+
+                if self.program.strip() == ":shapes":
+                    if self.shapes is None:
+                        print("Shape caching is disabled, start with Calc(shape_cache_size=...)", end="\n\n")
+                    else:
+                        print(self.shapes.info(), end="\n\n")
+                    continue
+
+                print(self.eval_postfix() if postfix else self.eval(), end="\n\n")
             except NoProgramLoaded as npl:
                 print(npl)
             except TokenError as te:
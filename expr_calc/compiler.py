@@ -0,0 +1,248 @@
+from collections import Counter
+from decimal import Decimal
+
+from expr_calc.token import TokenType
+from expr_calc.backends import Backend, DEFAULT_BACKEND
+from expr_calc.tree import Tree, lookup
+
+from typing import AbstractSet, Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+
+# opcodes of the postfix instruction set
+PUSH_CONST = 0
+BINARY_OP = 1
+UNARY_OP = 2
+LOAD_NAME = 3
+STORE_TEMP = 4      # copy the top of the stack into a temporary
+LOAD_TEMP = 5       # push a temporary, used for common subexpressions
+POW_MOD = 6         # a ^ b % m fused into one operation
+CALL = 7            # call a Function with the arguments on top of the stack
+
+# symbol of the fused operation of POW_MOD in Program.symbols
+POW_MOD_SYMBOL = "^%"
+
+OPCODE_NAMES = {
+    PUSH_CONST: "PUSH_CONST",
+    BINARY_OP: "BINARY_OP",
+    UNARY_OP: "UNARY_OP",
+    LOAD_NAME: "LOAD_NAME",
+    STORE_TEMP: "STORE_TEMP",
+    LOAD_TEMP: "LOAD_TEMP",
+    POW_MOD: "POW_MOD",
+    CALL: "CALL",
+}
+
+
+def is_powmod(node: Tree) -> bool:
+    """
+    Check if a node is a ^ b % m, which can be computed without
+    building a ^ b. Powers shared with other nodes are fused as well,
+    since powmod only needs their operands, which may differ from the
+    rounded value of a ^ b stored for the other nodes
+
+    :param node: node to be checked
+    :return: if the node can be fused
+    """
+    if node.node.type_ is not TokenType.BINARY_OP or node.node.val != "%":
+        return False
+    power = node.children[0].node
+    return power.type_ is TokenType.BINARY_OP and power.val == "^"
+
+
+class Program:
+
+    def __init__(self, code: Tuple[Tuple[int, int], ...], consts: Tuple[Decimal, ...],
+                 funcs: Tuple[Callable, ...], symbols: Tuple[str, ...] = (),
+                 names: Tuple[str, ...] = (), tree: Optional[Tree] = None,
+                 nodes_removed: int = 0, backend: Backend = DEFAULT_BACKEND, temps: int = 0) -> None:
+        """
+        Flat postfix program that can be executed by a stack machine
+
+        :param code: instructions as (opcode, operand index) pairs
+        :param consts: constants referenced by PUSH_CONST instructions
+        :param funcs: operator functions referenced by BINARY_OP and UNARY_OP,
+         and Functions referenced by CALL
+        :param symbols: operator symbol or call of each entry in funcs, used for display
+        :param names: identifiers referenced by LOAD_NAME instructions
+        :param tree: abstract syntax tree the program was compiled from,
+         before any optimisation
+        :param nodes_removed: number of tree nodes removed by the optimiser
+        :param backend: numeric backend funcs were taken from, its context
+         is installed while running
+        :param temps: number of temporaries used by STORE_TEMP and LOAD_TEMP
+        """
+        self.code = code
+        self.consts = consts
+        self.funcs = funcs
+        self.symbols = symbols
+        self.names = names
+        self.tree = tree
+        self.nodes_removed = nodes_removed
+        self.backend = backend
+        self.temps = temps
+
+    def run(self, variables: Optional[Mapping[str, Any]] = None,
+            consts: Optional[Sequence[Any]] = None) -> Decimal:
+        """
+        Execute the program on a value stack without recursion
+
+        :param variables: values of the identifiers in the program
+        :param consts: values replacing the constants of the program,
+         such as the numbers of another program of the same shape
+        :return: final value
+        """
+        consts = self.consts if consts is None else consts
+        funcs = self.funcs
+        stack: List[Decimal] = []
+        push = stack.append
+        pop = stack.pop
+        temps = [None] * self.temps
+
+        with self.backend.activate():
+            for opcode, arg in self.code:
+                if opcode == PUSH_CONST:
+                    push(consts[arg])
+                elif opcode == BINARY_OP:
+                    operand_b = pop()
+                    stack[-1] = funcs[arg](stack[-1], operand_b)
+                elif opcode == UNARY_OP:
+                    stack[-1] = funcs[arg](stack[-1])
+                elif opcode == POW_MOD:
+                    modulus = pop()
+                    exponent = pop()
+                    stack[-1] = funcs[arg](stack[-1], exponent, modulus)
+                elif opcode == CALL:
+                    function = funcs[arg]
+                    count = function.arity
+                    arguments = stack[len(stack) - count:]
+                    del stack[len(stack) - count:]
+                    push(function.call(*arguments))
+                elif opcode == LOAD_NAME:
+                    push(lookup(self.names[arg], variables))
+                elif opcode == LOAD_TEMP:
+                    push(temps[arg])
+                else:
+                    temps[arg] = stack[-1]
+
+        return stack[-1]
+
+    def op_counts(self) -> Counter:
+        """
+        Count the operators applied by one run of the program, unary
+        operators are prefixed with "unary" to tell them from binary ones
+        and calls are keyed by the function name and its parentheses
+
+        :return: number of applications keyed by operator
+        """
+        counts = Counter()
+        for opcode, arg in self.code:
+            if opcode == BINARY_OP or opcode == POW_MOD or opcode == CALL:
+                counts[self.symbols[arg]] += 1
+            elif opcode == UNARY_OP:
+                counts[f"unary {self.symbols[arg]}"] += 1
+        return counts
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def __iter__(self):
+        return iter(self.code)
+
+    def __repr__(self) -> str:
+        words = []
+        for opcode, arg in self.code:
+            if opcode == PUSH_CONST:
+                words.append(str(self.consts[arg]))
+            elif opcode == LOAD_NAME:
+                words.append(self.names[arg])
+            elif opcode == LOAD_TEMP:
+                words.append(f"${arg}")
+            elif opcode == STORE_TEMP:
+                words.append(f"=${arg}")
+            else:
+                words.append(self.symbols[arg])
+        return f"Program({' '.join(words)})"
+
+
+def compile_tree(tree: Tree, source: Optional[Tree] = None, nodes_removed: int = 0,
+                 backend: Backend = DEFAULT_BACKEND, shared: AbstractSet[int] = frozenset()) -> Program:
+    """
+    Compile an abstract syntax tree into a flat postfix Program.
+    The tree is walked in postorder with an explicit stack so that
+    compilation does not recurse. Shared nodes of a DAG are computed
+    once, stored in a temporary and loaded wherever they appear again,
+    a ^ b % m is compiled into a single POW_MOD instruction and calls
+    into CALL instructions of the already resolved Function
+
+    :param tree: abstract syntax tree produced by Calc.parse
+    :param source: parsed tree that tree was optimised from, if any
+    :param nodes_removed: number of nodes the optimiser removed
+    :param backend: numeric backend providing the operators
+    :param shared: ids of the nodes with more than one parent, as
+     recorded by HashConser
+    :return: compiled program
+    """
+    code: List[Tuple[int, int]] = []
+    consts: List[Decimal] = []
+    funcs: List[Callable] = []
+    symbols: List[str] = []
+    names: List[str] = []
+    func_index = {}
+    name_index = {}
+    temp_index: Dict[int, int] = {}     # id of a shared node -> its temporary
+    fused: Set[int] = set()     # ids of the a ^ b % m nodes compiled to POW_MOD
+
+    def operator_index(type_: TokenType, symbol: Any) -> int:
+        key = (type_, symbol)
+        if key not in func_index:
+            if type_ is TokenType.FUNCTION:
+                func, symbol = symbol, f"{symbol.name}()"
+            elif symbol == POW_MOD_SYMBOL:
+                func = backend.powmod
+            elif type_ is TokenType.BINARY_OP:
+                func = backend.op_map[symbol]
+            else:
+                func = backend.unary_op_map[symbol]
+            func_index[key] = len(funcs)
+            funcs.append(func)
+            symbols.append(symbol)
+        return func_index[key]
+
+    # (node, visited) pairs, a node is emitted once its children are
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        type_, val = node.node
+
+        if id(node) in temp_index:
+            code.append((LOAD_TEMP, temp_index[id(node)]))
+        elif type_ is TokenType.NUMBER:
+            code.append((PUSH_CONST, len(consts)))
+            consts.append(val)
+        elif type_ is TokenType.IDENTIFIER:
+            if val not in name_index:
+                name_index[val] = len(names)
+                names.append(val)
+            code.append((LOAD_NAME, name_index[val]))
+        elif visited:
+            if id(node) in fused:
+                code.append((POW_MOD, operator_index(type_, POW_MOD_SYMBOL)))
+            elif type_ is TokenType.FUNCTION:
+                code.append((CALL, operator_index(type_, val)))
+            else:
+                opcode = BINARY_OP if type_ is TokenType.BINARY_OP else UNARY_OP
+                code.append((opcode, operator_index(type_, val)))
+            if id(node) in shared:
+                temp_index[id(node)] = len(temp_index)
+                code.append((STORE_TEMP, temp_index[id(node)]))
+        else:
+            stack.append((node, True))
+            children = node.children
+            if is_powmod(node):
+                fused.add(id(node))
+                children = node.children[0].children + node.children[1:]
+            for child in reversed(children):
+                stack.append((child, False))
+
+    return Program(tuple(code), tuple(consts), tuple(funcs), tuple(symbols),
+                   tuple(names), source or tree, nodes_removed, backend, len(temp_index))
@@ -0,0 +1,125 @@
+from expr_calc.backends import Backend, DEFAULT_BACKEND
+from expr_calc.compiler import is_powmod
+from expr_calc.functions import memo_key
+from expr_calc.token import Token, TokenType
+from expr_calc.tree import Tree, lookup
+
+from typing import Any, Dict, Hashable, Mapping, Optional, Set, Tuple
+
+
+def exact_key(token: Token) -> Hashable:
+    """
+    Key telling apart tokens that are equal but evaluate differently,
+    such as 2 and 2.0 as Decimals, 0.0 and -0.0 as floats or 2 as an
+    int and as a Decimal
+
+    :param token: token of a node
+    :return: hashable key of the token
+    """
+    if token.type_ is TokenType.NUMBER:
+        return token.type_, type(token.val), memo_key(token.val)
+    return token
+
+
+class HashConser:
+
+    def __init__(self) -> None:
+        """
+        Builder turning trees into DAGs in which every distinct
+        subexpression is a single node. Nodes are looked up by their
+        exact token and the identity of their already shared children,
+        so a lookup is O(1) regardless of the size of the subtree.
+        The table is kept across builds, so subexpressions are shared
+        between every tree built by the same builder
+        """
+        self.table: Dict[Tuple[Hashable, Tuple[int, ...]], Tree] = {}
+        self.shared: Set[int] = set()   # ids of nodes with more than one parent
+        self.hits = 0
+
+    def build(self, tree: Tree) -> Tree:
+        """
+        Build the DAG of a tree without recursion, the tree itself is
+        not modified
+
+        :param tree: abstract syntax tree
+        :return: root of the DAG
+        """
+        done: Dict[int, Tree] = {}      # id of an original node -> shared node
+
+        stack = [(tree, False)]
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in done:
+                # the same object reached twice is shared as well
+                self.shared.add(id(done[id(node)]))
+                continue
+            if node.children and not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            children = tuple(done[id(child)] for child in node.children)
+            key = (exact_key(node.node), tuple(id(child) for child in children))
+            if node.node.type_ is TokenType.FUNCTION and not node.node.val.pure:
+                # every call of an impure function is made
+                key += (id(node),)
+            shared = self.table.get(key)
+            if shared is None:
+                shared = self.table[key] = Tree(node.node, children)
+                hash(shared)    # children are hashed already, so this is O(1)
+            else:
+                self.hits += 1
+                self.shared.add(id(shared))
+            done[id(node)] = shared
+
+        return done[id(tree)]
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def eval_dag(root: Tree, variables: Optional[Mapping[str, Any]] = None,
+             backend: Backend = DEFAULT_BACKEND) -> Any:
+    """
+    Evaluate a DAG, each distinct node is evaluated once and its
+    value reused by every parent. A ^ b % m is computed with the
+    powmod of the backend, so a ^ b is only built for its other parents
+
+    :param root: root of a DAG built by HashConser, plain trees work too
+    :param variables: values of the identifiers in the DAG
+    :param backend: numeric backend providing the operators
+    :return: final value
+    """
+    op_map, unary_op_map = backend.op_map, backend.unary_op_map
+    values: Dict[int, Any] = {}
+    fused: Dict[int, Tuple[Tree, ...]] = {}     # id of a ^ b % m node -> a, b, m
+
+    with backend.activate():
+        stack = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in values:
+                continue
+            type_, val = node.node
+
+            if type_ is TokenType.NUMBER:
+                values[id(node)] = val
+            elif type_ is TokenType.IDENTIFIER:
+                values[id(node)] = lookup(val, variables)
+            elif not visited:
+                stack.append((node, True))
+                children = node.children
+                if is_powmod(node):
+                    children = fused[id(node)] = node.children[0].children + node.children[1:]
+                stack.extend((child, False) for child in reversed(children))
+            elif id(node) in fused:
+                values[id(node)] = backend.powmod(*(values[id(child)] for child in fused[id(node)]))
+            elif type_ is TokenType.BINARY_OP:
+                operand_a, operand_b = node.children
+                values[id(node)] = op_map[val](values[id(operand_a)], values[id(operand_b)])
+            elif type_ is TokenType.FUNCTION:
+                values[id(node)] = val.call(*(values[id(child)] for child in node.children))
+            else:
+                values[id(node)] = unary_op_map[val](values[id(node.children[0])])
+
+    return values[id(root)]
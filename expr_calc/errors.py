@@ -8,3 +8,23 @@ class ExcessiveDotError(SyntaxError):
 
 class TokenError(SyntaxError):
     ...
+
+
+class UndefinedVariable(NameError):
+    ...
+
+
+class UndefinedFunction(NameError):
+    ...
+
+
+class BatchError(Exception):
+    ...
+
+
+class CyclicDependency(ValueError):
+    ...
+
+
+class StoreFormatError(ValueError):
+    ...
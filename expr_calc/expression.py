@@ -0,0 +1,220 @@
+"""
+Stateless evaluation API that any number of threads can use at once.
+
+A Calc keeps the program, tokens and tree of its last evaluation, so a
+single instance cannot serve several threads. Here nothing is stored
+but immutable compiled expressions, each bound to the Decimal context it
+was compiled in, and evaluations install that context with
+decimal.localcontext, so a precision never leaks from one caller into
+another. No locks are taken, so on free-threaded builds evaluations
+scale across cores::
+
+    expression = compile_expression("price * (1 + rate)", precision=10)
+    expression({"price": Decimal("9.99"), "rate": Decimal("0.2")})
+    evaluate("1 / 3", context=Context(prec=5))
+    evaluate_batch(["1 + 1", "2 ^ 0.5"], max_workers=8)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Context, getcontext, localcontext
+
+from expr_calc.backends import Backend, DecimalBackend, decimal_context_key, get_backend
+from expr_calc.batch import EXPRESSION_ERRORS
+from expr_calc.calc import Calc, optimise_tree, parse_tokens
+from expr_calc.compiler import Program, compile_tree
+from expr_calc.functions import FunctionRegistry, builtin_functions
+from expr_calc.lexer import Lexer
+
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+
+
+# compiled expressions of evaluate(), the cache is emptied once it holds
+# this many. It is shared by threads without a lock, for the reasons given
+# at functions.MEMO_SIZE
+CACHE_SIZE = 1024
+
+_cache: Dict[Hashable, "Expression"] = {}
+
+
+class Expression:
+
+    __slots__ = ("source", "program")
+
+    def __init__(self, source: str, program: Program) -> None:
+        """
+        Compiled expression that is never modified after it is built,
+        so it can be shared by any number of threads. Each evaluation
+        runs on its own stack in a private copy of the backend's context
+
+        :param source: expression the program was compiled from
+        :param program: compiled program, bound to its backend
+        """
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "program", program)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"cannot assign to field {name!r}")
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        """Identifiers of the expression"""
+        return self.program.names
+
+    @property
+    def backend(self) -> Backend:
+        return self.program.backend
+
+    def __call__(self, variables: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Evaluate the expression
+
+        :param variables: values of the identifiers in the expression
+        :return: final value
+        """
+        return self.program.run(variables)
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+def resolve_backend(backend: Union[str, Backend, None] = None, precision: Optional[int] = None,
+                    context: Optional[Context] = None) -> Backend:
+    """
+    Resolve backend settings into a Backend. Decimal backends are
+    always bound to a context, if neither precision nor context is
+    given the current context of the calling thread is captured
+
+    :param backend: name of a backend, a Backend, or None for Decimal
+    :param precision: digits of precision, only valid for Decimal
+    :param context: Decimal context, only valid for Decimal
+    :return: Backend object
+    """
+    if isinstance(backend, Backend) or (backend or "decimal") != "decimal":
+        if context is not None:
+            raise ValueError("context can only be given with the decimal backend name")
+        return get_backend(backend, precision)
+    if precision is None and context is None:
+        context = getcontext()
+    return DecimalBackend(precision, context)
+
+
+def compile_expression(source: str, *, backend: Union[str, Backend, None] = None,
+                       precision: Optional[int] = None, context: Optional[Context] = None,
+                       optimize: bool = True, functions: Optional[FunctionRegistry] = None) -> Expression:
+    """
+    Compile an expression without any shared state
+
+    :param source: expression to be compiled
+    :param backend: name of the numeric backend, or a Backend
+    :param precision: digits of precision of the decimal backend
+    :param context: Decimal context to compile and evaluate in, it is
+     copied, by default the current context of the thread is captured
+    :param optimize: fold constants and share common subexpressions
+    :param functions: functions that can be called, by default the
+     built-in ones of the backend
+    :return: immutable compiled expression
+    """
+    resolved = resolve_backend(backend, precision, context)
+    functions = builtin_functions(resolved) if functions is None else functions
+    tree = parse_tokens(Lexer.scan(source, resolved.literal), functions=functions)
+    if not optimize:
+        return Expression(source, compile_tree(tree, backend=resolved))
+    optimised, removed, shared = optimise_tree(tree, resolved)
+    return Expression(source, compile_tree(optimised, tree, removed, resolved, shared))
+
+
+def _cache_key(source: str, backend: Union[str, Backend, None], precision: Optional[int],
+               context: Optional[Context], optimize: bool, functions: Optional[FunctionRegistry]) -> Hashable:
+    # registries compare by identity, and their functions are never replaced
+    key = (Calc.normalise(source), optimize, backend, functions)
+    if isinstance(backend, Backend):
+        return key + (backend.context_key(),)
+    if (backend or "decimal") != "decimal":
+        return key + (precision,)
+    if context is None:
+        context = getcontext() if precision is None else Context(prec=precision)
+    return key + (decimal_context_key(context),)
+
+
+def evaluate(source: str, variables: Optional[Mapping[str, Any]] = None, *,
+             backend: Union[str, Backend, None] = None, precision: Optional[int] = None,
+             context: Optional[Context] = None, optimize: bool = True,
+             functions: Optional[FunctionRegistry] = None) -> Any:
+    """
+    Evaluate an expression without any shared mutable state. Compiled
+    expressions are cached by their source and settings
+
+    :param source: expression to be evaluated
+    :param variables: values of the identifiers in the expression
+    :param backend: name of the numeric backend, or a Backend
+    :param precision: digits of precision of the decimal backend
+    :param context: Decimal context to evaluate in, by default the
+     current context of the thread
+    :param optimize: fold constants and share common subexpressions
+    :param functions: functions that can be called, by default the
+     built-in ones of the backend
+    :return: final value
+    """
+    key = _cache_key(source, backend, precision, context, optimize, functions)
+    expression = _cache.get(key)
+    if expression is None:
+        expression = compile_expression(source, backend=backend, precision=precision,
+                                        context=context, optimize=optimize, functions=functions)
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = expression
+    return expression(variables)
+
+
+def _evaluate_chunk(sources: List[str], variables: Optional[Mapping[str, Any]], context: Context,
+                    return_exceptions: bool, settings: Dict[str, Any]) -> List[Any]:
+    results = []
+    # the task works on its own copy of the caller's context
+    with localcontext(context):
+        for source in sources:
+            try:
+                results.append(evaluate(source, variables, **settings))
+            except EXPRESSION_ERRORS as error:
+                if not return_exceptions:
+                    raise
+                results.append(error)
+    return results
+
+
+def evaluate_batch(sources: Iterable[str], variables: Optional[Mapping[str, Any]] = None, *,
+                   backend: Union[str, Backend, None] = None, precision: Optional[int] = None,
+                   context: Optional[Context] = None, optimize: bool = True,
+                   functions: Optional[FunctionRegistry] = None,
+                   max_workers: Optional[int] = None, chunk_size: int = 256,
+                   return_exceptions: bool = False) -> List[Any]:
+    """
+    Evaluate expressions in a pool of threads. Each task runs in an
+    isolated copy of the given context, or of the caller's context, so
+    the results do not depend on the threads they ran in
+
+    :param sources: expressions to be evaluated
+    :param variables: values of the identifiers, shared by every expression
+    :param backend: name of the numeric backend, or a Backend
+    :param precision: digits of precision of the decimal backend
+    :param context: Decimal context to evaluate in
+    :param optimize: fold constants and share common subexpressions
+    :param functions: functions that can be called, by default the
+     built-in ones of the backend
+    :param max_workers: number of threads, see ThreadPoolExecutor
+    :param chunk_size: number of expressions evaluated by each task
+    :param return_exceptions: put the error of a failing expression in
+     place of its result instead of raising it
+    :return: results in the order of sources
+    """
+    sources = list(sources)
+    task_context = getcontext() if context is None else context
+    settings = {"backend": backend, "precision": precision, "optimize": optimize, "functions": functions}
+    chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        tasks = [executor.submit(_evaluate_chunk, chunk, variables, task_context, return_exceptions, settings)
+                 for chunk in chunks]
+        try:
+            return [result for task in tasks for result in task.result()]
+        finally:
+            for task in tasks:
+                task.cancel()
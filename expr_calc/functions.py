@@ -0,0 +1,258 @@
+import math
+from collections import OrderedDict
+from decimal import Decimal, getcontext
+
+from expr_calc.backends import Backend, DecimalBackend, decimal_context_key
+from expr_calc.errors import TokenError, UndefinedFunction
+
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+
+# results kept by the memo of a memoized function, the least recently
+# used one is evicted past this many. Memos may be shared by threads
+# without a lock: every OrderedDict operation is atomic, an entry another
+# thread evicted meanwhile is simply missed, and two threads making the
+# same call at once only waste the work of one of them
+MEMO_SIZE = 256
+
+
+def memo_key(value: Any) -> Hashable:
+    """
+    Key telling apart arguments that are equal but give different
+    results, such as Decimal 1 and 1.0, or 0.0 and -0.0
+
+    :param value: argument of a call
+    :return: hashable key of the argument
+    """
+    if isinstance(value, Decimal):
+        return value.as_tuple()
+    if isinstance(value, float):
+        return value.hex()
+    return type(value), value
+
+
+class Function:
+
+    __slots__ = ("name", "impl", "arity", "pure", "memo", "memo_size", "call")
+
+    def __init__(self, name: str, impl: Callable, arity: Optional[int] = 1, pure: bool = False,
+                 memo: Optional["OrderedDict[Hashable, Any]"] = None, memo_size: int = MEMO_SIZE) -> None:
+        """
+        Function that can be called from expressions. Calls are made
+        through self.call, which is impl itself unless results are
+        memoized
+
+        :param name: name the function is called by
+        :param impl: implementation, called with the argument values
+        :param arity: number of arguments, None takes one or more
+        :param pure: results only depend on the arguments and the
+         Decimal context, so calls on constants can be folded
+        :param memo: results of calls by arguments, only for pure functions
+        :param memo_size: number of results kept, the least recently
+         used are evicted past it
+        """
+        self.name = name
+        self.impl = impl
+        self.arity = arity
+        self.pure = pure
+        self.memo = memo
+        self.memo_size = memo_size
+        self.call: Callable = impl if memo is None else self._memoized
+
+    def _memoized(self, *args: Any) -> Any:
+        # results are rounded to the context, so it is part of the key
+        key = (tuple(memo_key(arg) for arg in args), decimal_context_key(getcontext()))
+        memo = self.memo
+        try:
+            result = memo[key]
+        except KeyError:
+            result = memo[key] = self.impl(*args)
+            if len(memo) > self.memo_size:
+                try:
+                    memo.popitem(last=False)
+                except KeyError:
+                    pass
+            return result
+        try:
+            memo.move_to_end(key)
+        except KeyError:
+            pass
+        return result
+
+    def bind(self, count: int) -> "Function":
+        """
+        Fix the number of arguments of a function taking any number,
+        the memo is shared with the bound function
+
+        :param count: number of arguments of the call
+        :return: function with arity count
+        """
+        return Function(self.name, self.impl, count, self.pure, self.memo, self.memo_size)
+
+    def __call__(self, *args: Any) -> Any:
+        return self.call(*args)
+
+    def __eq__(self, other: Any) -> bool:
+        # the same function bound by two registries is equal, so are trees calling it
+        if other.__class__ is not Function:
+            return NotImplemented
+        return (self.name == other.name and self.impl is other.impl and self.arity == other.arity
+                and self.pure == other.pure and self.memo is other.memo)
+
+    def __hash__(self) -> int:
+        return hash((self.name, self.arity))
+
+    def __repr__(self) -> str:
+        return f"{self.name}/{'n' if self.arity is None else self.arity}"
+
+
+class FunctionRegistry:
+
+    def __init__(self, registry: Optional["FunctionRegistry"] = None) -> None:
+        """
+        Functions callable from expressions by name. Names are resolved
+        once when an expression is parsed, so calls are dispatched
+        straight to the implementation when it is evaluated. Functions
+        cannot be replaced once registered, so compiled programs never
+        go stale
+
+        :param registry: registry whose functions are copied, memos
+         are shared with it
+        """
+        self._functions: Dict[str, Function] = {} if registry is None else dict(registry._functions)
+        self._bound: Dict[Tuple[str, int], Function] = {}
+
+    def register(self, name: str, impl: Callable, arity: Optional[int] = 1, pure: bool = False,
+                 memoize: bool = False, memo_size: int = MEMO_SIZE) -> Function:
+        """
+        Make a function callable from expressions
+
+        :param name: name the function is called by, an identifier
+        :param impl: implementation, called with the argument values
+         under the Decimal context of the backend
+        :param arity: number of arguments, None takes one or more
+        :param pure: results only depend on the arguments and the
+         Decimal context, calls on constants are then folded
+        :param memoize: keep the results of up to memo_size distinct
+         calls, which requires pure
+        :param memo_size: number of results kept, the least recently used
+         are evicted past it
+        :return: registered function
+        """
+        if not name.isidentifier():
+            raise ValueError(f"{name!r} is not a valid function name")
+        if name in self._functions:
+            raise ValueError(f"function {name} is already registered")
+        if memoize and not pure:
+            raise ValueError("only pure functions can be memoized")
+        function = Function(name, impl, arity, pure, OrderedDict() if memoize else None, memo_size)
+        self._functions[name] = function
+        return function
+
+    def resolve(self, name: str, count: int) -> Function:
+        """
+        Find the function called by name with count arguments
+
+        :param name: name of the function
+        :param count: number of arguments of the call
+        :return: function with arity count
+        """
+        function = self._functions.get(name)
+        if function is None:
+            raise UndefinedFunction(f"Function {name} is not defined")
+        if function.arity is None:
+            if not count:
+                raise TokenError(f"Function {name} takes at least 1 argument\n")
+            bound = self._bound.get((name, count))
+            if bound is None:
+                bound = self._bound[(name, count)] = function.bind(count)
+            return bound
+        if count != function.arity:
+            raise TokenError(f"Function {name} takes {function.arity} arguments, {count} given\n")
+        return function
+
+    def __getitem__(self, name: str) -> Function:
+        return self._functions[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._functions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._functions)
+
+    def __len__(self) -> int:
+        return len(self._functions)
+
+    def __repr__(self) -> str:
+        return f"FunctionRegistry({', '.join(map(repr, self._functions.values()))})"
+
+
+def decimal(x: Any) -> Decimal:
+    """Promote an argument to a Decimal, ints are exact"""
+    return x if isinstance(x, Decimal) else Decimal(x)
+
+
+def decimal_sqrt(x) -> Decimal:
+    """Square root rounded to the context"""
+    return decimal(x).sqrt()
+
+
+def decimal_ln(x) -> Decimal:
+    """Natural logarithm rounded to the context"""
+    return decimal(x).ln()
+
+
+def decimal_log(x) -> Decimal:
+    """Base 10 logarithm rounded to the context"""
+    return decimal(x).log10()
+
+
+def decimal_exp(x) -> Decimal:
+    """e raised to x rounded to the context"""
+    return decimal(x).exp()
+
+
+def minimum(*args):
+    """Smallest argument, there may be a single one"""
+    return min(args)
+
+
+def maximum(*args):
+    """Largest argument, there may be a single one"""
+    return max(args)
+
+
+def register_builtins(registry: FunctionRegistry, sqrt: Callable, ln: Callable, log: Callable,
+                      exp: Callable) -> FunctionRegistry:
+    """
+    Register the built-in functions. The transcendental ones are slow
+    at high precision, so they are memoized
+
+    :param registry: registry to register them in
+    :return: registry
+    """
+    registry.register("sqrt", sqrt, pure=True, memoize=True)
+    registry.register("ln", ln, pure=True, memoize=True)
+    registry.register("log", log, pure=True, memoize=True)
+    registry.register("exp", exp, pure=True, memoize=True)
+    registry.register("abs", abs, pure=True)
+    registry.register("min", minimum, arity=None, pure=True)
+    registry.register("max", maximum, arity=None, pure=True)
+    return registry
+
+
+# built-in functions of the decimal backend, the other backends compute
+# them with the floats of the math module
+BUILTINS = register_builtins(FunctionRegistry(), decimal_sqrt, decimal_ln, decimal_log, decimal_exp)
+MATH_BUILTINS = register_builtins(FunctionRegistry(), math.sqrt, math.log, math.log10, math.exp)
+
+
+def builtin_functions(backend: Backend) -> FunctionRegistry:
+    """
+    Get the built-in functions matching the numbers of a backend
+
+    :param backend: numeric backend
+    :return: registry of the built-in functions, to be copied before
+     registering anything else
+    """
+    return BUILTINS if isinstance(backend, DecimalBackend) else MATH_BUILTINS
@@ -1,16 +1,77 @@
 from decimal import Decimal
 
 from expr_calc.token import Token, TokenType
-from expr_calc.operators import OP_LIST, op_map, unary_op_map
+from expr_calc.operators import OP_LIST, unary_op_map
 from expr_calc.errors import NoProgramLoaded, ExcessiveDotError, TokenError
 
-from typing import Optional, List
+from typing import Any, Callable, Iterable, Iterator, Optional, List, Tuple
+import re
+
+
+OPERANDS = (TokenType.NUMBER, TokenType.IDENTIFIER)
+
+# token types after which + and - are binary operators
+UNARY_FOLLOWS_NOT = OPERANDS + (TokenType.R_PAREN,)
+
+# operator and parenthesis tokens carry nothing but their symbol, so a
+# single interned instance of each is shared by every program
+BINARY_TOKENS = {op: Token(TokenType.BINARY_OP, op) for op in OP_LIST}
+UNARY_TOKENS = {op: Token(TokenType.UNARY_OP, op) for op in unary_op_map}
+PAREN_TOKENS = {"(": Token(TokenType.L_PAREN, "("), ")": Token(TokenType.R_PAREN, ")")}
+COMMA_TOKEN = Token(TokenType.COMMA, ",")
+
+# characters that always make up a token on their own
+DELIMITERS = tuple(OP_LIST) + ("(", ")", ",")
+
+# whitespace and stray dots are skipped, anything else unmatched is an error
+TOKEN_PATTERN = re.compile(r"""
+    (?P<number>\d+(?:\.\d*)?|\.\d+)
+  | (?P<function>[^\W\d]\w*)\s*\(
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>[""" + re.escape("".join(OP_LIST)) + r"""])
+  | (?P<paren>[()])
+  | (?P<comma>,)
+  | (?P<skip>[\s.]+)
+  | (?P<error>.)
+""", re.VERBOSE)
+
+# postfix operators always follow their operands, so every sign is
+# binary and negation is spelled ~ instead
+NEGATE = "~"
+
+POSTFIX_PATTERN = re.compile(r"""
+    (?P<number>\d+(?:\.\d*)?|\.\d+)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>[""" + re.escape("".join(OP_LIST)) + r"""])
+  | (?P<negate>""" + re.escape(NEGATE) + r""")
+  | (?P<skip>[\s.]+)
+  | (?P<error>.)
+""", re.VERBOSE)
+
+
+def excessive_dot() -> ExcessiveDotError:
+    return ExcessiveDotError("Wrong use of dot for numbers. Number can only have 1 dot\n")
+
+
+def unrecognised(program: str, match: "re.Match") -> TokenError:
+    """Error pointing at the character of program that no token matched"""
+    space = " " * match.start()
+    return TokenError(f"{program}\n"
+                      f"{space}^^^\n"
+                      f"Character {match.group()} is not recognised")
 
 
 class Lexer:
 
-    def __init__(self, program: str = "") -> None:
+    def __init__(self, program: str = "", literal: Callable[[str], Any] = Decimal) -> None:
+        """
+        Lexer turning programs into tokens
+
+        :param program: program to be lexed
+        :param literal: constructor for the value of number tokens
+        """
         self.program = program
+        self.literal = literal
 
     @classmethod
     def tokenise(cls, lexeme: str) -> Optional[TokenType]:
@@ -23,6 +84,8 @@ class Lexer:
         """
         if lexeme.isdigit():
             return TokenType.NUMBER
+        elif lexeme.isidentifier():
+            return TokenType.IDENTIFIER
         elif lexeme in OP_LIST:
             return TokenType.BINARY_OP
         elif lexeme == "(":
@@ -34,7 +97,9 @@ class Lexer:
         """
         Lexes the program given or at self.program. Anything that
         is not a valid token is ignored except for literal dot (.)
-        which is used for decimal points
+        which is used for decimal points. Identifiers start with a
+        letter or underscore and may contain digits after that, an
+        identifier followed by an opening parenthesis calls a function
 
         :param program: optional program to translated into a list of Token objects
         :return:
@@ -45,59 +110,156 @@ class Lexer:
         if self.program.isspace() or not self.program:
             raise NoProgramLoaded("No expression loaded\n")
 
-        tokens: List[Token] = []
-        program_length = len(self.program)  # will fail if self.program is None as well
-        temp_digit = []  # stack for digit chars and decimal sign
-        digit_flag = False  # flag when digit is encountered
-        dot_flag = False    # flag when dot is encountered
-
-        for i, char in enumerate(self.program):
-            token = Lexer.tokenise(char)
-
-            space = " " * i
-            if not token and char not in {" ", "."}:
-                raise TokenError(f"{self.program}\n"
-                                 f"{space}^^^\n"
-                                 f"Character {char} is not recognised")
-
-            if token is TokenType.NUMBER:
-                temp_digit.append(char)
-
-                # checks if current char which is a number is the last char
-                if i + 1 == program_length:
-                    tokens.append(Token(TokenType.NUMBER, Decimal("".join(temp_digit))))
-                digit_flag = True
-
-            else:
-
-                # current token is not a digit anymore
-                if digit_flag:
-                    if not dot_flag and char == ".":     # possible decimal point
-                        temp_digit.append(char)
-                        dot_flag = True
-                    elif dot_flag and char == ".":
-                        raise ExcessiveDotError("Wrong use of dot for numbers."
-                                                " Number can only have 1 dot\n")
-                    else:
-                        tokens.append(Token(TokenType.NUMBER, Decimal("".join(temp_digit))))
-                        temp_digit.clear()
-                        digit_flag = False
-                        dot_flag = False
-
-                if token is TokenType.BINARY_OP:
-                    if char in unary_op_map and (not tokens or tokens[-1].type_ is not TokenType.NUMBER):
-                        temp_index = i
-                        while temp_index+1 < program_length:
-                            if Lexer.tokenise(self.program[temp_index+1]) in\
-                                    (TokenType.L_PAREN, TokenType.NUMBER, TokenType.BINARY_OP):
-                                tokens.append(Token(TokenType.UNARY_OP, char))
-                                break
-                            temp_index += 1
-                        # temp_digit.append(char)
-                    else:
-                        tokens.append(Token(TokenType.BINARY_OP, char))
-
-                elif token in (TokenType.L_PAREN, TokenType.R_PAREN):
-                    tokens.append(Token(token, char))
-
-        return tokens
+        return list(self.scan(self.program, self.literal))
+
+    @staticmethod
+    def scan(program: str, literal: Callable[[str], Any] = Decimal,
+             prev_type: Optional[TokenType] = None) -> Iterator[Token]:
+        """
+        Lazily lex a program in a single left to right pass. Numbers
+        and identifiers are matched whole by a compiled pattern, and
+        whether + or - is unary only depends on the previous token,
+        so tokens can be consumed as soon as they are produced
+
+        :param program: program to be lexed
+        :param literal: constructor for the value of number tokens
+        :param prev_type: type of the token before program when it
+         continues an earlier piece of the same program
+        :return: generator of tokens
+        """
+        for match in TOKEN_PATTERN.finditer(program):
+            kind = match.lastgroup
+            lexeme = match.group()
+
+            if kind == "number":
+                if program.startswith(".", match.end()):
+                    raise excessive_dot()
+                prev_type = TokenType.NUMBER
+                yield Token(TokenType.NUMBER, literal(lexeme))
+
+            elif kind == "op":
+                # a sign is unary unless it follows an operand or a closing paren
+                if lexeme in UNARY_TOKENS and prev_type not in UNARY_FOLLOWS_NOT:
+                    token = UNARY_TOKENS[lexeme]
+                else:
+                    token = BINARY_TOKENS[lexeme]
+                prev_type = token.type_
+                yield token
+
+            elif kind == "name":
+                prev_type = TokenType.IDENTIFIER
+                yield Token(TokenType.IDENTIFIER, lexeme)
+
+            elif kind == "paren":
+                token = PAREN_TOKENS[lexeme]
+                prev_type = token.type_
+                yield token
+
+            elif kind == "function":
+                prev_type = TokenType.FUNCTION
+                yield Token(TokenType.FUNCTION, match.group("function"))
+
+            elif kind == "comma":
+                prev_type = TokenType.COMMA
+                yield COMMA_TOKEN
+
+            elif kind == "error":
+                raise unrecognised(program, match)
+
+    @staticmethod
+    def shape(program: str, literal: Callable[[str], Any] = Decimal) -> Tuple[str, List[Any]]:
+        """
+        Split a program into its shape, the token sequence with every
+        number replaced by a # slot, and the values of its numbers in
+        order. Programs that only differ in their numbers, like
+        12.5 * 3 + 7 and 9.1 * 44 + 2, have the same shape, so a plan
+        parsed once per shape can be evaluated with the numbers of each
+
+        :param program: program to be split
+        :param literal: constructor for the value of number tokens
+        :return: shape, empty for a blank program, and number values
+        """
+        parts: List[str] = []
+        literals: List[Any] = []
+
+        for match in TOKEN_PATTERN.finditer(program):
+            kind = match.lastgroup
+            if kind == "number":
+                if program.startswith(".", match.end()):
+                    raise excessive_dot()
+                parts.append("#")
+                literals.append(literal(match.group()))
+            elif kind == "function":
+                parts.append(match.group("function") + "(")
+            elif kind == "error":
+                raise unrecognised(program, match)
+            elif kind != "skip":
+                parts.append(match.group())
+
+        # separated, so that x y and xy have different shapes
+        return " ".join(parts), literals
+
+    @staticmethod
+    def scan_stream(chunks: Iterable[str], literal: Callable[[str], Any] = Decimal) -> Iterator[Token]:
+        """
+        Lazily lex a program given as text chunks, which may split
+        tokens anywhere. Each chunk is lexed up to its last operator or
+        parenthesis, which always end a token, and the rest is carried
+        over to the next chunk, so only a chunk and one partial token
+        are held at a time
+
+        :param chunks: consecutive pieces of the program
+        :param literal: constructor for the value of number tokens
+        :return: generator of tokens
+        """
+        prev_type: Optional[TokenType] = None
+        carry = ""
+
+        for chunk in chunks:
+            text = carry + chunk
+            end = max(text.rfind(char) for char in DELIMITERS) + 1
+            if not end:
+                carry = text
+                continue
+            carry = text[end:]
+            for token in Lexer.scan(text[:end], literal, prev_type):
+                yield token
+            # the piece ends with an operator or parenthesis token
+            prev_type = token.type_
+
+        if carry:
+            yield from Lexer.scan(carry, literal, prev_type)
+
+    @staticmethod
+    def scan_postfix(program: str, literal: Callable[[str], Any] = Decimal) -> Iterator[Token]:
+        """
+        Lazily lex a postfix (RPN) program such as 1 2 + 3 *. Signs are
+        always binary operators and ~ negates its operand, so -x is
+        written x ~ and +x, which only rounds x, can be written x ~ ~
+
+        :param program: postfix program to be lexed
+        :param literal: constructor for the value of number tokens
+        :return: generator of tokens
+        """
+        negate = UNARY_TOKENS["-"]
+
+        for match in POSTFIX_PATTERN.finditer(program):
+            kind = match.lastgroup
+            lexeme = match.group()
+
+            if kind == "number":
+                if program.startswith(".", match.end()):
+                    raise excessive_dot()
+                yield Token(TokenType.NUMBER, literal(lexeme))
+
+            elif kind == "op":
+                yield BINARY_TOKENS[lexeme]
+
+            elif kind == "negate":
+                yield negate
+
+            elif kind == "name":
+                yield Token(TokenType.IDENTIFIER, lexeme)
+
+            elif kind == "error":
+                raise unrecognised(program, match)
@@ -0,0 +1,127 @@
+"""
+Load generator for the evaluation server, reporting latency percentiles
+and throughput.
+
+Start a server with ``python -m expr_calc.server`` and run
+``python -m expr_calc.loadgen --connections 8 --requests 100000``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from typing import Dict, List, NamedTuple, Sequence
+
+
+SAMPLE_EXPRESSIONS = (
+    "1 + 2 * 3",
+    "(4.5 - x) / 3 ^ 2",
+    "-(x + 1) * (x - 1) % 7",
+    "2 ^ 0.5 ^ 2",
+    "12345.678 * 9.87654321 - x / 3",
+)
+
+
+class LoadReport(NamedTuple):
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]      # seconds, sorted
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Latency below which the given fraction of requests completed
+
+        :param fraction: fraction between 0 and 1, such as 0.99
+        :return: latency in seconds
+        """
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(fraction * len(self.latencies)))
+        return self.latencies[index]
+
+    def __str__(self) -> str:
+        return (f"{self.requests} requests ({self.errors} errors) in {self.elapsed:.3f}s, "
+                f"{self.throughput:,.0f} req/s, "
+                f"p50 {self.percentile(0.5) * 1000:.3f}ms, p99 {self.percentile(0.99) * 1000:.3f}ms")
+
+
+async def _connection(host: str, port: int, requests: int, pipeline: int,
+                      expressions: Sequence[str], seed: int,
+                      latencies: List[float], errors: List[int]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(seed)
+    sent: Dict[int, float] = {}
+    window = asyncio.Semaphore(pipeline)
+
+    async def send() -> None:
+        for request_id in range(requests):
+            await window.acquire()
+            request = {"id": request_id, "expr": rng.choice(expressions), "vars": {"x": rng.randint(1, 100)}}
+            sent[request_id] = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+
+    async def receive() -> None:
+        for _ in range(requests):
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(response["id"]))
+            if "error" in response:
+                errors[0] += 1
+            window.release()
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+
+
+async def run_load(host: str = "127.0.0.1", port: int = 7878, connections: int = 4,
+                   requests: int = 10_000, pipeline: int = 32,
+                   expressions: Sequence[str] = SAMPLE_EXPRESSIONS, seed: int = 0) -> LoadReport:
+    """
+    Send requests over several connections, each keeping up to pipeline
+    requests in flight, and time every request from send to response
+
+    :param host: host of the server
+    :param port: port of the server
+    :param connections: number of concurrent connections
+    :param requests: number of requests per connection
+    :param pipeline: maximum unanswered requests per connection
+    :param expressions: expressions requests are picked from, x is
+     bound to a random integer
+    :param seed: seed of the expression choice, for repeatable runs
+    :return: latency and throughput of the run
+    """
+    latencies: List[float] = []
+    errors = [0]
+    began = time.perf_counter()
+    await asyncio.gather(*(
+        _connection(host, port, requests, pipeline, expressions, seed + i, latencies, errors)
+        for i in range(connections)
+    ))
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+    return LoadReport(len(latencies), errors[0], elapsed, latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluation server load generator")
+    parser.add_argument("--host", default="127.0.0.1", help="host of the server")
+    parser.add_argument("--port", type=int, default=7878, help="port of the server")
+    parser.add_argument("--connections", type=int, default=4, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=10_000, help="requests per connection")
+    parser.add_argument("--pipeline", type=int, default=32, help="requests in flight per connection")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the expression choice")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.host, args.port, args.connections,
+                                  args.requests, args.pipeline, seed=args.seed))
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import math
+import operator
+from decimal import Decimal
+
+from expr_calc import operators
+from expr_calc.backends import Backend, DEFAULT_BACKEND
+from expr_calc.compiler import is_powmod
+from expr_calc.token import TokenType
+from expr_calc.tree import Tree, lookup
+
+from typing import AbstractSet, Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+
+# operator functions with the exact semantics of a Python operator, these
+# are inlined while any other function is called through a bound name
+INLINE_BINARY = {
+    operators.add: "+", operator.add: "+",
+    operators.sub: "-", operator.sub: "-",
+    operators.mul: "*", operator.mul: "*",
+    operators.div: "/", operator.truediv: "/",
+    operator.pow: "**",
+}
+
+INLINE_UNARY = {
+    operators.positive: "+", operator.pos: "+",
+    operators.negative: "-", operator.neg: "-",
+}
+
+# nested expressions deeper than this are split into assignments, which
+# keeps the generated source within the limits of the Python parser
+MAX_NESTING = 50
+
+
+class NativeFunction:
+
+    __slots__ = ("func", "names", "source", "backend")
+
+    def __init__(self, func: Callable, names: Tuple[str, ...], source: str, backend: Backend) -> None:
+        """
+        Expression compiled into a Python function
+
+        :param func: compiled function taking the value of each name
+         positionally
+        :param names: identifiers of the expression in argument order
+        :param source: generated source of the function
+        :param backend: numeric backend whose context is installed
+         while calling
+        """
+        self.func = func
+        self.names = names
+        self.source = source
+        self.backend = backend
+
+    def __call__(self, variables: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Evaluate the expression
+
+        :param variables: values of the identifiers in the expression
+        :return: final value
+        """
+        args = [lookup(name, variables) for name in self.names]
+        if self.backend.context is None:
+            return self.func(*args)
+        with self.backend.activate():
+            return self.func(*args)
+
+    def __repr__(self) -> str:
+        return f"NativeFunction({', '.join(self.names)})"
+
+
+def compile_native(tree: Tree, backend: Backend = DEFAULT_BACKEND,
+                   shared: AbstractSet[int] = frozenset()) -> NativeFunction:
+    """
+    Translate a tree into Python source and compile it into a function,
+    so that evaluating it runs as CPython bytecode with no dispatch on
+    tokens. Literals of types that Python cannot embed, such as Decimal,
+    are bound as closure variables and are never rebuilt. Operators with
+    the semantics of a Python operator are inlined, the others, like
+    the float backend's fmod, are called through a closure variable,
+    as are the backend's powmod for a ^ b % m and called functions.
+    The tree is walked without recursion
+
+    :param tree: abstract syntax tree or DAG to be compiled
+    :param backend: numeric backend providing the literals and operators
+    :param shared: ids of the nodes with more than one parent, as
+     recorded by HashConser, they are computed once into a local
+    :return: compiled function
+    """
+    bound: Dict[str, Any] = {}      # closure name -> value
+    bound_index: Dict[Tuple[type, Any], str] = {}
+    names: List[str] = []
+    name_index: Dict[str, str] = {}
+    lines: List[str] = []
+    done: Dict[int, Tuple[str, int]] = {}   # id of a node -> (expression, nesting)
+    fused: Dict[int, Tuple[Tree, ...]] = {}     # id of an a ^ b % m node -> (a, b, m)
+
+    def bind(value: Any, prefix: str) -> str:
+        key = (type(value), value.as_tuple() if isinstance(value, Decimal) else value)
+        if key not in bound_index:
+            bound_index[key] = f"{prefix}{len(bound)}"
+            bound[bound_index[key]] = value
+        return bound_index[key]
+
+    def store(expression: str) -> Tuple[str, int]:
+        local = f"_t{len(lines)}"
+        lines.append(f"        {local} = {expression}")
+        return local, 0
+
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        if id(node) in done:
+            continue
+        type_, val = node.node
+
+        if type_ is TokenType.NUMBER:
+            # inf, nan and negative numbers are no atoms in source, so they are bound
+            if type(val) is int and val >= 0 or type(val) is float and math.isfinite(val) and math.copysign(1, val) > 0:
+                done[id(node)] = (repr(val), 0)
+            else:
+                done[id(node)] = (bind(val, "_c"), 0)
+            continue
+        elif type_ is TokenType.IDENTIFIER:
+            if val not in name_index:
+                name_index[val] = f"_v{len(names)}"
+                names.append(val)
+            done[id(node)] = (name_index[val], 0)
+            continue
+        elif not visited:
+            stack.append((node, True))
+            children = node.children
+            if is_powmod(node):
+                children = fused[id(node)] = node.children[0].children + node.children[1:]
+            stack.extend((child, False) for child in reversed(children))
+            continue
+
+        operands = [done[id(child)] for child in fused.get(id(node), node.children)]
+        nesting = max((depth for _, depth in operands), default=0) + 1
+        if type_ is TokenType.FUNCTION:
+            expression = f"{bind(val.call, '_f')}({', '.join(operand for operand, _ in operands)})"
+        elif id(node) in fused:
+            expression = f"{bind(backend.powmod, '_f')}({', '.join(operand for operand, _ in operands)})"
+        elif type_ is TokenType.BINARY_OP:
+            func = backend.op_map[val]
+            (left, _), (right, _) = operands
+            if func in INLINE_BINARY:
+                expression = f"({left} {INLINE_BINARY[func]} {right})"
+            else:
+                expression = f"{bind(func, '_f')}({left}, {right})"
+        else:
+            func = backend.unary_op_map[val]
+            (operand, _), = operands
+            if func in INLINE_UNARY:
+                expression = f"({INLINE_UNARY[func]}{operand})"
+            else:
+                expression = f"{bind(func, '_f')}({operand})"
+
+        if id(node) in shared or nesting >= MAX_NESTING:
+            done[id(node)] = store(expression)
+        else:
+            done[id(node)] = (expression, nesting)
+
+    result, _ = done[id(tree)]
+    arguments = ", ".join(name_index[name] for name in names)
+    source = "\n".join([
+        f"def _build({', '.join(bound)}):",
+        f"    def evaluate({arguments}):",
+        *lines,
+        f"        return {result}",
+        "    return evaluate",
+    ])
+    namespace: Dict[str, Any] = {}
+    exec(compile(source, "<expr_calc native>", "exec"), namespace)
+    return NativeFunction(namespace["_build"](**bound), tuple(names), source, backend)
@@ -1,4 +1,35 @@
-from decimal import Decimal
+from decimal import Decimal, getcontext
+
+from typing import Optional
+
+
+# integral powers are computed exactly with ints as long as the result
+# stays below this many bits, past that Decimal rounds it to the context
+EXACT_POWER_BITS = 100_000
+
+ONE = Decimal(1)
+
+
+def exact_int(a: Decimal) -> Optional[int]:
+    """
+    Get a as an int if it is an int or a Decimal written as a plain
+    integer, such as 123 but not 123.0 or 1.23E+2, whose results would
+    have a different exponent if they were computed with ints. Only
+    finite Decimals with exponent 0 have the same quantum as 1, which is
+    checked far faster than unpacking the digits with as_tuple
+    """
+    if type(a) is Decimal:
+        return int(a) if a.same_quantum(ONE) else None
+    return a if type(a) is int else None
+
+
+def exact_powmod(a: int, b: int, m: int) -> int:
+    """
+    Get the remainder of a ^ b and m without building a ^ b, with the
+    sign of a ^ b like Decimal's remainder. b must not be negative
+    """
+    remainder = pow(abs(a), b, abs(m))
+    return -remainder if a < 0 and b % 2 else remainder
 
 
 def add(a: Decimal, b: Decimal) -> Decimal:
@@ -22,20 +53,62 @@ def div(a: Decimal, b: Decimal) -> Decimal:
 
 
 def exp(a: Decimal, b: Decimal) -> Decimal:
-    """Raise a to b"""
+    """Raise a to b, exactly if both are integers and b is not negative"""
+    base, power = exact_int(a), exact_int(b)
+    if base and power is not None and 0 <= power and power * base.bit_length() <= EXACT_POWER_BITS:
+        return Decimal(base ** power)
     return a ** b
 
 
 def mod(a: Decimal, b: Decimal) -> Decimal:
-    """Get the remainder of the true division of a into b"""
+    """
+    Get the remainder of the true division of a into b, exactly if
+    both are integers. Decimal's own remainder is exact whenever its
+    quotient fits the precision, and then equal to the remainder of
+    ints, exponent and sign included, so ints are only needed for
+    quotients too large for the context
+    """
+    if type(a) is Decimal and not a:
+        # a zero dividend keeps its sign and exponent, -0 % 7 is -0
+        return a % b
+    if type(a) is Decimal and type(b) is Decimal:
+        # the integer quotient and b have fewer digits than the precision,
+        # so the remainder neither raises DivisionImpossible nor rounds,
+        # and exponent 0 is within the limits of the context
+        context = getcontext()
+        digits = context.prec
+        shift = b.adjusted()
+        if shift < digits and a.adjusted() - shift < digits <= context.Emax:
+            return a % b
+    dividend, divisor = exact_int(a), exact_int(b)
+    if dividend is not None and divisor:
+        remainder = abs(dividend) % abs(divisor)
+        # Decimal keeps the sign of the dividend, even for a zero remainder
+        return Decimal(-remainder if remainder else "-0") if dividend < 0 else Decimal(remainder)
     return a % b
 
 
+def powmod(a: Decimal, b: Decimal, m: Decimal) -> Decimal:
+    """Get the remainder of a ^ b and m, without computing a ^ b if all are integers"""
+    base, power, modulus = exact_int(a), exact_int(b), exact_int(m)
+    if base is not None and power is not None and modulus and power >= 0 and (base or power):
+        remainder = exact_powmod(base, power, modulus)
+        if remainder == 0 and base < 0 and power % 2:
+            return Decimal("-0")
+        return Decimal(remainder)
+    return mod(exp(a, b), m)
+
+
 def identity(a: Decimal) -> Decimal:
     """Return itself"""
     return a
 
 
+def positive(a: Decimal) -> Decimal:
+    """Return a rounded to the current context, like -a does"""
+    return +a
+
+
 def negative(a: Decimal) -> Decimal:
     """Return the negative of a"""
     return -a
@@ -50,6 +123,14 @@ OP_LIST = {
     '^': 3
 }
 
+# unary operators bind tighter than * and / but looser than ^, so -2^2 is -(2^2)
+UNARY_PRECEDENCE = 2.5
+
+# lower than any operator so that parentheses are only closed by )
+PAREN_PRECEDENCE = 0
+
+RIGHT_ASSOCIATIVE = {'^'}
+
 op_map = {
     '+': add,
     '*': mul,
@@ -60,6 +141,6 @@ op_map = {
 }
 
 unary_op_map = {
-    '+': identity,
+    '+': positive,
     '-': negative
 }
\ No newline at end of file
@@ -0,0 +1,143 @@
+from decimal import Decimal
+
+from expr_calc.backends import Backend, DEFAULT_BACKEND
+from expr_calc.compiler import is_powmod
+from expr_calc.lexer import UNARY_TOKENS
+from expr_calc.token import Token, TokenType
+from expr_calc.tree import Tree
+
+from typing import Any, Dict, Set, Tuple
+
+
+# operators whose Decimal results are computed exactly for integers, so
+# they are not necessarily rounded to the context
+UNROUNDED = {"^", "%"}
+
+
+def is_one(tree: Tree, one: Any) -> bool:
+    """
+    Check if a tree is a literal equal to the backend's 1 and of the
+    same type. For Decimals the exponent has to match as well, since
+    multiplying by 1.0 would change the exponent of the result
+
+    :param tree: tree to be checked
+    :param one: the backend's literal 1
+    :return: if tree is exactly one
+    """
+    token = tree.node
+    if token.type_ is not TokenType.NUMBER or type(token.val) is not type(one) or token.val != one:
+        return False
+    return not isinstance(one, Decimal) or token.val.as_tuple() == one.as_tuple()
+
+
+def optimize(tree: Tree, backend: Backend = DEFAULT_BACKEND) -> Tuple[Tree, int]:
+    """
+    Fold constant subtrees and remove identity operations from a tree.
+
+    Every rewrite is exact under the backend's context, so the optimised
+    tree evaluates to the same value, for Decimals digits and exponent
+    included:
+
+    - operators whose operands are all constants are evaluated now
+      with the backend's operators,
+      unless that raises, in which case the error is left for runtime
+    - x * 1, 1 * x and x / 1 become x when x is the result of an
+      operator, since those are already rounded to the context and
+      a bare literal or variable would still need rounding
+    - --x becomes +x and ++x becomes +x, as unary plus rounds the same
+      way and maps -0 to 0 just like negating twice does
+    - constant a ^ b % m is folded with the backend's powmod, without
+      computing a ^ b
+    - calls of pure functions on constants are made now, calls of
+      other functions are kept
+
+    x + 0 is kept because Decimal addition moves the exponent (1E+2 + 0
+    is 100), and x ^ 1 because a Decimal power normalises zeros (0.0 ^ 1
+    is 0). The input tree is not modified, unchanged subtrees are
+    shared with the result
+
+    :param tree: abstract syntax tree to be optimised
+    :param backend: numeric backend the tree will be evaluated with
+    :return: optimised tree and the number of nodes removed
+    """
+    # id of an original node -> (optimised node, is constant, is rounded)
+    done: Dict[int, Tuple[Tree, bool, bool]] = {}
+    deferred: Set[int] = set()  # powers left for their % to fold
+
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        type_, val = node.node
+
+        if type_ is TokenType.NUMBER:
+            done[id(node)] = (node, True, False)
+            continue
+        elif type_ is TokenType.IDENTIFIER:
+            done[id(node)] = (node, False, False)
+            continue
+        elif not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children)
+            if is_powmod(node):
+                deferred.add(id(node.children[0]))
+            continue
+
+        results = [done[id(child)] for child in node.children]
+        children = tuple(child for child, _, _ in results)
+        # results of functions such as min may be one of their arguments
+        rounded = type_ is not TokenType.FUNCTION and val not in UNROUNDED
+
+        operands = None
+        if type_ is TokenType.FUNCTION:
+            if val.pure and all(constant for _, constant, _ in results):
+                func = val.call
+                operands = children
+        elif all(constant for _, constant, _ in results) and id(node) not in deferred:
+            func = backend.op_map[val] if type_ is TokenType.BINARY_OP else backend.unary_op_map[val]
+            operands = children
+        elif is_powmod(node) and children[0].node == node.children[0].node:
+            func = backend.powmod
+            operands = children[0].children + children[1:]
+        if operands is not None and all(operand.node.type_ is TokenType.NUMBER for operand in operands):
+            try:
+                with backend.activate():
+                    value = func(*(operand.node.val for operand in operands))
+            except (ArithmeticError, ValueError):
+                pass
+            else:
+                done[id(node)] = (Tree(Token(TokenType.NUMBER, value)), True, rounded)
+                continue
+
+        new_node = simplify(node.node, children, [rounded for _, _, rounded in results], backend.one)
+        if new_node is None:
+            changed = any(new is not old for new, old in zip(children, node.children))
+            new_node = Tree(node.node, children) if changed else node
+        done[id(node)] = (new_node, False, rounded)
+
+    optimised = done[id(tree)][0]
+    return optimised, len(tree.traverse()) - len(optimised.traverse())
+
+
+def simplify(token: Token, children: Tuple[Tree, ...], rounded: list, one: Any):
+    """
+    Apply the identity rewrites of optimize to a single operator node
+
+    :param token: operator of the node
+    :param children: already optimised operands
+    :param rounded: whether each operand is already rounded to the context
+    :param one: the backend's literal 1
+    :return: replacement tree or None if no rule applies
+    """
+    if token.type_ is TokenType.BINARY_OP:
+        left, right = children
+        if token.val in ("*", "/") and is_one(right, one) and rounded[0]:
+            return left
+        if token.val == "*" and is_one(left, one) and rounded[1]:
+            return right
+
+    elif token.type_ is TokenType.UNARY_OP:
+        child = children[0]
+        if child.node.type_ is TokenType.UNARY_OP and child.node.val == token.val:
+            return Tree(UNARY_TOKENS["+"], child.children)
+
+    return None
@@ -0,0 +1,157 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from expr_calc.batch import evaluate_lines, read_lines
+from expr_calc.calc import Calc
+from expr_calc.errors import BatchError
+from expr_calc.store import ExpressionStore
+
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# calculator of the current worker process, created once by its initializer
+# so that its cache is reused by every chunk the worker evaluates
+_worker_calc: Optional[Calc] = None
+
+
+def _init_worker(backend: str, precision: Optional[int], cache_size: int, store: Optional[str] = None) -> None:
+    global _worker_calc
+    # every worker maps the store itself, the pages are shared by the OS
+    _worker_calc = Calc(cache_size=cache_size, backend=backend, precision=precision,
+                        store=ExpressionStore(store) if store else None)
+
+
+def _evaluate_chunk(lines: List[str], start: int, fail_fast: bool,
+                    postfix: bool = False) -> Tuple[List[str], int, float, Optional[str]]:
+    began = time.perf_counter()
+    results: List[str] = []
+    error = None
+    try:
+        results.extend(evaluate_lines(lines, _worker_calc, fail_fast, start, postfix))
+    except BatchError as failure:
+        # results before the failing line are written like run_batch does
+        error = str(failure)
+    return results, os.getpid(), time.perf_counter() - began, error
+
+
+def chunked(lines: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    """
+    Split lines into lists of at most chunk_size lines
+
+    :param lines: lines to be split
+    :param chunk_size: maximum number of lines per chunk
+    :return: generator of chunks
+    """
+    lines = iter(lines)
+    chunk = list(islice(lines, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(lines, chunk_size))
+
+
+class WorkerStats:
+
+    def __init__(self) -> None:
+        """
+        Expressions evaluated by one worker process and the time it
+        spent evaluating them
+        """
+        self.expressions = 0
+        self.chunks = 0
+        self.busy = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.expressions / self.busy if self.busy else 0.0
+
+
+class ThroughputReport:
+
+    def __init__(self) -> None:
+        """
+        Throughput of a parallel batch run, overall and per worker
+        """
+        self.workers: Dict[int, WorkerStats] = {}
+        self.expressions = 0
+        self.elapsed = 0.0
+
+    def record(self, pid: int, expressions: int, busy: float) -> None:
+        stats = self.workers.setdefault(pid, WorkerStats())
+        stats.expressions += expressions
+        stats.chunks += 1
+        stats.busy += busy
+        self.expressions += expressions
+
+    @property
+    def rate(self) -> float:
+        return self.expressions / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        lines = [f"{self.expressions} expressions in {self.elapsed:.3f}s "
+                 f"({self.rate:,.0f} expr/s, {len(self.workers)} workers)"]
+        for pid, stats in sorted(self.workers.items()):
+            lines.append(f"  worker {pid}: {stats.expressions} expressions in "
+                         f"{stats.chunks} chunks, {stats.rate:,.0f} expr/s")
+        return "\n".join(lines)
+
+
+def run_parallel(path: str, output: IO[str], workers: Optional[int] = None,
+                 chunk_size: int = 10_000, fail_fast: bool = False,
+                 backend: str = "decimal", precision: Optional[int] = None,
+                 cache_size: int = 128, postfix: bool = False, store: Optional[str] = None) -> ThroughputReport:
+    """
+    Evaluate every expression of a file, or of stdin if path is "-", in
+    a pool of worker processes. Input is split into chunks that workers
+    evaluate with their own long-lived Calc, and results are written in
+    the original order. At most two chunks per worker are in flight, so
+    memory stays bounded however large the input is
+
+    :param path: path of the file with one expression per line
+    :param output: text stream results are written to
+    :param workers: number of worker processes, defaults to the CPU count
+    :param chunk_size: number of lines sent to a worker at a time
+    :param fail_fast: stop at the first failing expression
+    :param backend: name of the numeric backend of each worker
+    :param precision: digits of precision of the decimal backend
+    :param cache_size: size of the program cache of each worker
+    :param postfix: expressions are postfix programs
+    :param store: path of an expression store opened by every worker
+    :return: throughput of the run
+    """
+    workers = workers or os.cpu_count() or 1
+    report = ThroughputReport()
+    began = time.perf_counter()
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(backend, precision, cache_size, store)) as executor:
+        pending = deque()
+        start = 1
+        try:
+            for chunk in chunked(read_lines(path), chunk_size):
+                pending.append(executor.submit(_evaluate_chunk, chunk, start, fail_fast, postfix))
+                start += len(chunk)
+                if len(pending) >= 2 * workers:
+                    _write_chunk(pending.popleft().result(), output, report)
+            while pending:
+                _write_chunk(pending.popleft().result(), output, report)
+        finally:
+            for future in pending:
+                future.cancel()
+            output.flush()
+
+    report.elapsed = time.perf_counter() - began
+    return report
+
+
+def _write_chunk(result: Tuple[List[str], int, float, Optional[str]], output: IO[str],
+                 report: ThroughputReport) -> None:
+    results, pid, busy, error = result
+    if results:
+        results.append("")
+        output.write("\n".join(results))
+    report.record(pid, max(len(results) - 1, 0), busy)
+    if error is not None:
+        raise BatchError(error)
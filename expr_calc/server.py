@@ -0,0 +1,256 @@
+"""
+Expression evaluation server speaking newline-delimited JSON over TCP.
+
+Each request is one line holding a JSON object::
+
+    {"id": 1, "expr": "2 * x + 1", "vars": {"x": "0.5"}}
+
+and is answered by one line, in the order the requests were received::
+
+    {"id": 1, "result": "2.0"}
+    {"id": 2, "error": "Variable y is not defined"}
+
+Clients may pipeline any number of requests without waiting for their
+responses. Run with ``python -m expr_calc.server``.
+"""
+import argparse
+import asyncio
+import json
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from expr_calc.backends import BACKENDS, get_backend
+from expr_calc.batch import EXPRESSION_ERRORS, error_message
+from expr_calc.calc import Calc
+
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+# calculators of the current thread keyed by (backend, precision, cache
+# size), so evaluations never share the program and tree of a Calc
+_local = threading.local()
+
+
+def _get_calc(backend: str, precision: Optional[int], cache_size: int) -> Calc:
+    calcs = getattr(_local, "calcs", None)
+    if calcs is None:
+        calcs = _local.calcs = {}
+    key = (backend, precision, cache_size)
+    calc = calcs.get(key)
+    if calc is None:
+        calc = calcs[key] = Calc(cache_size=cache_size, backend=backend, precision=precision)
+    return calc
+
+
+def evaluate(expr: str, variables: Optional[Mapping[str, Any]] = None, backend: str = "decimal",
+             precision: Optional[int] = None, cache_size: int = 128) -> str:
+    """
+    Evaluate an expression with a calculator private to the calling
+    thread, so it can run in the event loop or in any executor
+
+    :param expr: expression to be evaluated
+    :param variables: values of the identifiers in the expression,
+     converted to the backend from their string form
+    :param backend: name of the numeric backend
+    :param precision: digits of precision of the decimal backend
+    :param cache_size: size of the program cache of each thread
+    :return: result as a string
+    """
+    calc = _get_calc(backend, precision, cache_size)
+    if variables:
+        literal = calc.backend.literal
+        variables = {name: literal(str(value)) for name, value in variables.items()}
+    calc.program = expr
+    return str(calc.eval(variables))
+
+
+def parse_request(line: bytes) -> Tuple[Any, str, Optional[Dict[str, Any]]]:
+    """
+    Decode a request line
+
+    :param line: JSON object with an "expr" and optional "id" and "vars"
+    :return: id, expression and variables of the request
+    """
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    expr = request.get("expr")
+    if not isinstance(expr, str):
+        raise ValueError("Request is missing the expr string")
+    variables = request.get("vars")
+    if variables is not None and not isinstance(variables, dict):
+        raise ValueError("vars must be a JSON object")
+    return request.get("id"), expr, variables
+
+
+class CalcServer:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7878, max_concurrency: int = 64,
+                 max_pipeline: int = 128, executor: Optional[Executor] = None,
+                 offload_threshold: Optional[int] = None, backend: str = "decimal",
+                 precision: Optional[int] = None, cache_size: int = 128,
+                 line_limit: int = 2 ** 20) -> None:
+        """
+        Asyncio TCP server evaluating newline-delimited JSON requests.
+
+        Requests of a connection are evaluated concurrently but answered
+        in order. A connection stops being read once max_pipeline of its
+        requests are waiting to be answered, and responses are only
+        written as fast as the client reads them, so TCP flow control
+        pushes back on clients that send faster than they are served
+
+        :param host: interface to listen on
+        :param port: port to listen on, 0 picks a free port
+        :param max_concurrency: maximum number of evaluations in
+         progress across all connections
+        :param max_pipeline: maximum number of unanswered requests
+         per connection
+        :param executor: executor expensive evaluations are offloaded
+         to, the event loop's default executor if not given
+        :param offload_threshold: expressions at least this long are
+         evaluated in the executor, None evaluates everything in the
+         event loop
+        :param backend: name of the numeric backend
+        :param precision: digits of precision of the decimal backend
+        :param cache_size: size of the program cache of each thread
+        :param line_limit: maximum length of a request line in bytes
+        """
+        get_backend(backend, precision)     # reject bad settings up front
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_pipeline = max_pipeline
+        self.executor = executor
+        self.offload_threshold = offload_threshold
+        self.backend = backend
+        self.precision = precision
+        self.cache_size = cache_size
+        self.line_limit = line_limit
+
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start(self) -> asyncio.AbstractServer:
+        """
+        Start listening, the port is updated if it was 0
+
+        :return: asyncio server
+        """
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=self.line_limit)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+
+    async def respond(self, line: bytes) -> bytes:
+        """
+        Answer a single request line, errors are answered rather than raised
+
+        :param line: request line
+        :return: response line
+        """
+        request_id = None
+        try:
+            request_id, expr, variables = parse_request(line)
+            async with self._semaphore:
+                if self.offload_threshold is not None and len(expr) >= self.offload_threshold:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        self.executor, evaluate, expr, variables,
+                        self.backend, self.precision, self.cache_size
+                    )
+                else:
+                    result = evaluate(expr, variables, self.backend, self.precision, self.cache_size)
+            response = {"id": request_id, "result": result}
+        except EXPRESSION_ERRORS as error:     # includes JSONDecodeError
+            response = {"id": request_id, "error": error_message(error)}
+        return json.dumps(response).encode() + b"\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one connection, reading requests while earlier ones are
+        still being evaluated and writing responses in request order
+        """
+        pending: asyncio.Queue = asyncio.Queue(self.max_pipeline)
+        write_task = asyncio.ensure_future(self._write_responses(pending, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:      # line longer than line_limit
+                    await pending.put(asyncio.ensure_future(self.reject("Request line too long")))
+                    break
+                if not line:
+                    break
+                if line.isspace():
+                    continue
+                # blocks once max_pipeline responses are outstanding
+                await pending.put(asyncio.ensure_future(self.respond(line)))
+        except ConnectionError:
+            pass
+        finally:
+            await pending.put(None)
+            await asyncio.gather(write_task, return_exceptions=True)
+            writer.close()
+
+    @staticmethod
+    async def reject(message: str) -> bytes:
+        return json.dumps({"id": None, "error": message}).encode() + b"\n"
+
+    @staticmethod
+    async def _write_responses(pending: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        # responses of a client that went away are still awaited, so
+        # that the reader is never blocked on a full queue
+        connected = True
+        while True:
+            response = await pending.get()
+            if response is None:
+                return
+            response = await response
+            if connected:
+                try:
+                    writer.write(response)
+                    await writer.drain()
+                except ConnectionError:
+                    connected = False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Expression evaluation server")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=7878, help="port to listen on")
+    parser.add_argument("--max-concurrency", type=int, default=64,
+                        help="evaluations in progress across all connections")
+    parser.add_argument("--max-pipeline", type=int, default=128,
+                        help="unanswered requests per connection before it stops being read")
+    parser.add_argument("--offload-threshold", type=int,
+                        help="evaluate expressions at least this long in an executor")
+    parser.add_argument("--processes", type=int,
+                        help="offload to this many processes instead of threads")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="decimal",
+                        help="numeric backend (default: decimal)")
+    parser.add_argument("--precision", type=int, help="digits of precision of the decimal backend")
+    args = parser.parse_args()
+
+    executor = ProcessPoolExecutor(args.processes) if args.processes else ThreadPoolExecutor()
+    server = CalcServer(args.host, args.port, args.max_concurrency, args.max_pipeline, executor,
+                        args.offload_threshold, args.backend, args.precision)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
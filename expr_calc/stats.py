@@ -0,0 +1,112 @@
+from collections import Counter
+
+from typing import Any, Callable, Dict, Optional
+
+
+# stages of Calc.eval, lex, parse and compile are skipped on cache hits
+STAGES = ("lex", "parse", "compile", "eval")
+
+
+class DepthList(list):
+
+    __slots__ = ("max_depth",)
+
+    def __init__(self) -> None:
+        """
+        List used as a parser stack that remembers its greatest length
+        """
+        super().__init__()
+        self.max_depth = 0
+
+    def append(self, item: Any) -> None:
+        super().append(item)
+        if len(self) > self.max_depth:
+            self.max_depth = len(self)
+
+
+class Sample:
+
+    __slots__ = ("cached", "times", "tokens", "nodes", "operator_depth", "operand_depth", "op_counts")
+
+    def __init__(self) -> None:
+        """
+        Measurements of a single evaluation, passed to the hook of Stats
+        """
+        self.cached = False
+        self.times: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.tokens = 0
+        self.nodes = 0
+        self.operator_depth = 0
+        self.operand_depth = 0
+        self.op_counts: Counter = Counter()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class Stats:
+
+    def __init__(self, hook: Optional[Callable[[Sample], None]] = None) -> None:
+        """
+        Running totals of the evaluations of an instrumented Calc
+
+        :param hook: called with the Sample of every evaluation, for
+         example to forward it to a metrics system
+        """
+        self.hook = hook
+        self.reset()
+
+    def reset(self) -> None:
+        """Set every total back to zero"""
+        self.evaluations = 0
+        self.cache_hits = 0
+        self.times: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.tokens = 0
+        self.nodes = 0
+        self.max_operator_depth = 0
+        self.max_operand_depth = 0
+        self.op_counts: Counter = Counter()
+
+    def record(self, sample: Sample) -> None:
+        """
+        Add the measurements of an evaluation to the totals
+
+        :param sample: measurements of the evaluation
+        """
+        self.evaluations += 1
+        self.cache_hits += sample.cached
+        for stage, elapsed in sample.times.items():
+            self.times[stage] += elapsed
+        self.tokens += sample.tokens
+        self.nodes += sample.nodes
+        self.max_operator_depth = max(self.max_operator_depth, sample.operator_depth)
+        self.max_operand_depth = max(self.max_operand_depth, sample.operand_depth)
+        self.op_counts.update(sample.op_counts)
+        if self.hook is not None:
+            self.hook(sample)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copy of the current totals that later evaluations do not change
+
+        :return: totals keyed by name
+        """
+        return {
+            "evaluations": self.evaluations,
+            "cache_hits": self.cache_hits,
+            "times": dict(self.times),
+            "tokens": self.tokens,
+            "nodes": self.nodes,
+            "max_operator_depth": self.max_operator_depth,
+            "max_operand_depth": self.max_operand_depth,
+            "op_counts": dict(self.op_counts),
+        }
+
+    def __str__(self) -> str:
+        times = ", ".join(f"{stage} {elapsed * 1000:.3f}ms" for stage, elapsed in self.times.items())
+        ops = ", ".join(f"{op} x{count}" for op, count in self.op_counts.most_common()) or "none"
+        return (f"evaluations: {self.evaluations} ({self.cache_hits} cached)\n"
+                f"time: {times}\n"
+                f"tokens: {self.tokens}, nodes: {self.nodes}\n"
+                f"max parse depth: {self.max_operator_depth} operators, {self.max_operand_depth} operands\n"
+                f"operators evaluated: {ops}")
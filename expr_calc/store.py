@@ -0,0 +1,359 @@
+"""
+Indexed file of parsed expressions that processes open memory-mapped
+and share through the page cache. Build one from a text file with one
+expression per line with ``python -m expr_calc.store formulas.txt formulas.store``.
+
+A store starts with a header, followed by one record per expression and
+an index of (hash, offset, length) entries sorted by hash::
+
+    header   magic, format version, fanout bits, entry count, index offset
+    records  key and shape lengths, key, one byte per node of the tree
+             in postorder, then the lexemes of its numbers and identifiers
+             and the name/argument count of its calls
+    fanout   for each value of the leading bits of a hash, the position
+             of the first index entry with those bits, like a git pack index
+    index    fixed size entries read in place
+
+Numbers are stored as written and functions by name, so a store is
+independent of the backend, precision and functions of the processes
+reading it.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from decimal import Decimal
+from hashlib import blake2b
+
+from expr_calc.errors import StoreFormatError
+from expr_calc.functions import BUILTINS, FunctionRegistry
+from expr_calc.lexer import BINARY_TOKENS, UNARY_TOKENS, Lexer
+from expr_calc.token import Token, TokenType
+from expr_calc.tree import Tree
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+MAGIC = b"EXPRCALC"
+
+# bumped whenever the layout changes, files of another version are rejected
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<8sHHIQ")    # magic, version, fanout bits, entries, fanout offset
+FANOUT = struct.Struct("<II")        # first and end position of the entries of a bucket
+INDEX_ENTRY = struct.Struct("<QQI")  # key hash, record offset, record length
+
+# a bucket per entry on average, a lookup reads about one index entry
+MAX_FANOUT_BITS = 20
+LENGTHS = struct.Struct("<II")       # key length and shape length of a record
+
+# shape byte of each node of a record, binary operators are their own
+# ASCII symbol and unary operators have the high bit set on top of it
+NUMBER, IDENTIFIER, CALL = 0, 1, 2
+UNARY_FLAG = 0x80
+SHAPE_TOKENS = {ord(op): token for op, token in BINARY_TOKENS.items()}
+SHAPE_TOKENS.update((ord(op) | UNARY_FLAG, token) for op, token in UNARY_TOKENS.items())
+
+
+def normalise(expression: str) -> str:
+    """Collapse runs of whitespace like Calc.normalise, so stored keys match cache keys"""
+    return " ".join(expression.split())
+
+
+def key_hash(expression: str) -> int:
+    """
+    Hash of an expression's normalised text, stable across processes
+    and Python versions unlike hash()
+
+    :param expression: expression to be hashed
+    :return: unsigned 64 bit hash
+    """
+    digest = blake2b(normalise(expression).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def encode(key: str, tree: Tree) -> bytes:
+    """
+    Serialise a tree into a record: the key, one shape byte per node in
+    postorder, then the lexemes of the leaves separated by spaces, which
+    lexemes never contain. Nodes are visited without recursion
+
+    :param key: normalised expression the tree was parsed from
+    :param tree: parsed tree, number values are written with str()
+    :return: record bytes
+    """
+    shape = bytearray()
+    leaves: List[str] = []
+
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node.children and not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+            continue
+
+        type_, val = node.node
+        if type_ is TokenType.NUMBER:
+            shape.append(NUMBER)
+            leaves.append(str(val))
+        elif type_ is TokenType.IDENTIFIER:
+            shape.append(IDENTIFIER)
+            leaves.append(val)
+        elif type_ is TokenType.BINARY_OP:
+            shape.append(ord(val))
+        elif type_ is TokenType.FUNCTION:
+            shape.append(CALL)
+            leaves.append(f"{val.name}/{val.arity}")
+        else:
+            shape.append(ord(val) | UNARY_FLAG)
+
+    key_bytes = key.encode()
+    return b"".join((LENGTHS.pack(len(key_bytes), len(shape)), key_bytes, shape, " ".join(leaves).encode()))
+
+
+def record_key(record: bytes) -> bytes:
+    """Get the encoded key of a record without decoding the rest"""
+    key_length, _ = LENGTHS.unpack_from(record, 0)
+    return record[LENGTHS.size:LENGTHS.size + key_length]
+
+
+def decode(record: bytes, literal: Callable[[str], Any] = Decimal,
+           functions: Optional[FunctionRegistry] = None) -> Tuple[str, Tree]:
+    """
+    Rebuild the tree of a record
+
+    :param record: record bytes written by encode
+    :param literal: constructor for the value of number tokens
+    :param functions: functions the calls are resolved in, by default
+     the built-in ones of the decimal backend
+    :return: normalised expression and its tree
+    """
+    functions = BUILTINS if functions is None else functions
+    key_length, shape_length = LENGTHS.unpack_from(record, 0)
+    position = LENGTHS.size + key_length
+    key = record[LENGTHS.size:position].decode()
+    shape = record[position:position + shape_length]
+    leaves = iter(record[position + shape_length:].decode().split(" "))
+    stack: List[Tree] = []
+    push = stack.append
+
+    try:
+        for code in shape:
+            if code == NUMBER:
+                push(Tree(Token(TokenType.NUMBER, literal(next(leaves)))))
+            elif code == IDENTIFIER:
+                push(Tree(Token(TokenType.IDENTIFIER, next(leaves))))
+            elif code == CALL:
+                name, count = next(leaves).split("/")
+                function = functions.resolve(name, int(count))
+                arguments = stack[len(stack) - function.arity:]
+                if len(arguments) != function.arity:
+                    raise IndexError
+                del stack[len(stack) - function.arity:]
+                push(Tree(Token(TokenType.FUNCTION, function), arguments))
+            elif code & UNARY_FLAG:
+                stack[-1] = Tree(SHAPE_TOKENS[code], (stack[-1],))
+            else:
+                operand_b = stack.pop()
+                stack[-1] = Tree(SHAPE_TOKENS[code], (stack[-1], operand_b))
+    except (IndexError, KeyError, StopIteration, ValueError):
+        raise StoreFormatError(f"Corrupt record for {key}") from None
+
+    if len(stack) != 1:
+        raise StoreFormatError(f"Corrupt record for {key}")
+    return key, stack[0]
+
+
+def write_store(path: str, entries: Iterable[Tuple[str, Tree]]) -> int:
+    """
+    Write parsed expressions into a store. The file is written next to
+    path and renamed over it once complete, so processes that have the
+    old store open keep reading a consistent file
+
+    :param path: path of the store
+    :param entries: expressions and their trees, later duplicates of an
+     expression are ignored
+    :return: number of expressions stored
+    """
+    index: List[Tuple[int, int, int]] = []
+    seen = set()
+    partial = f"{path}.partial"
+
+    with open(partial, "wb") as file:
+        file.write(bytes(HEADER.size))
+        offset = HEADER.size
+        for expression, tree in entries:
+            key = normalise(expression)
+            if key in seen:
+                continue
+            seen.add(key)
+            record = encode(key, tree)
+            file.write(record)
+            index.append((key_hash(key), offset, len(record)))
+            offset += len(record)
+
+        index.sort()
+        bits = min(max(len(index).bit_length() - 1, 0), MAX_FANOUT_BITS)
+        fanout = [0] * ((1 << bits) + 1)
+        for digest, _, _ in index:
+            fanout[(digest >> (64 - bits)) + 1] += 1
+        for bucket in range(1, len(fanout)):
+            fanout[bucket] += fanout[bucket - 1]
+
+        file.write(struct.pack(f"<{len(fanout)}I", *fanout))
+        file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in index))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, bits, len(index), offset))
+
+    os.replace(partial, path)
+    return len(index)
+
+
+class ExpressionStore:
+
+    def __init__(self, path: str) -> None:
+        """
+        Read-only view of a store file. The file is memory-mapped, so
+        every process opening it shares the same pages, and records are
+        only decoded when looked up. Lookups go through the fanout
+        table straight to the few index entries sharing the leading
+        bits of the hash, nothing is loaded up front
+
+        :param path: path of a store written by write_store
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise StoreFormatError(f"{path} is not an expression store")
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._bits, self._count, self._fanout = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise StoreFormatError(f"{path} is not an expression store")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise StoreFormatError(f"{path} has format version {version}, expected {FORMAT_VERSION}, "
+                                   f"rebuild it with python -m expr_calc.store")
+        self._index = self._fanout + ((1 << self._bits) + 1) * 4
+        if self._index + self._count * INDEX_ENTRY.size > len(self._map):
+            self.close()
+            raise StoreFormatError(f"{path} is truncated")
+
+    def _records(self, digest: int) -> Iterator[bytes]:
+        """Records whose key has the given hash, usually at most one"""
+        first, end = FANOUT.unpack_from(self._map, self._fanout + (digest >> (64 - self._bits)) * 4)
+        entries = self._map[self._index + first * INDEX_ENTRY.size:self._index + end * INDEX_ENTRY.size]
+        for entry_hash, offset, length in INDEX_ENTRY.iter_unpack(entries):
+            if entry_hash == digest:
+                yield self._map[offset:offset + length]
+            elif entry_hash > digest:
+                break
+
+    def get(self, expression: str, literal: Callable[[str], Any] = Decimal,
+            functions: Optional[FunctionRegistry] = None) -> Optional[Tree]:
+        """
+        Look up the tree of an expression, expressions that only differ
+        in whitespace are the same entry
+
+        :param expression: expression to look up
+        :param literal: constructor for the value of number tokens,
+         usually the literal of the reading backend
+        :param functions: functions the calls are resolved in, usually
+         those of the reading calculator
+        :return: freshly built tree or None if the expression is not stored
+        """
+        key = normalise(expression)
+        encoded = key.encode()
+        for record in self._records(key_hash(key)):
+            # compare keys before decoding, hashes can collide
+            if record_key(record) == encoded:
+                self.hits += 1
+                return decode(record, literal, functions)[1]
+        self.misses += 1
+        return None
+
+    def get_hash(self, digest: int, literal: Callable[[str], Any] = Decimal,
+                 functions: Optional[FunctionRegistry] = None) -> Optional[Tuple[str, Tree]]:
+        """
+        Look up an expression by the hash of its normalised text
+
+        :param digest: hash computed by key_hash
+        :param literal: constructor for the value of number tokens
+        :param functions: functions the calls are resolved in
+        :return: expression and its tree, or None if no key has the hash
+        """
+        for record in self._records(digest):
+            self.hits += 1
+            return decode(record, literal, functions)
+        self.misses += 1
+        return None
+
+    def __contains__(self, expression: str) -> bool:
+        key = normalise(expression).encode()
+        return any(record_key(record) == key for record in self._records(key_hash(expression)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "ExpressionStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"ExpressionStore({self.path!r}, {self._count} expressions)"
+
+
+def build_store(source: str, path: str) -> Tuple[int, List[str]]:
+    """
+    Parse every expression of a text file, or of stdin if source is
+    "-", and write them into a store. Numbers are kept as written
+
+    :param source: path of the file with one expression per line
+    :param path: path of the store
+    :return: number of expressions stored and an error message for
+     each line that failed to parse
+    """
+    # the parser is only needed to build stores, not to read them
+    from expr_calc.batch import EXPRESSION_ERRORS, error_message, read_lines
+    from expr_calc.calc import parse_tokens
+
+    errors: List[str] = []
+
+    def parsed() -> Iterator[Tuple[str, Tree]]:
+        for line_number, line in enumerate(read_lines(source), 1):
+            if not line or line.isspace():
+                continue
+            try:
+                yield line, parse_tokens(Lexer.scan(line, str))
+            except EXPRESSION_ERRORS as error:
+                errors.append(f"line {line_number}: {error_message(error)}")
+
+    return write_store(path, parsed()), errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a store of parsed expressions")
+    parser.add_argument("source", help="file with one expression per line, - for stdin")
+    parser.add_argument("store", help="path of the store to write")
+    args = parser.parse_args()
+
+    stored, errors = build_store(args.source, args.store)
+    for error in errors:
+        print(error, file=sys.stderr)
+    print(f"{stored} expressions stored in {args.store}, {len(errors)} skipped", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
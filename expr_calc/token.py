@@ -1,4 +1,3 @@
-from dataclasses import dataclass
 from enum import Enum, auto
 from typing import Any
 
@@ -8,19 +7,47 @@ class TokenType(Enum):
     Possible TokenTypes for lexemes
     """
     NUMBER = auto()
+    IDENTIFIER = auto()
     UNARY_OP = auto()
     BINARY_OP = auto()
     L_PAREN = auto()
     R_PAREN = auto()
+    # a name followed by its opening parenthesis, the lexer gives the
+    # name as value and the parser replaces it with the resolved Function
+    FUNCTION = auto()
+    COMMA = auto()
 
 
-@dataclass(frozen=True)
 class Token:
     """
-    Token that contains the token type and the value of a lexeme
+    Token that contains the token type and the value of a lexeme.
+    Tokens are immutable, they compare and hash by their fields. This
+    is written out rather than generated by dataclasses, whose import
+    is slower than a whole one-shot evaluation
     """
-    type_: TokenType
-    val: Any
+    __slots__ = ("type_", "val")
+
+    def __init__(self, type_: TokenType, val: Any) -> None:
+        object.__setattr__(self, "type_", type_)
+        object.__setattr__(self, "val", val)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"cannot delete field {name!r}")
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not Token:
+            return NotImplemented
+        return self.type_ is other.type_ and self.val == other.val
+
+    def __hash__(self) -> int:
+        return hash((self.type_, self.val))
+
+    def __reduce__(self):
+        # immutable slotted instances cannot be restored attribute by attribute
+        return Token, (self.type_, self.val)
 
     def __iter__(self):
         return iter((self.type_, self.val))
@@ -1,12 +1,142 @@
-from typing import Iterable
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NoReturn, Optional, Set, Tuple
 from collections import deque
 
-from expr_calc.operators import op_map
+from expr_calc.backends import Backend, DEFAULT_BACKEND
 from expr_calc.token import Token, TokenType
+from expr_calc.errors import UndefinedVariable
+
+
+def lookup(name: str, variables: Optional[Mapping[str, Any]]) -> Any:
+    """
+    Fetch the value bound to an identifier
+
+    :param name: identifier to look up
+    :param variables: mapping of identifiers to their values
+    :return: value bound to name
+    """
+    try:
+        return variables[name]
+    except (KeyError, TypeError):
+        raise UndefinedVariable(f"Variable {name} is not defined") from None
+
+
+class DeferredPower:
+
+    __slots__ = ("base", "exponent")
+
+    def __init__(self, base: Any, exponent: Any) -> None:
+        """
+        Power left unevaluated by the evaluators walking postfix tokens
+        until it is known whether it is the left operand of %, in which
+        case both are computed at once with the powmod of the backend
+        """
+        self.base = base
+        self.exponent = exponent
+
+    def __str__(self) -> str:
+        return f"{self.base} ^ {self.exponent}"
+
+
+def apply_deferred(symbol: str, operand_a: Any, operand_b: Any, op_map: Dict[str, Callable], powmod: Callable) -> Any:
+    """
+    Apply a binary operator for the evaluators walking postfix tokens.
+    A ^ is deferred, a deferred power is fused with the % it is the left
+    operand of and computed for any other operator, the left one first
+    as in postorder
+
+    :param symbol: operator to apply
+    :param operand_a: left operand, possibly a DeferredPower
+    :param operand_b: right operand, possibly a DeferredPower
+    :param op_map: binary operator functions of the backend
+    :param powmod: powmod of the backend
+    :return: result, or a DeferredPower for ^
+    """
+    power = op_map["^"]
+    if operand_a.__class__ is DeferredPower and symbol != "%":
+        operand_a = power(operand_a.base, operand_a.exponent)
+    if operand_b.__class__ is DeferredPower:
+        operand_b = power(operand_b.base, operand_b.exponent)
+    if operand_a.__class__ is DeferredPower:
+        return powmod(operand_a.base, operand_a.exponent, operand_b)
+    if symbol == "^":
+        return DeferredPower(operand_a, operand_b)
+    return op_map[symbol](operand_a, operand_b)
+
+
+class DeferredError:
+
+    __slots__ = ("error", "pending", "fused")
+
+    def __init__(self, error: Exception, pending: List[DeferredPower]) -> None:
+        """
+        Error raised while powers were deferred. A compiled program
+        computes those powers before the operation that failed, unless
+        they are fused with a %, so the rest of the tokens is scanned
+        with skip to tell which are, and raise_first then raises the
+        error a compiled program would
+
+        :param error: error raised by the operation that failed
+        :param pending: powers deferred when it was raised
+        """
+        self.error = error
+        self.pending = pending
+        self.fused: Set[int] = set()
+
+    @classmethod
+    def after(cls, error: Exception, values: List[Any]) -> Optional["DeferredError"]:
+        """
+        Build the deferred error of an operation that failed
+
+        :param error: error raised by the operation
+        :param values: operand stack, left as it was before the operation
+        :return: deferred error, or None if no power was deferred
+         and the error can be raised right away
+        """
+        pending = [value for value in values if value.__class__ is DeferredPower]
+        return cls(error, pending) if pending else None
+
+    def skip(self, token: Token, values: List[Any]) -> None:
+        """
+        Replace the operands of a token with a placeholder instead of
+        evaluating it, recording the deferred powers fused with a %
+
+        :param token: token of the rest of the program
+        :param values: operand stack
+        """
+        if token.type_ is TokenType.BINARY_OP:
+            if token.val == "%" and values[-2].__class__ is DeferredPower:
+                self.fused.add(id(values[-2]))
+            del values[-1]
+            values[-1] = None
+        elif token.type_ is TokenType.UNARY_OP:
+            values[-1] = None
+        elif token.type_ is TokenType.FUNCTION:
+            del values[len(values) - token.val.arity:]
+            values.append(None)
+        else:
+            values.append(None)
+
+    def raise_first(self, power: Callable) -> NoReturn:
+        """
+        Compute the deferred powers that are not fused in postorder,
+        raising the error of the first one that fails, and the error
+        of the operation if none does
+
+        :param power: ^ of the backend
+        """
+        for value in self.pending:
+            if id(value) not in self.fused:
+                power(value.base, value.exponent)
+        raise self.error
 
 
 class Tree:
 
+    # operators have at most two operands and calls a few, so children
+    # are kept in a small tuple and leaves share the empty tuple. The structural hash
+    # is computed on first use and cached
+    __slots__ = ("node", "children", "_hash")
+
     def __init__(self, node: Token, children: Iterable["Tree"] = None) -> None:
         """
         Initialise a Tree object with its value and optional children
@@ -14,8 +144,8 @@ class Tree:
         :param children: children of the node if any, children must be Tree objects.
         """
         self.node: Token = node
-        self.children: deque[Tree] = deque(children) if children else deque()
-        self.queue = deque()
+        self.children: Tuple[Tree, ...] = tuple(children) if children else ()
+        self._hash: Optional[int] = None
 
     def set_node(self, val: Token) -> None:
         """
@@ -24,6 +154,7 @@ class Tree:
         :return:
         """
         self.node = val
+        self._hash = None
 
     def append_child(self, child: "Tree") -> None:
         """
@@ -31,7 +162,8 @@ class Tree:
         :param child: child to be appended
         :return:
         """
-        self.children.append(child)
+        self.children += (child,)
+        self._hash = None
 
     def appendleft_child(self, child: "Tree") -> None:
         """
@@ -39,54 +171,133 @@ class Tree:
         :param child: child to be appended
         :return:
         """
-        self.children.appendleft(child)
+        self.children = (child,) + self.children
+        self._hash = None
 
     def traverse(self, queue=None):
         """
-        Traverse the tree(postorder), its children, and their children, recursively
-        and set them to self.queue
+        Traverse the tree(postorder), its children, and their children,
+        using an explicit stack so that deep trees do not recurse
 
-        :param queue:
-        :return:
+        :param queue: optional deque the nodes are appended to
+        :return: nodes of the tree in postorder
         """
         if queue is None:
             queue = deque()
 
-        for sub in self.children:
-            if not sub:
-                break
-            sub.traverse(queue=queue)
-        # print(self.node)
-        queue.append(self.node)
+        # (tree, visited) pairs, a node is emitted once its children are
+        stack = [(self, False)]
+        while stack:
+            tree, visited = stack.pop()
+            if visited or not tree.children:
+                queue.append(tree.node)
+            else:
+                stack.append((tree, True))
+                stack.extend((child, False) for child in reversed(tree.children))
         return queue
 
-    def eval(self) -> float:
+    def eval(self, variables: Optional[Mapping[str, Any]] = None,
+             backend: Backend = DEFAULT_BACKEND) -> float:
         """
-        Recursively evaluate the tree to its final value
+        Evaluate the tree to its final value by walking it in postorder
+        with an explicit value stack. A ^ b % m is computed with the
+        powmod of the backend and everything else in postorder, as in
+        compiled programs
+        :param variables: values of the identifiers in the tree
+        :param backend: numeric backend providing the operators
         :return: final value
         """
+        op_map, unary_op_map, powmod = backend.op_map, backend.unary_op_map, backend.powmod
+        values = []
+        # (tree, visited, is the left operand of %) triples
+        stack = [(self, False, False)]
+        with backend.activate():
+            while stack:
+                tree, visited, fused = stack.pop()
+                token = tree.node
+                if tree.children and not visited:
+                    stack.append((tree, True, fused))
+                    if token.type_ is TokenType.BINARY_OP:
+                        stack.append((tree.children[1], False, False))
+                        stack.append((tree.children[0], False, token.val == "%"))
+                    else:
+                        stack.extend((child, False, False) for child in reversed(tree.children))
+
+                # a leaf must always be a number or an identifier
+                elif token.type_ is TokenType.NUMBER:
+                    values.append(token.val)
 
-        # a leaf must always be a number
-        if self.node.type_ is TokenType.NUMBER:
-            return self.node.val
+                elif token.type_ is TokenType.IDENTIFIER:
+                    values.append(lookup(token.val, variables))
 
-        elif self.node.type_ is TokenType.BINARY_OP:
-            operand_a, operand_b = self.children
-            return op_map[self.node.val](operand_a.eval(), operand_b.eval())
+                elif token.type_ is TokenType.BINARY_OP:
+                    operand_b = values.pop()
+                    if fused and token.val == "^":
+                        values[-1] = DeferredPower(values[-1], operand_b)
+                    elif values[-1].__class__ is DeferredPower:
+                        values[-1] = powmod(values[-1].base, values[-1].exponent, operand_b)
+                    else:
+                        values[-1] = op_map[token.val](values[-1], operand_b)
 
-        elif self.node.type_ is TokenType.UNARY_OP and self.node.val == "-":
-            return self.children[0].eval() * -1
+                elif token.type_ is TokenType.UNARY_OP:
+                    values[-1] = unary_op_map[token.val](values[-1])
+
+                elif token.type_ is TokenType.FUNCTION:
+                    count = token.val.arity
+                    arguments = values[len(values) - count:]
+                    del values[len(values) - count:]
+                    values.append(token.val.call(*arguments))
+
+        return values[-1]
+
+    def __hash__(self) -> int:
+        """
+        Structural hash combining the token of the node with the hashes
+        of its children. Hashes are cached per node, so hashing is O(1)
+        once a node or one of its ancestors has been hashed. Subtrees are
+        hashed bottom up without recursion the first time. Mutating a
+        node only resets its own hash, ancestors have to be rebuilt
+        :return: hash of the tree
+        """
+        if self._hash is None:
+            stack = [(self, False)]
+            while stack:
+                tree, visited = stack.pop()
+                if tree._hash is not None:
+                    continue
+                if visited or not tree.children:
+                    tree._hash = hash((tree.node, tuple(child._hash for child in tree.children)))
+                else:
+                    stack.append((tree, True))
+                    stack.extend((child, False) for child in tree.children)
+        return self._hash
 
     def __eq__(self, other: "Tree") -> bool:
         """
-        A tree is equal to another tree if the nodes are the same
+        A tree is equal to another tree if their nodes are equal and
+        their children are equal pairwise. Identical trees, such as
+        subtrees shared by a hash-consed DAG, are equal in O(1) and
+        trees with different hashes are unequal in O(1), otherwise
+        the trees are compared node by node without recursion
         :param other: other tree to be compared
         :return: if self is equal to other
         """
         if not isinstance(other, Tree):
             return False
-        else:
-            return all([i == j for i, j in zip(self.traverse(), other.traverse())])
+        if self is other:
+            return True
+        if hash(self) != hash(other):
+            return False
+
+        pairs = [(self, other)]
+        while pairs:
+            tree, other_tree = pairs.pop()
+            if tree is other_tree:
+                continue
+            if tree.node != other_tree.node or len(tree.children) != len(other_tree.children):
+                return False
+            pairs.extend(zip(tree.children, other_tree.children))
+        return True
 
     def __repr__(self) -> str:
         if self.children:
@@ -0,0 +1,137 @@
+import math
+from functools import reduce
+
+from expr_calc import functions
+from expr_calc.compiler import Program, PUSH_CONST, BINARY_OP, UNARY_OP, LOAD_NAME, LOAD_TEMP, POW_MOD, CALL
+from expr_calc.tree import lookup
+
+from typing import Any, Mapping
+
+
+# NumPy ufuncs equivalent to op_map and unary_op_map for float arrays,
+# fmod keeps the sign of the dividend just like Decimal's remainder
+vector_op_map = {
+    '+': "add",
+    '*': "multiply",
+    '-': "subtract",
+    '/': "true_divide",
+    '^': "power",
+    '%': "fmod"
+}
+
+vector_unary_op_map = {
+    '+': "positive",
+    '-': "negative"
+}
+
+# NumPy ufuncs equivalent to the built-in functions, by implementation,
+# min and max reduce their arguments pairwise
+vector_function_map = {
+    math.sqrt: "sqrt", functions.decimal_sqrt: "sqrt",
+    math.log: "log", functions.decimal_ln: "log",
+    math.log10: "log10", functions.decimal_log: "log10",
+    math.exp: "exp", functions.decimal_exp: "exp",
+    abs: "absolute",
+    functions.minimum: "minimum",
+    functions.maximum: "maximum",
+}
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("eval_batch requires NumPy, "
+                          "install it with: pip install expr-calc[numpy]") from None
+    return numpy
+
+
+def call(np, function, arguments: list, exact: bool):
+    """
+    Apply a function to whole arrays
+
+    :param np: NumPy module
+    :param function: Function of a CALL instruction
+    :param arguments: arrays or scalars, one per argument
+    :param exact: arrays have object dtype
+    :return: array of results
+    """
+    if not arguments:
+        return function.call()
+    name = None if exact else vector_function_map.get(function.impl)
+    if name is not None:
+        ufunc = getattr(np, name)
+        return ufunc(*arguments) if ufunc.nin == len(arguments) else reduce(ufunc, arguments)
+    results = np.frompyfunc(function.call, len(arguments), 1)(*arguments)
+    return results if exact else np.asarray(results, dtype=float)
+
+
+def eval_batch(program: Program, bindings: Mapping[str, Any]):
+    """
+    Evaluate a compiled program over whole arrays of bindings, running
+    one vectorised operation per instruction instead of one program per row.
+
+    Numeric arrays are evaluated as float64 with NumPy ufuncs, functions
+    without an equivalent ufunc are applied element-wise. If any bound
+    array has object dtype, for example an array of Decimals, the
+    operators and functions of the program's backend are applied
+    element-wise instead so that its semantics are kept
+
+    :param program: compiled program to be evaluated
+    :param bindings: mapping of identifiers to arrays or sequences of values
+    :return: array of results broadcast to the shape of the bindings
+    """
+    np = _import_numpy()
+
+    arrays = {}
+    for name in program.names:
+        column = np.asarray(lookup(name, bindings))
+        arrays[name] = column if column.dtype == object else column.astype(float, copy=False)
+
+    exact = any(column.dtype == object for column in arrays.values())
+    if exact:
+        backend = program.backend
+        binary = {op: np.frompyfunc(func, 2, 1) for op, func in backend.op_map.items()}
+        unary = {op: np.frompyfunc(func, 1, 1) for op, func in backend.unary_op_map.items()}
+        powmod = np.frompyfunc(backend.powmod, 3, 1)
+        consts = program.consts
+    else:
+        binary = {op: getattr(np, func) for op, func in vector_op_map.items()}
+        unary = {op: getattr(np, func) for op, func in vector_unary_op_map.items()}
+        powmod = lambda a, b, m: np.fmod(np.power(a, b), m)    # noqa: E731
+        consts = [float(const) for const in program.consts]
+
+    symbols = program.symbols
+    stack = []
+    temps = [None] * program.temps
+    with program.backend.activate():
+        for opcode, arg in program.code:
+            if opcode == PUSH_CONST:
+                stack.append(consts[arg])
+            elif opcode == LOAD_NAME:
+                stack.append(arrays[program.names[arg]])
+            elif opcode == BINARY_OP:
+                operand_b = stack.pop()
+                stack[-1] = binary[symbols[arg]](stack[-1], operand_b)
+            elif opcode == UNARY_OP:
+                stack[-1] = unary[symbols[arg]](stack[-1])
+            elif opcode == POW_MOD:
+                modulus = stack.pop()
+                exponent = stack.pop()
+                stack[-1] = powmod(stack[-1], exponent, modulus)
+            elif opcode == CALL:
+                function = program.funcs[arg]
+                count = function.arity
+                arguments = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                stack.append(call(np, function, arguments, exact))
+            elif opcode == LOAD_TEMP:
+                stack.append(temps[arg])
+            else:
+                temps[arg] = stack[-1]
+
+    shape = np.broadcast_shapes(*(column.shape for column in arrays.values()))
+    result = np.asarray(stack[-1], dtype=object if exact else float)
+    if result.shape != shape:
+        result = np.broadcast_to(result, shape).copy()
+    return result
@@ -0,0 +1,320 @@
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from expr_calc.backends import Backend
+from expr_calc.calc import Calc
+from expr_calc.compiler import is_powmod
+from expr_calc.errors import CyclicDependency, UndefinedVariable
+from expr_calc.token import Token, TokenType
+from expr_calc.tree import Tree
+
+
+class Formula:
+
+    __slots__ = ("source", "tree", "tokens", "children", "parents", "leaves", "fused", "values", "dirty")
+
+    def __init__(self, source: str, tree: Tree) -> None:
+        """
+        Named expression of a Workspace. The tree is flattened in
+        postorder, so children always come before their parent, and
+        every node keeps its last computed value. The power of a ^ b % m
+        has no value of its own, its parent is computed with the powmod
+        of the backend
+
+        :param source: expression the tree was parsed from
+        :param tree: abstract syntax tree of the expression
+        """
+        self.source = source
+        self.tree = tree
+        self.tokens: List[Token] = []
+        self.children: List[Tuple[int, ...]] = []
+        self.parents: List[int] = []
+        self.leaves: Dict[str, List[int]] = {}      # identifier -> indices of its leaves
+        self.fused: Set[int] = set()                # indices of the powers of a ^ b % m
+
+        # (tree, visited) pairs, as in Tree.traverse
+        stack = [(tree, False)]
+        indices: List[int] = []     # indices of finished subtrees
+        while stack:
+            node, visited = stack.pop()
+            if node.children and not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+
+            index = len(self.tokens)
+            children = tuple(indices[len(indices) - len(node.children):]) if node.children else ()
+            del indices[len(indices) - len(children):]
+            for child in children:
+                self.parents[child] = index
+            indices.append(index)
+
+            self.tokens.append(node.node)
+            self.children.append(children)
+            self.parents.append(-1)
+            if node.node.type_ is TokenType.IDENTIFIER:
+                self.leaves.setdefault(node.node.val, []).append(index)
+            elif is_powmod(node):
+                self.fused.add(children[0])
+
+        self.values: List[Any] = [None] * len(self.tokens)
+        self.dirty: Set[int] = set(range(len(self.tokens)))
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.leaves)     # in order of first appearance
+
+    def mark(self, name: str) -> None:
+        """
+        Mark the paths from the leaves of an identifier up to the root
+        as dirty, stopping at nodes which are dirty already
+
+        :param name: identifier whose value changed
+        """
+        for index in self.leaves.get(name, ()):
+            while index != -1 and index not in self.dirty:
+                self.dirty.add(index)
+                index = self.parents[index]
+
+    def recompute(self, values: Dict[str, Any], backend: Backend) -> int:
+        """
+        Recompute the dirty nodes from the cached values of the others
+
+        :param values: values of the identifiers of the formula
+        :param backend: numeric backend providing the operators
+        :return: number of nodes recomputed
+        """
+        op_map, unary_op_map = backend.op_map, backend.unary_op_map
+        tokens, children, results, fused = self.tokens, self.children, self.values, self.fused
+        dirty = sorted(self.dirty)     # postorder, children first
+
+        with backend.activate():
+            for index in dirty:
+                token = tokens[index]
+                if token.type_ is TokenType.NUMBER:
+                    results[index] = token.val
+                elif token.type_ is TokenType.IDENTIFIER:
+                    if token.val not in values:
+                        raise UndefinedVariable(f"Variable {token.val} is not defined")
+                    results[index] = values[token.val]
+                elif index in fused:
+                    continue
+                elif token.type_ is TokenType.BINARY_OP:
+                    operand_a, operand_b = children[index]
+                    if operand_a in fused:
+                        base, exponent = children[operand_a]
+                        results[index] = backend.powmod(results[base], results[exponent], results[operand_b])
+                    else:
+                        results[index] = op_map[token.val](results[operand_a], results[operand_b])
+                elif token.type_ is TokenType.FUNCTION:
+                    results[index] = token.val.call(*(results[child] for child in children[index]))
+                else:
+                    results[index] = unary_op_map[token.val](results[children[index][0]])
+
+        self.dirty.clear()
+        return len(dirty)
+
+    @property
+    def value(self) -> Any:
+        return self.values[-1]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+class Workspace:
+
+    def __init__(self, backend: Union[str, Backend, None] = None, precision: Optional[int] = None) -> None:
+        """
+        Spreadsheet-like set of named formulas and input values.
+
+        Formulas refer to inputs and to each other by name and are parsed
+        once. Every node of a formula caches its value, so when a name
+        changes only the nodes on the paths from its leaves to the roots
+        of the formulas depending on it are recomputed, and only when a
+        value is asked for. recomputed and reused count the nodes that
+        were evaluated again and the nodes whose cached value was kept
+
+        :param backend: numeric backend, see Calc
+        :param precision: digits of precision of the decimal backend
+        """
+        self.calc: Calc = Calc(cache_size=0, optimize=False, backend=backend, precision=precision)
+        self.backend: Backend = self.calc.backend
+        self.formulas: Dict[str, Formula] = {}
+        self.inputs: Dict[str, Any] = {}
+        self.dependents: Dict[str, Set[str]] = {}   # name -> formulas referring to it
+        self.stale: Set[str] = set()    # formulas with dirty nodes
+
+        self.recomputed = 0
+        self.reused = 0
+
+    def define(self, name: str, expression: str) -> None:
+        """
+        Define or replace a formula, replacing any input of the same name
+
+        :param name: name of the formula
+        :param expression: expression, it may refer to other names
+        """
+        formula = Formula(expression, self.calc.parse(expression))
+        cycle = self._find_cycle(name, formula.names)
+        if cycle:
+            raise CyclicDependency(f"Formula {name} would depend on itself: {' -> '.join(cycle)}")
+
+        self._forget(name)
+        self.formulas[name] = formula
+        for dependency in formula.names:
+            self.dependents.setdefault(dependency, set()).add(name)
+        self.stale.add(name)
+        self._changed(name)
+
+    def set(self, name: str, value: Any) -> None:
+        """
+        Set an input value, replacing any formula of the same name
+
+        :param name: name of the input
+        :param value: value, strings are converted by the backend
+        """
+        if isinstance(value, str):
+            value = self.backend.literal(value)
+        self._forget(name)
+        self.inputs[name] = value
+        self._changed(name)
+
+    def remove(self, name: str) -> None:
+        """
+        Remove a formula or input, formulas referring to it can no
+        longer be evaluated until it is defined again
+
+        :param name: name to be removed
+        """
+        if name not in self.formulas and name not in self.inputs:
+            raise UndefinedVariable(f"Variable {name} is not defined")
+        self._forget(name)
+        self._changed(name)
+
+    def get(self, name: str) -> Any:
+        """
+        Value of a formula or input, recomputing the dirty nodes of the
+        formula and of the stale formulas it depends on
+
+        :param name: name of the formula or input
+        :return: value
+        """
+        if name in self.inputs:
+            return self.inputs[name]
+        if name not in self.formulas:
+            raise UndefinedVariable(f"Variable {name} is not defined")
+
+        for stale in self._stale_dependencies(name):
+            formula = self.formulas[stale]
+            values = {dependency: self.get_cached(dependency) for dependency in formula.names
+                      if dependency in self.inputs or dependency in self.formulas}
+            recomputed = formula.recompute(values, self.backend)
+            self.recomputed += recomputed
+            self.reused += len(formula) - recomputed
+            self.stale.discard(stale)
+        return self.formulas[name].value
+
+    def get_cached(self, name: str) -> Any:
+        if name in self.inputs:
+            return self.inputs[name]
+        return self.formulas[name].value
+
+    def recalculate(self) -> Dict[str, Any]:
+        """
+        Bring every formula up to date
+
+        :return: value of every formula and input
+        """
+        return {name: self.get(name) for name in self}
+
+    def reset_counters(self) -> None:
+        self.recomputed = 0
+        self.reused = 0
+
+    def _forget(self, name: str) -> None:
+        self.inputs.pop(name, None)
+        formula = self.formulas.pop(name, None)
+        if formula is not None:
+            for dependency in formula.names:
+                self.dependents[dependency].discard(name)
+            self.stale.discard(name)
+
+    def _changed(self, name: str) -> None:
+        """Mark the formulas that depend on name, directly or not, as dirty"""
+        pending = [name]
+        while pending:
+            changed = pending.pop()
+            for dependent in self.dependents.get(changed, ()):
+                self.formulas[dependent].mark(changed)
+                if dependent not in self.stale:
+                    self.stale.add(dependent)
+                    pending.append(dependent)
+
+    def _stale_dependencies(self, name: str) -> List[str]:
+        """
+        Stale formulas that name depends on, including itself, ordered
+        so that every formula comes after its dependencies
+
+        :param name: name of a formula
+        :return: formulas to be recomputed in order
+        """
+        order = []
+        seen = set()
+        stack = [(name, False)]
+        while stack:
+            current, visited = stack.pop()
+            if visited:
+                order.append(current)
+                continue
+            if current in seen:
+                continue
+            # marked when expanded rather than when pushed, so a formula
+            # reached again deeper down is still ordered before its users
+            seen.add(current)
+            stack.append((current, True))
+            for dependency in self.formulas[current].names:
+                if dependency in self.stale and dependency not in seen:
+                    stack.append((dependency, False))
+        return [formula for formula in order if formula in self.stale]
+
+    def _find_cycle(self, name: str, dependencies: List[str]) -> List[str]:
+        """
+        Find a path of formula references from dependencies back to name
+
+        :param name: name of the formula being defined
+        :param dependencies: names the new formula refers to
+        :return: the cycle as a list of names, empty if there is none
+        """
+        previous: Dict[str, str] = {dependency: name for dependency in dependencies}
+        pending = list(dependencies)
+        while pending:
+            current = pending.pop()
+            if current == name:
+                cycle = [name]
+                step = previous[name]
+                while step != name:
+                    cycle.append(step)
+                    step = previous[step]
+                cycle.append(name)
+                return cycle[::-1]
+            formula = self.formulas.get(current)
+            if formula is None:
+                continue
+            for dependency in formula.names:
+                if dependency not in previous:
+                    previous[dependency] = current
+                    pending.append(dependency)
+        return []
+
+    def __getitem__(self, name: str) -> Any:
+        return self.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.formulas or name in self.inputs
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.inputs
+        yield from self.formulas
+
+    def __len__(self) -> int:
+        return len(self.formulas) + len(self.inputs)
@@ -0,0 +1,107 @@
+import random
+from decimal import ROUND_FLOOR, Context, Decimal, DecimalException, Inexact, Rounded, localcontext
+
+import pytest
+
+from expr_calc.adaptive import AdaptiveEvaluator
+from expr_calc.calc import Calc
+from expr_calc.errors import UndefinedVariable
+
+
+CONTEXTS = [
+    Context(prec=28),
+    Context(prec=5),
+    Context(prec=5, Emax=3, Emin=-3, clamp=1),
+    Context(prec=4, rounding=ROUND_FLOOR, traps=[Inexact, Rounded]),
+]
+
+VALUES = ["0", "-0", "3", "-7", "1.50", "-2.25", "0.10", "99999", "1E+3", "1.0000001", "9" * 30]
+
+
+def outcome(func, *args):
+    """Result and its type, or raised exception, and the flags it set"""
+    with localcontext() as context:
+        context.clear_flags()
+        try:
+            result = func(*args)
+            result = str(result), type(result)
+        except (DecimalException, UndefinedVariable) as error:
+            result = type(error)
+        return result, {signal for signal, raised in context.flags.items() if raised}
+
+
+@pytest.mark.parametrize("context", CONTEXTS)
+@pytest.mark.parametrize("expression", [
+    "x",
+    "x * y + 2",
+    "x * 1.50 + 2.0 * y - 2 * y",
+    "(x + y) ^ 2 - (x + y) * 3",
+    "-x ^ 3 + +y",
+    "x / 4 + y / 0.5",
+    "x % 7 + y % 0.3",
+    "x ^ 40 % 7 + y ^ 2 % -5",
+    "x - x",
+    "x / y",
+    "100 * x + 0.001",
+    "sqrt(x * x) + y",
+])
+def test_adaptive_matches_run(context, expression):
+    with localcontext(context):
+        program = Calc(expression).compile()
+        evaluator = AdaptiveEvaluator()
+        for x in VALUES:
+            for y in VALUES[::3]:
+                variables = {"x": Decimal(x), "y": Decimal(y)}
+                assert outcome(evaluator.run, program, variables) == outcome(program.run, variables), variables
+
+
+def test_adaptive_random_programs():
+    rng = random.Random(7)
+    numbers = ["0", "2", "7", "0.5", "1.50", "0.0", "12345", "100", "x", "y", "y"]
+
+    def generate(depth):
+        if not depth or rng.random() < 0.3:
+            return rng.choice(numbers)
+        op = rng.choice(["+", "-", "*", "/", "%", "^", "-"])
+        if op == "^":
+            return f"({generate(depth - 1)}) ^ {rng.choice(['1', '2', '3', '0', 'y'])}"
+        return f"({generate(depth - 1)}) {op} ({generate(depth - 1)})"
+
+    evaluator = AdaptiveEvaluator()
+    for _ in range(300):
+        program = Calc(generate(3), optimize=rng.random() < 0.5).compile()
+        variables = {"x": Decimal(rng.choice(VALUES)), "y": Decimal(rng.choice(VALUES))}
+        with localcontext(rng.choice(CONTEXTS)):
+            assert outcome(evaluator.run, program, variables) == outcome(program.run, variables), program
+    assert 0.3 < evaluator.fast_rate < 0.9
+
+
+def test_adaptive_counters():
+    calc: Calc = Calc("x * 1.5 + y", adaptive=True)
+    assert calc.adaptive.fast_rate == 0
+
+    assert str(calc.eval({"x": Decimal(3), "y": Decimal("0.25")})) == "4.75"
+    assert str(calc.eval({"x": Decimal("1.1"), "y": Decimal(2)})) == "3.65"
+    # a zero result, an int variable and a value too large for the plan fall back
+    calc.eval({"x": Decimal(2), "y": Decimal(-3)})
+    calc.eval({"x": 2, "y": Decimal(1)})
+    calc.eval({"x": Decimal(10) ** 30, "y": Decimal(1)})
+    assert (calc.adaptive.fast, calc.adaptive.fallback) == (2, 3)
+    assert calc.adaptive.fast_rate == 0.4
+    assert str(calc.adaptive) == "2 fast, 3 fallback (40.0% fast)"
+
+    calc.adaptive.reset()
+    calc.program = "1 / x"
+    calc.eval({"x": Decimal(3)})
+    assert (calc.adaptive.fast, calc.adaptive.fallback) == (0, 1)
+
+
+def test_adaptive_calc():
+    expression = "x / 4 + 2 ^ 10 % 1000"
+    calc: Calc = Calc(expression, adaptive=True, instrument=True, precision=5)
+    assert str(calc.eval({"x": Decimal(12)})) == str(Calc(expression, precision=5).eval({"x": Decimal(12)})) == "27"
+    assert calc.adaptive.fast == 1 and calc.stats.evaluations == 1
+    with pytest.raises(UndefinedVariable):
+        calc.eval()
+    with pytest.raises(ValueError):
+        Calc(backend="float", adaptive=True)
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+
+from decimal import Decimal, getcontext
+from fractions import Fraction
+
+from expr_calc.backends import DecimalBackend, get_backend
+from expr_calc.calc import Calc
+
+
+@pytest.mark.parametrize("backend, expression, result", [
+    ("float", "1.5 * 4 - 2", 4.0),
+    ("float", "-7 % 3", -1.0),
+    ("int", "7 / 2", 3.5),
+    ("int", "8 / 2", 4),
+    ("int", "123 ^ 40", 123 ** 40),
+    ("int", "2 ^ -1", 0.5),
+    ("int", "-7 % 3", -1),
+    ("fraction", "1 / 3 + 1 / 6", Fraction(1, 2)),
+    ("fraction", "0.1 * 3", Fraction(3, 10)),
+    ("fraction", "-7 % 3", Fraction(-1)),
+    ("fraction", "4 ^ 0.5", 2.0),
+    ("int", "-7 ^ 12345 % 1000", -(7 ** 12345 % 1000)),
+    ("int", "(-7) ^ 12345 % 1000", -(7 ** 12345 % 1000)),
+    ("fraction", "3 ^ 1000 % 7", Fraction(3 ** 1000 % 7)),
+    ("float", "3 ^ 4 % 7", 4.0),
+])
+def test_backend_results(backend, expression, result):
+    calc: Calc = Calc(backend=backend)
+    value = calc.compile(expression).run()
+    assert value == result and type(value) is type(result)
+
+
+@pytest.mark.parametrize("backend", ["decimal", "float", "int", "fraction"])
+@pytest.mark.parametrize("expression", ["2 * 3 + x * 1", "--x ^ 2", "(x + 1) / 1", "x ^ 3 % 2", "(-x) ^ 3 % 4"])
+def test_backend_optimizer_is_exact(backend, expression):
+    variables = {"x": get_backend(backend).literal("2.5")}
+    optimised = Calc(backend=backend).compile(expression).run(variables)
+    plain = Calc(backend=backend, optimize=False).compile(expression).run(variables)
+    assert optimised == plain and type(optimised) is type(plain)
+
+
+@pytest.mark.parametrize("backend", ["int", "fraction"])
+@pytest.mark.parametrize("expression", ["99 ^ 99 ^ 9", "x + 9 ^ 9 ^ 9", "(99 ^ 99 ^ 9) * 0 % 7"])
+def test_huge_powers_overflow(backend, expression):
+    # too large to be exact, they overflow as floats instead of hanging
+    calc: Calc = Calc(backend=backend)
+    with pytest.raises(OverflowError):
+        calc.compile(expression).run({"x": 1})
+    assert calc.compile("(-1) ^ 99 ^ 9 + 1 ^ 99 ^ 9").run() == 0
+    # the fused modular power never builds the power
+    assert calc.compile("99 ^ 99 ^ 9 % 7").run() == pow(99, 99 ** 9, 7)
+
+
+@pytest.mark.parametrize("expression, result", [
+    ("(2 ^ 0.5) ^ 2", math.sqrt(2) ** 2),
+    ("sqrt(2) ^ 2", math.sqrt(2) ** 2),
+    ("2 ^ (2 ^ 0.5)", 2 ** math.sqrt(2)),
+    ("(2 ^ 0.5) ^ 2 % 3", math.sqrt(2) ** 2 % 3),
+])
+def test_fraction_mixed_with_floats(expression, result):
+    # non-integral powers and math functions leave floats among the Fractions
+    calc: Calc = Calc(backend="fraction")
+    assert calc.compile(expression).run() == result
+    assert calc.parse(expression).eval(backend=calc.backend) == result
+    assert calc.compile_native(expression)({}) == result
+
+
+def test_precision_is_per_instance():
+    precise: Calc = Calc("1 / 3", precision=50)
+    default: Calc = Calc("1 / 3")
+
+    assert len(precise.eval().as_tuple().digits) == 50
+    assert len(default.eval().as_tuple().digits) == getcontext().prec
+    assert precise.tree.eval(backend=precise.backend) == precise.eval()
+
+
+def test_backend_errors():
+    with pytest.raises(ValueError):
+        get_backend("complex")
+    with pytest.raises(ValueError):
+        get_backend("float", precision=10)
+    assert get_backend(DecimalBackend(5)).context.prec == 5
+    assert Calc(backend="decimal").compile("0.1").run() == Decimal("0.1")
@@ -0,0 +1,62 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+from expr_calc.batch import evaluate_lines, read_lines, run_batch
+from expr_calc.calc import Calc
+from expr_calc.errors import BatchError
+
+
+def test_evaluate_lines_inline_errors():
+    lines = ["1 + 1", "", "2 * x", "1 / 0", "2 ^ 10"]
+    assert list(evaluate_lines(lines)) == [
+        "2", "", "error: Variable x is not defined", "error: DivisionByZero", "1024"
+    ]
+
+
+def test_evaluate_lines_fail_fast():
+    results = evaluate_lines(["3 * 3", "1 +", "4"], fail_fast=True)
+    assert next(results) == "9"
+    with pytest.raises(BatchError, match="line 2"):
+        next(results)
+
+
+def test_run_batch_reuses_calc(tmp_path):
+    path = tmp_path / "expressions.txt"
+    path.write_text("6 * 7\n6 * 7\r\n6  *  7\n")
+    output = io.StringIO()
+    calc: Calc = Calc()
+
+    assert run_batch(str(path), output, calc, chunk_size=2) == 3
+    assert output.getvalue() == "42\n42\n42\n"
+    assert calc.cache.hits == 2
+
+
+def test_read_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    assert list(read_lines(str(path))) == []
+
+
+def test_cli_reads_stdin():
+    completed = subprocess.run(
+        [sys.executable, "-m", "expr_calc", "-", "--fail-fast"],
+        input="1 + 2\n2 ^ 0.5 ^ 2\n", capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.splitlines() == ["3", "1.189207115002721066717499971"]
+
+
+@pytest.mark.parametrize("args, stdout, status", [
+    (["-e", "1 + 2 * 3"], "7\n", 0),
+    (["-e", "-1 - 2"], "-3\n", 0),
+    (["-e", "1 / 3", "--precision", "5"], "0.33333\n", 0),
+    (["--backend", "fraction", "-e", "1/3 + 1/6"], "1/2\n", 0),
+    (["-e", "2 ~ 3 ^", "--postfix"], "-8\n", 0),
+    (["-e", "1 +"], "", 1),
+])
+def test_cli_one_shot(args, stdout, status):
+    completed = subprocess.run([sys.executable, "-m", "expr_calc", *args], capture_output=True, text=True)
+    assert completed.stdout == stdout and completed.returncode == status
+    assert completed.stderr == ("error: Operator + is missing an operand\n" if status else "")
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.corpora import CORPORA, generate
+from benchmarks.startup import NOT_IMPORTED, ONE_SHOT, import_times
+from benchmarks.suite import STAGES, compare, run_suite
+from expr_calc.calc import Calc
+
+
+@pytest.mark.parametrize("name", list(CORPORA))
+def test_corpora_are_seeded_and_valid(name):
+    expressions = generate(name, 50, seed=3)
+    assert expressions == generate(name, 50, seed=3)
+    assert expressions != generate(name, 50, seed=4)
+
+    calc: Calc = Calc()
+    for expression in expressions:
+        calc.program = expression
+        calc.eval()
+
+
+def test_run_suite():
+    results = run_suite(["short", "nested"], scale=0.01, repeat=1)
+    assert results["settings"] == {"scale": 0.01, "seed": 0, "repeat": 1}
+    for measurements in results["results"].values():
+        assert set(measurements) == set(STAGES) | {"peak_memory"}
+        assert measurements["peak_memory"] > 0
+
+
+def test_compare():
+    settings = {"scale": 1.0, "seed": 0, "repeat": 5}
+    baseline = {"settings": settings, "results": {"flat": {"lex": 1.0, "parse": 2.0}}}
+    current = {"settings": settings, "results": {"flat": {"lex": 1.05, "parse": 2.5}, "short": {"lex": 9.0}}}
+
+    assert compare(current, baseline, threshold=0.1) == ["flat parse: 2 -> 2.5 (+25.0%)"]
+    assert compare(current, baseline, threshold=0.3) == []
+
+    with pytest.raises(ValueError):
+        compare(current, dict(baseline, settings=dict(settings, seed=1)))
+
+
+def test_one_shot_imports():
+    imports = import_times(ONE_SHOT)
+    assert "expr_calc.calc" in imports
+    assert [name for name in NOT_IMPORTED if name in imports] == []
@@ -0,0 +1,48 @@
+import pytest
+
+from expr_calc.cache import LRUCache
+from expr_calc.calc import Calc
+from expr_calc.errors import NoProgramLoaded
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1     # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.info() == (1, 1, 1, 2, 2)
+
+
+def test_cache_hit_skips_front_end():
+    calc: Calc = Calc(cache_size=4)
+    first = calc.compile("1 + 2 * 3")
+    calc.lexed = []
+
+    assert calc.compile("1  +  2 *   3") is first
+    assert calc.lexed == []
+    assert calc.cache.info().hit_rate == 0.5
+
+
+def test_eval_uses_cache():
+    calc: Calc = Calc()
+    for expression in ["2 ^ 10", "2 ^ 10", "3 * 3", "2 ^ 10"]:
+        calc.program = expression
+        calc.eval()
+    assert calc.cache.hits == 2 and calc.cache.misses == 2
+
+
+def test_cache_disabled():
+    calc: Calc = Calc("1 + 1", cache_size=0)
+    assert calc.cache is None
+    assert calc.compile() is not calc.compile()
+
+
+@pytest.mark.parametrize("program", ["", "   "])
+def test_empty_program_not_cached(program):
+    calc: Calc = Calc(program)
+    with pytest.raises(NoProgramLoaded):
+        calc.eval()
@@ -1,7 +1,50 @@
+import pytest
+
+from decimal import Decimal
+
 from expr_calc.calc import Calc
+from expr_calc.errors import UndefinedVariable
 
 
 def test_calc_init():
     """Test if program is loaded"""
     calc: Calc = Calc("1 + 1")
     assert calc.program == "1 + 1"
+
+
+def test_calc_variables():
+    """Test if identifiers are looked up when evaluating"""
+    calc: Calc = Calc("x * 2 - y")
+    assert calc.eval({"x": Decimal("1.5"), "y": 1}) == calc.tree.eval({"x": Decimal("1.5"), "y": 1}) == Decimal("2.0")
+
+
+def test_calc_undefined_variable():
+    calc: Calc = Calc("x + 1")
+    with pytest.raises(UndefinedVariable):
+        calc.eval()
+
+
+def test_calc_not_instrumented_by_default():
+    assert Calc().stats is None
+
+
+def test_calc_stats():
+    samples = []
+    calc: Calc = Calc(stats_hook=samples.append)
+
+    calc.program = "-(1 + x) * (2 - 3)"
+    assert calc.eval({"x": 1}) == calc.eval({"x": 2}) - 1 == Decimal(2)
+
+    first, second = samples
+    assert not first.cached and second.cached
+    assert first.tokens == 12 and first.nodes == 8 and second.tokens == 0
+    assert first.operator_depth == 3 and first.operand_depth == 3
+    assert first.times["lex"] > 0 and second.times["lex"] == 0
+
+    snapshot = calc.stats.snapshot()
+    assert snapshot["evaluations"] == 2 and snapshot["cache_hits"] == 1
+    assert snapshot["op_counts"] == {"unary -": 2, "+": 2, "*": 2}
+
+    calc.stats.reset()
+    assert calc.stats.snapshot()["evaluations"] == 0
+    assert snapshot["evaluations"] == 2
@@ -0,0 +1,49 @@
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.compiler import PUSH_CONST, BINARY_OP, UNARY_OP, LOAD_NAME, POW_MOD
+from decimal import Decimal
+
+
+@pytest.mark.parametrize("expression", [
+    "1 + 1",
+    "-1 + 5",
+    "3.4 + 56",
+    "5.23 * 6.46",
+    "-1500 / 2000",
+    "34 % 5",
+    "123 ^ 4",
+    "-10 ^ 2",
+    "(-1) ^ -2",
+    "-2 ^ (2/3)",
+    "(1+2)*3-1",
+    "1---+---2^-((+2))",
+])
+def test_compiled_matches_tree(expression):
+    calc: Calc = Calc()
+    program = calc.compile(expression)
+    assert program.run() == calc.tree.eval()
+
+
+@pytest.mark.parametrize("expression, opcodes", [
+    ("2", [PUSH_CONST]),
+    ("1 + 2", [PUSH_CONST, PUSH_CONST, BINARY_OP]),
+    ("-1 ^ -2", [PUSH_CONST, PUSH_CONST, UNARY_OP, BINARY_OP, UNARY_OP]),
+    ("x ^ 2 % 3", [LOAD_NAME, PUSH_CONST, PUSH_CONST, POW_MOD]),
+    ("(x ^ 2) ^ 2 % 3", [LOAD_NAME, PUSH_CONST, BINARY_OP, PUSH_CONST, PUSH_CONST, POW_MOD]),
+    ("x % 2 ^ 3", [LOAD_NAME, PUSH_CONST, PUSH_CONST, BINARY_OP, BINARY_OP]),
+])
+def test_compiled_postfix_order(expression, opcodes):
+    calc: Calc = Calc(optimize=False)
+    assert [opcode for opcode, _ in calc.compile(expression)] == opcodes
+
+
+def test_program_reuse():
+    calc: Calc = Calc()
+    program = calc.compile("1.5 * 4 - 2")
+    assert program.run() == program.run() == Decimal("4.0")
+
+
+def test_unary_plus():
+    calc: Calc = Calc("+2")
+    assert calc.eval() == calc.compile().run() == Decimal("2")
@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.compiler import LOAD_TEMP, STORE_TEMP
+from expr_calc.dag import HashConser, eval_dag
+from expr_calc.token import Token, TokenType
+from expr_calc.tree import Tree
+
+
+def test_equal_subexpressions_are_shared():
+    calc: Calc = Calc()
+    conser = HashConser()
+    dag = conser.build(calc.parse("(a+b)^2 + (a+b)*3"))
+
+    power, product = dag.children
+    assert power.children[0] is product.children[0]
+    assert id(power.children[0]) in conser.shared
+    assert len(conser) == 8     # a, b, a+b, 2, ^, 3, *, +
+    assert conser.hits == 3
+
+
+def test_exact_values_are_not_shared():
+    calc: Calc = Calc()
+    dag = HashConser().build(calc.parse("2.0 * x + 2 * x"))
+    left, right = dag.children
+    assert left == right
+    assert left is not right
+    assert eval_dag(dag, {"x": Decimal(3)}) == Decimal("12.0")
+
+
+@pytest.mark.parametrize("expression, x", [
+    ("(0 - x) * (-0 * 0)", 1.0),
+    ("(((0 - x) + (1.0 - x)) * (-0 * 0))", 0.0),
+])
+def test_signed_zeros_are_not_shared(expression, x):
+    # the optimiser folds -0 * 0 to -0.0, which must stay apart from 0.0
+    calc: Calc = Calc(backend="float")
+    expected = Calc(backend="float", optimize=False).compile(expression).run({"x": x})
+    tree = calc.parse(expression)
+    assert repr(eval_dag(HashConser().build(tree), {"x": x}, calc.backend)) == repr(expected)
+    assert repr(calc.compile(expression).run({"x": x})) == repr(expected)
+    assert repr(calc.compile_native(expression)({"x": x})) == repr(expected)
+
+
+@pytest.mark.parametrize("expression", [
+    "(a+b)^2 + (a+b)*3",
+    "-(a*b) - -(a*b) + (a*b) % (a*b)",
+    "((a+1)*(a+1)) / ((a+1)*(a+1)) + a",
+])
+def test_dag_results_match_tree(expression):
+    variables = {"a": Decimal("1.5"), "b": Decimal("-4")}
+    tree = Calc(optimize=False).parse(expression)
+    expected = tree.eval(variables)
+
+    assert eval_dag(HashConser().build(tree), variables) == expected
+    program = Calc().compile(expression)
+    assert program.temps > 0
+    assert [opcode for opcode, _ in program].count(STORE_TEMP) == program.temps
+    assert LOAD_TEMP in [opcode for opcode, _ in program]
+    assert program.run(variables) == expected
+
+
+def test_tree_equality_checks_sizes():
+    one = Tree(Token(TokenType.NUMBER, 1))
+    plus = Token(TokenType.BINARY_OP, "+")
+    assert Tree(plus, [one, one]) != Tree(plus, [one])
+    assert Tree(plus, [one]) != Tree(plus, [one, one])
+    assert Tree(plus, [one, one]) == Tree(plus, [one, Tree(Token(TokenType.NUMBER, 1))])
+
+
+def test_tree_hash_is_cached():
+    calc: Calc = Calc(optimize=False)
+    tree = calc.parse("1 + 2 * x")
+    assert hash(tree) == hash(calc.parse("1+2*x"))
+    assert {tree: True}[Calc(optimize=False).parse("1 + 2 * x")]
+
+    product = tree.children[1]
+    assert product._hash is not None
+    product.set_node(Token(TokenType.BINARY_OP, "/"))
+    assert product._hash is None
+
+
+def test_deep_tree_equality():
+    source = "(" * 100_000 + "-x" + ")" * 100_000 + "+1"
+    calc: Calc = Calc(cache_size=0, optimize=False)
+    assert calc.parse(source) == calc.parse(source.replace("1", "1 "))
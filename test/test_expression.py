@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Context, Decimal, DivisionByZero, getcontext, localcontext
+from fractions import Fraction
+
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.errors import TokenError, UndefinedVariable
+from expr_calc.expression import compile_expression, evaluate, evaluate_batch
+
+
+@pytest.mark.parametrize("source", [
+    "1 + 2 * 3",
+    "(x + 1) ^ 2 % 7 - -x",
+    "1 / 3 + x / 7",
+    "2 ^ 0.5 * (x + x)",
+])
+@pytest.mark.parametrize("optimize", [True, False])
+def test_evaluate_matches_calc(source, optimize):
+    variables = {"x": Decimal("1.25")}
+    assert evaluate(source, variables, optimize=optimize) == Calc(source).eval(variables)
+    assert compile_expression(source, optimize=optimize)(variables) == Calc(source).eval(variables)
+
+
+def test_backends():
+    assert evaluate("1 / 3 + 1 / 6", backend="fraction") == Fraction(1, 2)
+    assert evaluate("7 / 2", backend="int") == 3.5
+    with pytest.raises(ValueError):
+        evaluate("1", backend="float", context=Context(prec=3))
+    with pytest.raises(ValueError):
+        evaluate("1", precision=3, context=Context(prec=3))
+
+
+def test_precision_does_not_leak():
+    prec = getcontext().prec
+    assert str(evaluate("1 / 3", precision=5)) == "0.33333"
+    assert str(evaluate("1 / 3", context=Context(prec=3))) == "0.333"
+    assert evaluate("1 / 3") == Decimal(1) / Decimal(3)
+    assert getcontext().prec == prec
+
+
+def test_expression_captures_its_context():
+    with localcontext() as context:
+        context.prec = 4
+        expression = compile_expression("1 / 3 + x")
+    assert str(expression({"x": 0})) == "0.3333"
+
+    # other threads have their own default contexts
+    with ThreadPoolExecutor(4) as executor:
+        assert set(executor.map(lambda x: str(expression({"x": x})), [0] * 8)) == {"0.3333"}
+
+
+def test_expression_is_immutable():
+    expression = compile_expression("x * 2")
+    assert expression.names == ("x",)
+    with pytest.raises(AttributeError):
+        expression.source = "x * 3"
+    with pytest.raises(UndefinedVariable):
+        expression()
+
+
+def test_threads_with_different_contexts():
+    barrier = threading.Barrier(4)
+
+    def run(precision):
+        barrier.wait()
+        return [str(evaluate("1 / 7", context=Context(prec=precision))) for _ in range(50)]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(run, [2, 5, 10, 20]))
+    for precision, values in zip([2, 5, 10, 20], results):
+        assert set(values) == {str(Context(prec=precision).divide(1, 7))}
+
+
+def test_evaluate_batch():
+    sources = [f"{i} * x + 1 / 3" for i in range(500)]
+    with localcontext() as context:
+        context.prec = 6
+        results = evaluate_batch(sources, {"x": 2}, max_workers=4, chunk_size=16)
+    assert results == [Context(prec=6).add(2 * i, Context(prec=6).divide(1, 3)) for i in range(500)]
+
+
+def test_evaluate_batch_errors():
+    sources = ["1 + 1", "1 / 0", "1 +", "2 * 3"]
+    results = evaluate_batch(sources, max_workers=2, chunk_size=1, return_exceptions=True)
+    assert results[0] == 2 and results[3] == 6
+    assert isinstance(results[1], DivisionByZero) and isinstance(results[2], TokenError)
+
+    with pytest.raises(DivisionByZero):
+        evaluate_batch(sources, max_workers=2, chunk_size=1)
+    assert evaluate_batch([]) == []
@@ -0,0 +1,195 @@
+import math
+from decimal import Decimal, InvalidOperation, localcontext
+from fractions import Fraction
+
+import pytest
+
+from expr_calc.calc import Calc, parse_tokens
+from expr_calc.dag import HashConser, eval_dag
+from expr_calc.errors import TokenError, UndefinedFunction
+from expr_calc.expression import compile_expression, evaluate
+from expr_calc.functions import BUILTINS, MATH_BUILTINS, FunctionRegistry
+from expr_calc.lexer import Lexer
+from expr_calc.token import Token, TokenType
+from expr_calc.workspace import Workspace
+
+
+SOURCES = [
+    "sqrt(2)",
+    "-sqrt(x) ^ 2",
+    "max(x, 1, -x) * ln(y)",
+    "min(x) + abs(-3) - exp(ln(y))",
+    "log(1000) + max((1 + 2) * 3, y ^ 2, 4)",
+    "sqrt(sqrt(16)) % 3",
+]
+
+
+def test_lex_calls():
+    assert Lexer().lex("f (1, -x)") == [
+        Token(TokenType.FUNCTION, "f"),
+        Token(TokenType.NUMBER, 1),
+        Token(TokenType.COMMA, ","),
+        Token(TokenType.UNARY_OP, "-"),
+        Token(TokenType.IDENTIFIER, "x"),
+        Token(TokenType.R_PAREN, ")"),
+    ]
+
+
+def test_parse_calls():
+    tree = parse_tokens(Lexer.scan("max(1, 2 + x) * 3"))
+    call = tree.children[0]
+    assert call.node.type_ is TokenType.FUNCTION
+    assert call.node.val == BUILTINS.resolve("max", 2) and call.node.val.arity == 2
+    assert [child.node.val for child in call.children] == [1, "+"]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+@pytest.mark.parametrize("optimize", [True, False])
+def test_evaluators_agree(source, optimize):
+    variables = {"x": Decimal("2.25"), "y": 5}
+    calc: Calc = Calc(source, optimize=optimize)
+    expected = calc.parse().eval(variables)
+    assert calc.eval(variables) == expected
+    assert calc.compile_native()(variables) == expected
+    assert calc.eval_stream([source[:5], source[5:]], variables) == expected
+    assert eval_dag(HashConser().build(calc.tree), variables) == expected
+
+
+@pytest.mark.parametrize("backend, expected", [
+    ("decimal", Decimal(2).sqrt() + Decimal(3).ln()),
+    ("float", math.sqrt(2) + math.log(3)),
+    ("int", math.sqrt(2) + math.log(3)),
+    ("fraction", math.sqrt(2) + math.log(3)),
+])
+def test_backends(backend, expected):
+    assert Calc("sqrt(2) + ln(x)", backend=backend).eval({"x": 3}) == expected
+
+
+def test_decimal_precision():
+    assert str(Calc("sqrt(2)", precision=5).eval()) == "1.4142"
+    assert Calc("max(1.50, x)").eval({"x": Fraction(1, 2)}) == Decimal("1.50")
+    with pytest.raises(InvalidOperation):
+        Calc("ln(-1)").eval()
+
+
+@pytest.mark.parametrize("source, error", [
+    ("f(1)", UndefinedFunction),
+    ("sqrt()", TokenError),
+    ("sqrt(1, 2)", TokenError),
+    ("max()", TokenError),
+    ("max(1 2)", TokenError),
+    ("max(1,)", TokenError),
+    ("max(, 1)", TokenError),
+    ("max(1, 2 3)", TokenError),
+    ("1, 2", TokenError),
+    ("(1, 2)", TokenError),
+    ("sqrt(4", TokenError),
+    ("sqrt 4)", TokenError),
+])
+def test_call_errors(source, error):
+    with pytest.raises(error):
+        Calc(source).eval()
+
+
+def test_register():
+    calc: Calc = Calc()
+    calc.functions.register("hypot", lambda a, b: (a * a + b * b).sqrt(), arity=2, pure=True)
+    calc.functions.register("zero", lambda: Decimal(0), arity=0)
+    assert calc.eval_stream("hypot(3, 4) + zero()") == 5
+    # functions are registered on a copy of the built-in ones
+    assert "hypot" not in BUILTINS and "hypot" not in Calc().functions
+
+    with pytest.raises(ValueError):
+        calc.functions.register("hypot", abs)
+    with pytest.raises(ValueError):
+        calc.functions.register("2x", abs)
+    with pytest.raises(ValueError):
+        calc.functions.register("now", abs, memoize=True)
+
+
+def test_pure_calls_are_folded():
+    calls = []
+
+    def double(x):
+        calls.append(x)
+        return x * 2
+
+    functions = FunctionRegistry(BUILTINS)
+    functions.register("double", double, pure=True)
+    functions.register("noisy", double)
+    calc: Calc = Calc(functions=functions)
+    assert len(calc.compile("double(3) + sqrt(4) + x")) == 3
+    assert len(calc.compile("noisy(3)")) == 2
+    assert calls == [3]
+
+
+def test_impure_calls_are_not_shared():
+    counter = iter(range(100))
+    functions = FunctionRegistry()
+    functions.register("tick", lambda: Decimal(next(counter)), arity=0)
+    functions.register("twice", lambda x: x * 2, pure=True)
+    calc: Calc = Calc(functions=functions)
+    assert calc.eval_stream("tick() - tick()") == -1
+    assert calc.compile("tick() - tick()").run() == -1
+    assert calc.compile("twice(x) + twice(x)").temps == 1
+
+
+def test_memo():
+    functions = FunctionRegistry()
+    calls = []
+    slow = functions.register("slow", lambda x: calls.append(x) or x.exp(), pure=True, memoize=True, memo_size=2)
+    calc: Calc = Calc("slow(x) + slow(y)", optimize=False, functions=functions)
+
+    assert calc.eval({"x": Decimal(1), "y": Decimal(1)}) == 2 * Decimal(1).exp()
+    # equal Decimals with another exponent are other arguments
+    calc.eval({"x": Decimal(1), "y": Decimal("1.0")})
+    assert calls == [Decimal(1), Decimal("1.0")]
+    assert len(slow.memo) == 2
+
+    # results depend on the context, new ones evict the least recently used
+    with localcontext() as context:
+        context.prec = 5
+        assert str(calc.eval({"x": Decimal(1), "y": Decimal(2)})) == "10.107"
+    assert len(calls) == 4 and len(slow.memo) == 2
+    calc.eval({"x": Decimal(1), "y": Decimal(1)})
+    assert len(calls) == 5
+
+    # a hit keeps a result, the other one is evicted by the next miss
+    calc.eval({"x": Decimal(3), "y": Decimal(1)})
+    calc.eval({"x": Decimal(1), "y": Decimal(4)})
+    assert calls[5:] == [Decimal(3), Decimal(4)]
+    calc.eval({"x": Decimal(1), "y": Decimal(3)})
+    assert len(calls) == 8
+
+
+def test_memo_keeps_none():
+    calls = []
+    functions = FunctionRegistry()
+    functions.register("log", lambda x: calls.append(x), pure=True, memoize=True)
+    calc: Calc = Calc("log(x)", optimize=False, functions=functions)
+    assert calc.eval({"x": 1}) is None and calc.eval({"x": 1}) is None
+    assert calls == [1]
+
+
+def test_builtins_per_backend():
+    assert Calc().functions["sqrt"] == BUILTINS["sqrt"]
+    assert Calc(backend="float").functions["sqrt"] == MATH_BUILTINS["sqrt"]
+
+
+def test_workspace_calls():
+    sheet = Workspace()
+    sheet.set("x", Decimal(16))
+    sheet.define("root", "sqrt(x) + max(x, 1)")
+    assert sheet.get("root") == 20
+    sheet.set("x", Decimal(4))
+    assert sheet.get("root") == 6
+
+
+def test_expression_api():
+    assert evaluate("sqrt(x)", {"x": 9}) == 3
+    functions = FunctionRegistry(BUILTINS)
+    functions.register("cube", lambda x: x ** 3, pure=True)
+    assert compile_expression("cube(x) + 1", functions=functions)({"x": 2}) == 9
+    assert evaluate("cube(2)", functions=functions) == 8
+    with pytest.raises(UndefinedFunction):
+        evaluate("cube(2)")
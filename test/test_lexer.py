@@ -1,6 +1,12 @@
+import pickle
+
 import pytest
 
+from decimal import Decimal
+
 from expr_calc.calc import Calc
+from expr_calc.errors import ExcessiveDotError, TokenError
+from expr_calc.lexer import Lexer
 from expr_calc.token import Token, TokenType
 
 
@@ -51,8 +57,65 @@ from expr_calc.token import Token, TokenType
         Token(TokenType.NUMBER, 2),
         Token(TokenType.R_PAREN, ")"),
         Token(TokenType.R_PAREN, ")")
+    ]),
+    ("rate*x1 - -_y", [
+        Token(TokenType.IDENTIFIER, "rate"),
+        Token(TokenType.BINARY_OP, "*"),
+        Token(TokenType.IDENTIFIER, "x1"),
+        Token(TokenType.BINARY_OP, "-"),
+        Token(TokenType.UNARY_OP, "-"),
+        Token(TokenType.IDENTIFIER, "_y")
     ])
 ])
 def test_lex(source, expected_tokens):
     calc: Calc = Calc()
     assert calc.lex(source) == expected_tokens
+
+
+def test_scan_is_lazy():
+    tokens = Lexer.scan("12.5 * (3 - 4) $")
+    assert next(tokens) == Token(TokenType.NUMBER, Decimal("12.5"))
+    assert next(tokens) == Token(TokenType.BINARY_OP, "*")
+    with pytest.raises(TokenError):
+        list(tokens)
+
+
+@pytest.mark.parametrize("source, expected_tokens", [
+    (".5", [Token(TokenType.NUMBER, Decimal("0.5"))]),
+    ("(1)-2", [
+        Token(TokenType.L_PAREN, "("),
+        Token(TokenType.NUMBER, 1),
+        Token(TokenType.R_PAREN, ")"),
+        Token(TokenType.BINARY_OP, "-"),
+        Token(TokenType.NUMBER, 2)
+    ]),
+    ("1\t+\n2", [
+        Token(TokenType.NUMBER, 1),
+        Token(TokenType.BINARY_OP, "+"),
+        Token(TokenType.NUMBER, 2)
+    ]),
+])
+def test_scan(source, expected_tokens):
+    assert list(Lexer.scan(source)) == expected_tokens
+
+
+@pytest.mark.parametrize("source", ["1.2.3", "1..2"])
+def test_excessive_dots(source):
+    with pytest.raises(ExcessiveDotError):
+        list(Lexer.scan(source))
+
+
+def test_operator_tokens_are_interned():
+    first, second = Lexer().lex("-1 - -2 * (3)"), Lexer().lex("-4 - -5 * (6)")
+    for a, b in zip(first, second):
+        if a.type_ is not TokenType.NUMBER:
+            assert a is b
+
+
+def test_tokens_are_values():
+    token = Token(TokenType.NUMBER, Decimal("1.5"))
+    assert token == Token(TokenType.NUMBER, Decimal("1.5")) != Token(TokenType.IDENTIFIER, "x")
+    assert hash(token) == hash(Token(TokenType.NUMBER, Decimal("1.5")))
+    assert pickle.loads(pickle.dumps(token)) == token
+    with pytest.raises(AttributeError):
+        token.val = Decimal(2)
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.errors import UndefinedVariable
+from expr_calc.native import compile_native
+
+
+@pytest.mark.parametrize("backend", ["decimal", "float", "int", "fraction"])
+@pytest.mark.parametrize("expression", [
+    "1 + 1",
+    "-1500 / 2000",
+    "34 % -5",
+    "-34 % 5",
+    "123 ^ 4",
+    "-2 ^ 2",
+    "(-1) ^ -2",
+    "2 ^ 3 ^ 2",
+    "1---+---2^-((+2))",
+    "(x + y) ^ 2 - (x + y) * 3",
+    "x * 1.50 + 2.0 * y - 2 * y",
+])
+def test_native_matches_tree(backend, expression):
+    calc: Calc = Calc(backend=backend)
+    variables = {"x": calc.backend.literal("1.5"), "y": calc.backend.literal("-4")}
+    tree = calc.parse(expression)
+    expected = tree.eval(variables, calc.backend)
+
+    native = calc.compile_native(expression)
+    assert native(variables) == expected
+    assert type(native(variables)) is type(expected)
+    assert compile_native(tree, calc.backend)(variables) == expected
+
+
+def test_native_decimal_operators_are_inlined():
+    native = Calc().compile_native("x / 2 + 3 - -x * 2.5")
+    assert "_f" not in native.source
+    assert "/" in native.source and "*" in native.source
+
+
+def test_native_powmod_is_fused():
+    calc: Calc = Calc()
+    native = calc.compile_native("x ^ y % 1000 + 1")
+    assert "**" not in native.source and "%" not in native.source
+    assert native({"x": 7, "y": 10 ** 20}) == pow(7, 10 ** 20, 1000) + 1
+    assert native({"x": Decimal("1.5"), "y": 2}) == calc.parse().eval({"x": Decimal("1.5"), "y": 2})
+
+
+def test_native_precision():
+    calc: Calc = Calc("1 / x", precision=5)
+    assert calc.compile_native()({"x": 3}) == calc.eval({"x": 3}) == Decimal("0.33333")
+
+
+@pytest.mark.parametrize("expression", ["9" * 400 + " + x", "x - " + "9" * 400, "(" + "9" * 400 + " - " + "9" * 400 + ") * x"])
+def test_native_non_finite_constants(expression):
+    # inf and nan are no Python literals, they are bound like Decimals
+    calc: Calc = Calc(backend="float")
+    expected = calc.compile(expression).run({"x": 1.0})
+    result = calc.compile_native(expression)({"x": 1.0})
+    assert repr(result) == repr(expected)
+
+
+def test_native_identifiers_are_renamed():
+    native = Calc().compile_native("if + None * lambda")
+    assert native({"if": 1, "None": 2, "lambda": 3}) == 7
+    with pytest.raises(UndefinedVariable):
+        native({"if": 1})
+
+
+def test_native_deep_tree():
+    calc: Calc = Calc(cache_size=0)
+    source = "(" * 10_000 + "-x" + ")" * 10_000 + " + 1" * 10_000
+    assert calc.compile_native(source)({"x": 5}) == 9_995
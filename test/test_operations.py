@@ -1,8 +1,11 @@
 import pytest
 import math
 
+from expr_calc import operators
 from expr_calc.calc import Calc
-from decimal import Decimal
+from expr_calc.dag import HashConser, eval_dag
+from expr_calc.workspace import Workspace
+from decimal import Context, Decimal, DecimalException, DivisionByZero, InvalidOperation, localcontext
 
 
 @pytest.mark.parametrize("expression, result", [
@@ -95,3 +98,146 @@ def test_multiplication(expression, result):
 def test_division(expression, result):
     calc: Calc = Calc(expression)
     math.isclose(calc.eval(), Decimal(result))
+
+
+@pytest.mark.parametrize("expression, result", [
+    ("5 - 3 - 1", "1"),
+    ("8 / 4 / 2", "1"),
+    ("2 ^ 3 ^ 2", "512"),
+    ("1 + 2 * 3 - 4", "3"),
+    ("-2 ^ 2", "-4"),
+    ("-2 * 3", "-6"),
+    ("-(1 + 2) - 3", "-6"),
+    ("4 ^ 1/2", "2"),
+])
+def test_precedence_and_associativity(expression, result):
+    calc: Calc = Calc(expression)
+    assert calc.eval() == Decimal(result)
+
+
+@pytest.mark.parametrize("expression, result", [
+    ("123 ^ 40", str(123 ** 40)),
+    ("(-3) ^ 101", str((-3) ** 101)),
+    ("10 ^ 0", "1"),
+    ("2 ^ -2", "0.25"),
+    ("1.5 ^ 2", "2.25"),
+])
+def test_exact_power(expression, result):
+    calc: Calc = Calc(expression)
+    assert calc.eval() == Decimal(result)
+    assert str(calc.eval()) == str(Decimal(result))
+
+
+@pytest.mark.parametrize("expression", [
+    "x ^ 40 % 7",
+    "x ^ 3 % -5",
+    "(-x) ^ 3 % 5",
+    "(-x) ^ 2 % 5",
+    "(-x) ^ 3 % x",
+    "x ^ 0 % 5",
+    "1.5 ^ 2 % 1",
+    "x ^ 2.0 % 7",
+])
+def test_powmod_matches_power_then_mod(expression):
+    fused: Calc = Calc(expression)
+    unfused: Calc = Calc(expression.replace("%", "% (") + ")", optimize=False)
+    for x in ("123", "5", "2"):
+        variables = {"x": Decimal(x)}
+        assert str(fused.eval(variables)) == str(unfused.eval(variables))
+
+
+def test_powmod_skips_the_power():
+    calc: Calc = Calc("7 ^ x % 1000003")
+    assert calc.eval({"x": Decimal(10 ** 30)}) == pow(7, 10 ** 30, 1000003)
+    assert Calc("7 ^ 123456789 % 1000003").eval() == pow(7, 123456789, 1000003)
+
+
+@pytest.mark.parametrize("infix, postfix", [
+    ("x ^ 50000 % 1000003", "x 50000 ^ 1000003 %"),
+    ("x ^ 50000 % 1000003 + 0 * x ^ 50000", "x 50000 ^ 1000003 % 0 x 50000 ^ * +"),
+    ("x ^ 123456789 % 1000003", "x 123456789 ^ 1000003 %"),
+    ("-(x ^ 50000 % 1000003) + (x ^ 2) ^ 2 % 1000", "x 50000 ^ 1000003 % ~ x 2 ^ 2 ^ 1000 % +"),
+])
+def test_powmod_on_every_path(infix, postfix):
+    variables = {"x": Decimal(7)}
+    calc: Calc = Calc(infix)
+    expected = calc.eval(variables)
+    tree = calc.parse()
+    workspace = Workspace()
+    workspace.set("x", "7")
+    workspace.define("y", infix)
+
+    assert Calc(infix, optimize=False).eval(variables) == expected
+    assert calc.compile_native()(variables) == expected
+    assert tree.eval(variables) == expected
+    assert eval_dag(HashConser().build(tree), variables) == expected
+    assert calc.eval_stream(infix, variables) == expected
+    assert calc.eval_postfix(postfix, variables) == expected
+    assert workspace["y"] == expected
+
+
+@pytest.mark.parametrize("infix, postfix, error", [
+    # x ^ 0.5 fails first in postorder, before y % y makes x / 0 fail
+    ("(x ^ 0.5 / (y - x / (y % y))) + ((x / 3) * (y - x)) ^ -1",
+     "x 0.5 ^ y x y y % / - / x 3 / y x - * 1 ~ ^ +", InvalidOperation),
+    ("x ^ 0.5 + y ^ 0.5", "x 0.5 ^ y 0.5 ^ +", InvalidOperation),
+    ("x ^ 0.5 + z", "x 0.5 ^ z +", InvalidOperation),
+    # a fused power is never computed, so its modulus fails first
+    ("x ^ 0.5 % (y / 0)", "x 0.5 ^ y 0 / %", DivisionByZero),
+    ("x ^ 3 % 5 + 1 / 0", "x 3 ^ 5 % 1 0 / +", DivisionByZero),
+])
+def test_errors_on_every_path(infix, postfix, error):
+    variables = {"x": Decimal(-7), "y": Decimal("3.5")}
+    calc: Calc = Calc(infix)
+    for evaluate in (calc.eval, Calc(infix, optimize=False).eval, calc.parse().eval,
+                     lambda variables: calc.eval_stream(infix, variables),
+                     lambda variables: calc.eval_postfix(postfix, variables)):
+        with pytest.raises(error):
+            evaluate(variables)
+
+
+def as_tuple_exact_int(a):
+    # definition of operators.exact_int it has to agree with
+    if type(a) is Decimal:
+        return int(a) if a.as_tuple().exponent == 0 else None
+    return a if type(a) is int else None
+
+
+def int_mod(a, b):
+    # remainder computed with ints whenever both are plain integers,
+    # zero dividends are left to Decimal, which keeps their sign
+    dividend, divisor = as_tuple_exact_int(a), as_tuple_exact_int(b)
+    if dividend and divisor:
+        remainder = abs(dividend) % abs(divisor)
+        return Decimal(-remainder if remainder else "-0") if dividend < 0 else Decimal(remainder)
+    return a % b
+
+
+def outcome(func, *args):
+    """Result, or raised exception, and the flags it set"""
+    with localcontext() as context:
+        context.clear_flags()
+        try:
+            result = str(func(*args))
+        except DecimalException as error:
+            result = type(error)
+        return result, {signal for signal, raised in context.flags.items() if raised}
+
+
+@pytest.mark.parametrize("value", [
+    Decimal("123"), Decimal("-0"), Decimal("123.0"), Decimal("1.23E+2"), Decimal("1E+1"),
+    Decimal("12.5"), Decimal("NaN"), Decimal("sNaN"), Decimal("-Infinity"), 7, 7.0,
+])
+def test_exact_int(value):
+    assert operators.exact_int(value) == as_tuple_exact_int(value)
+
+
+@pytest.mark.parametrize("context", [Context(prec=28), Context(prec=3), Context(prec=5, Emax=3, clamp=1)])
+def test_mod_matches_int_remainder(context):
+    values = [Decimal(value) for value in ("7", "-7", "0", "-0", "3", "-98765", "1E+3", "2.5", "-0.003",
+                                           "1" + "0" * 40, "99999", "NaN", "Infinity")] + [5]
+    with localcontext(context):
+        for a in values:
+            for b in values:
+                assert outcome(operators.mod, a, b) == outcome(int_mod, a, b), (a, b)
+    assert str(operators.mod(Decimal("-0"), Decimal(7))) == str(Calc("x % 7").eval({"x": Decimal("-0")})) == "-0"
@@ -0,0 +1,70 @@
+import pytest
+
+from decimal import Decimal, DivisionByZero, localcontext
+
+from expr_calc.calc import Calc
+from expr_calc.optimizer import optimize
+
+
+@pytest.mark.parametrize("expression, removed", [
+    ("2 * 3 + x", 2),
+    ("-(4 ^ 0.5) * x", 3),
+    ("(x + y) * 1", 2),
+    ("1 * (x - y) / 1 ^ 1", 6),
+    ("--x", 1),
+    ("---x", 1),
+    ("x * 1", 0),      # x may need rounding, x * 1 would round it
+    ("x + 0", 0),      # addition moves the exponent of x
+    ("(x - x) ^ 1", 0),  # 0.0 ^ 1 is 0
+    ("7 ^ 123456789 % 1000003", 4),
+])
+def test_nodes_removed(expression, removed):
+    calc: Calc = Calc()
+    assert calc.compile(expression).nodes_removed == removed
+
+
+@pytest.mark.parametrize("expression", [
+    "2 * 3 + x",
+    "(x + y) * 1",
+    "1 * (x * y) ^ 1",
+    "--x",
+    "--(x * y)",
+    "++x - 0.50 * 2",
+    "(x - x) * 1",
+    "(x - x) ^ 1",
+    "x ^ 3 % 7 * y",
+    "(-x) ^ 3 % (y + 1)",
+])
+@pytest.mark.parametrize("x, y", [
+    ("1.5", "2"),
+    ("-0", "0"),
+    ("1E+2", "-3.25"),
+    ("1.2345678901234567890123456789012345", "7"),
+    ("0.5", "-0.0"),
+])
+def test_bit_identical(expression, x, y):
+    variables = {"x": Decimal(x), "y": Decimal(y)}
+    optimised = Calc(optimize=True).compile(expression).run(variables)
+    plain = Calc(optimize=False).compile(expression).run(variables)
+    assert optimised.as_tuple() == plain.as_tuple()
+
+
+def test_folding_errors_are_deferred():
+    calc: Calc = Calc("x + 1 / 0")
+    program = calc.compile()
+    with pytest.raises(DivisionByZero):
+        program.run({"x": 1})
+
+
+def test_folding_uses_active_context():
+    calc: Calc = Calc("1 / 3")
+    with localcontext() as context:
+        context.prec = 5
+        assert calc.eval() == Decimal("0.33333")
+    assert calc.eval() == Decimal(1) / Decimal(3)
+
+
+def test_input_tree_is_unchanged():
+    tree = Calc(optimize=False).parse("(1 + 2) * x")
+    optimised, removed = optimize(tree)
+    assert removed == 2 and len(tree.traverse()) == 5
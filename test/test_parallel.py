@@ -0,0 +1,65 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+from expr_calc.batch import run_batch
+from expr_calc.errors import BatchError
+from expr_calc.parallel import chunked, run_parallel
+
+
+def test_chunked():
+    assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunked([], 3)) == []
+
+
+def test_run_parallel_keeps_order(tmp_path):
+    expressions = [f"{i} * 2" for i in range(100)] + ["", "1 / 0", "x"]
+    path = tmp_path / "expressions.txt"
+    path.write_text("\n".join(expressions) + "\n")
+    output = io.StringIO()
+
+    report = run_parallel(str(path), output, workers=2, chunk_size=7)
+    assert output.getvalue().splitlines() == [str(i * 2) for i in range(100)] + [
+        "", "error: DivisionByZero", "error: Variable x is not defined"
+    ]
+    assert report.expressions == 103
+    assert sum(stats.chunks for stats in report.workers.values()) == 15
+    assert 1 <= len(report.workers) <= 2
+
+
+def test_run_parallel_fail_fast(tmp_path):
+    path = tmp_path / "expressions.txt"
+    path.write_text("1\n2\n3\n4 +\n5\n")
+    output = io.StringIO()
+
+    with pytest.raises(BatchError, match="line 4"):
+        run_parallel(str(path), output, workers=2, chunk_size=2, fail_fast=True)
+    # the results before the failing line are written, as run_batch does
+    assert output.getvalue() == "1\n2\n3\n"
+
+    batch_output = io.StringIO()
+    with pytest.raises(BatchError, match="line 4"):
+        run_batch(str(path), batch_output, fail_fast=True)
+    assert batch_output.getvalue() == output.getvalue()
+
+
+def test_run_parallel_backend(tmp_path):
+    path = tmp_path / "expressions.txt"
+    path.write_text("1 / 3\n")
+    output = io.StringIO()
+
+    run_parallel(str(path), output, workers=1, backend="fraction")
+    assert output.getvalue() == "1/3\n"
+
+
+def test_cli_workers_report(tmp_path):
+    path = tmp_path / "expressions.txt"
+    path.write_text("1 + 2\n3 * 4\n")
+    completed = subprocess.run(
+        [sys.executable, "-m", "expr_calc", str(path), "--workers", "2", "--report"],
+        capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.splitlines() == ["3", "12"]
+    assert completed.stderr.startswith("2 expressions in")
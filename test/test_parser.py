@@ -1,6 +1,9 @@
 import pytest
 
+from decimal import Decimal
+
 from expr_calc.calc import Calc
+from expr_calc.errors import TokenError
 from expr_calc.token import Token, TokenType
 from expr_calc.tree import Tree
 
@@ -50,3 +53,31 @@ from expr_calc.tree import Tree
 def test_parse(source, expected_shunted_tokens):
     calc: Calc = Calc()
     assert calc.parse(source) == expected_shunted_tokens
+
+
+@pytest.mark.parametrize("source, result", [
+    ("1+" * 499_999 + "1", Decimal(500_000)),    # 10^6 tokens, long flat chain
+    ("1^" * 499_999 + "1", Decimal(1)),          # 10^6 tokens, right associated chain
+    ("(" * 100_000 + "7" + ")" * 100_000, Decimal(7)),     # nesting depth 10^5
+    ("-(" * 100_000 + "7" + ")" * 100_000, Decimal(7)),
+], ids=["long", "right-associated", "nested", "nested-unary"])
+def test_parse_without_recursion_limit(source, result):
+    calc: Calc = Calc(cache_size=0, optimize=False)
+    program = calc.compile(source)
+    assert program.run() == calc.tree.eval() == result
+    assert len(calc.tree.traverse()) == len(program)
+    assert Calc(cache_size=0).compile(source).run() == result
+
+
+@pytest.mark.parametrize("source", ["(1 + 2", "1 + 2)", "1 +", "2 3"])
+def test_parse_errors(source):
+    calc: Calc = Calc()
+    with pytest.raises(TokenError):
+        calc.parse(source)
+
+
+def test_tree_children_are_compact():
+    tree = Calc().parse("-1 + 2")
+    assert not hasattr(tree, "__dict__")
+    assert isinstance(tree.children, tuple) and len(tree.children) == 2
+    assert tree.children[0].children[0].children == ()
@@ -0,0 +1,68 @@
+import subprocess
+import sys
+import tracemalloc
+from decimal import Decimal
+
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.errors import ExcessiveDotError, NoProgramLoaded, TokenError
+
+
+@pytest.mark.parametrize("postfix, infix", [
+    ("1 2 +", "1 + 2"),
+    ("5 3 - 1 -", "5 - 3 - 1"),
+    ("2 3 2 ^ ^", "2 ^ 3 ^ 2"),
+    ("2 2 ^ ~", "-2 ^ 2"),
+    ("2 ~ 2 ^", "(-2) ^ 2"),
+    ("1 2 3 * + 4 -", "1 + 2 * 3 - 4"),
+    ("34 5 %", "34 % 5"),
+    ("1 3 / 3 *", "1 / 3 * 3"),
+    ("1.123456789012345678901234567890 ~ ~", "+1.123456789012345678901234567890"),
+    ("x 2 * y ~ -", "x * 2 - -y"),
+])
+def test_postfix_matches_infix(postfix, infix):
+    variables = {"x": Decimal("1.5"), "y": Decimal(4)}
+    calc: Calc = Calc()
+    assert calc.eval_postfix(postfix, variables) == Calc(infix).eval(variables)
+
+
+@pytest.mark.parametrize("backend", ["float", "int", "fraction"])
+def test_postfix_backends(backend):
+    assert Calc(backend=backend).eval_postfix("1 3 / 2 ^") == Calc("(1 / 3) ^ 2", backend=backend).eval()
+
+
+@pytest.mark.parametrize("source, error", [
+    ("", NoProgramLoaded),
+    ("1 +", TokenError),
+    ("~", TokenError),
+    ("-1 2 +", TokenError),     # signs are always binary
+    ("1 2", TokenError),
+    ("( 1 2 + )", TokenError),
+    ("1.2.3 4 +", ExcessiveDotError),
+])
+def test_postfix_errors(source, error):
+    with pytest.raises(error):
+        Calc().eval_postfix(source)
+
+
+def test_postfix_memory_is_bounded_by_depth():
+    def peak(program):
+        calc: Calc = Calc()
+        tracemalloc.start()
+        calc.eval_postfix(program)
+        _, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak_size
+
+    short, long = "1" + " 1 +" * 1_000, "1" + " 1 +" * 100_000
+    assert Calc().eval_postfix(long) == 100_001
+    assert peak(long) < 2 * peak(short)
+
+
+def test_cli_postfix():
+    completed = subprocess.run(
+        [sys.executable, "-m", "expr_calc", "-", "--postfix"],
+        input="1 2 + 3 *\n2 ~ 3 ^\n1 +\n", capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.splitlines() == ["9", "-8", "error: Operator + is missing an operand"]
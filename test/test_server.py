@@ -0,0 +1,73 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from expr_calc.loadgen import run_load
+from expr_calc.server import CalcServer
+
+
+async def exchange(server: CalcServer, lines):
+    """Pipeline all lines on one connection, then read every response"""
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(b"".join(line + b"\n" for line in lines))
+        await writer.drain()
+        writer.write_eof()
+        responses = []
+        async for line in reader:
+            responses.append(json.loads(line))
+        writer.close()
+        return responses
+    finally:
+        server.close()
+
+
+def request(request_id, expr, **variables):
+    return json.dumps({"id": request_id, "expr": expr, "vars": variables}).encode()
+
+
+@pytest.mark.parametrize("offload_threshold", [None, 0, 10])
+def test_pipelined_responses_in_order(offload_threshold):
+    lines = [request(i, f"{i} * x + 1", x="0.5") for i in range(50)]
+    with ThreadPoolExecutor(4) as executor:
+        server = CalcServer(port=0, max_concurrency=3, max_pipeline=4,
+                            executor=executor, offload_threshold=offload_threshold)
+        responses = asyncio.run(exchange(server, lines))
+    assert responses == [{"id": i, "result": str(i * 0.5 + 1)} for i in range(50)]
+
+
+def test_errors_are_answered():
+    lines = [b"not json", b"[1]", request(1, "1 / 0"), request(2, "y + 1"), request(3, "1 +"), request(4, "2")]
+    responses = asyncio.run(exchange(CalcServer(port=0), lines))
+    assert responses == [
+        {"id": None, "error": "Expecting value: line 1 column 1 (char 0)"},
+        {"id": None, "error": "Request must be a JSON object"},
+        {"id": 1, "error": "DivisionByZero"},
+        {"id": 2, "error": "Variable y is not defined"},
+        {"id": 3, "error": "Operator + is missing an operand"},
+        {"id": 4, "result": "2"},
+    ]
+
+
+def test_line_limit():
+    lines = [request(1, "1 + 1"), request(2, "1+" * 100 + "1")]
+    responses = asyncio.run(exchange(CalcServer(port=0, line_limit=64), lines))
+    assert responses == [{"id": 1, "result": "2"}, {"id": None, "error": "Request line too long"}]
+
+
+def test_load_generator():
+    async def load():
+        server = CalcServer(port=0)
+        await server.start()
+        try:
+            return await run_load(server.host, server.port, connections=3, requests=200, pipeline=8)
+        finally:
+            server.close()
+
+    report = asyncio.run(load())
+    assert report.requests == 600
+    assert report.errors == 0
+    assert 0 < report.percentile(0.5) <= report.percentile(0.99)
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.errors import ExcessiveDotError, NoProgramLoaded, TokenError, UndefinedFunction
+from expr_calc.lexer import Lexer
+
+
+@pytest.mark.parametrize("program, shape, literals", [
+    ("12.5 * 3 + 7", "# * # + #", ["12.5", "3", "7"]),
+    ("9.1*44+2", "# * # + #", ["9.1", "44", "2"]),
+    ("-x ^ 2 % 7", "- x ^ # % #", ["2", "7"]),
+    ("max (1, y)", "max( # , y )", ["1"]),
+    ("x y", "x y", []),
+    ("xy", "xy", []),
+    ("   ", "", []),
+])
+def test_shape(program, shape, literals):
+    assert Lexer.shape(program) == (shape, [Decimal(literal) for literal in literals])
+
+
+@pytest.mark.parametrize("program, error", [
+    ("1.2.3", ExcessiveDotError),
+    ("1 $ 2", TokenError),
+])
+def test_shape_errors(program, error):
+    with pytest.raises(error):
+        Lexer.shape(program)
+
+
+@pytest.mark.parametrize("programs", [
+    ["12.5 * 3 + 7", "9.1 * 44 + 2", "0.5*1+1.0"],
+    ["-2 ^ 3 % 5", "-4 ^ 13 % 497", "-1.5 ^ 2 % 0.7"],
+    ["x / 3 - -y", "x / 7 - -y", "x / 0.1 - -y"],
+    ["max(1, x, 2.5) + sqrt(16)", "max(0.5, x, 0) + sqrt(2)"],
+    ["(1 + x) * (1 + x)", "(1 + x) * (2 + x)"],
+])
+@pytest.mark.parametrize("backend", ["decimal", "float"])
+def test_plans_are_shared(programs, backend):
+    variables = {"x": Decimal("2.5"), "y": 4} if backend == "decimal" else {"x": 2.5, "y": 4}
+    calc: Calc = Calc(backend=backend, shape_cache_size=8)
+    plain: Calc = Calc(backend=backend)
+    for program in programs:
+        calc.program = plain.program = program
+        assert calc.eval(variables) == plain.eval(variables)
+
+    info = calc.shapes.info()
+    assert (info.hits, info.misses) == (len(programs) - 1, 1)
+
+
+def test_plan_keeps_first_program():
+    calc: Calc = Calc("12.5 * 3 + 7", shape_cache_size=8)
+    assert calc.eval() == Decimal("44.5")
+    calc.program = "9.1 * 44 + 2"
+    assert calc.eval() == Decimal("402.4")
+    (plan,) = calc.shapes._data.values()
+    assert plan.consts == (Decimal("12.5"), 3, 7)
+
+
+def test_shapes_are_not_confused():
+    calc: Calc = Calc(shape_cache_size=8)
+    for program, expected in [("1 - 2", -1), ("1 -2", -1), ("-1 - 2", -3), ("1 * -2", -2), ("12", 12)]:
+        calc.program = program
+        assert calc.eval() == expected
+    with pytest.raises(TokenError):
+        calc.program = "1 2"
+        calc.eval()
+    assert calc.shapes.info().misses == 5
+
+
+def test_errors_are_not_cached():
+    calc: Calc = Calc(shape_cache_size=8)
+    for program, error in [(" ", NoProgramLoaded), ("1 +", TokenError), ("f(1)", UndefinedFunction)]:
+        calc.program = program
+        with pytest.raises(error):
+            calc.eval()
+    assert len(calc.shapes) == 0
+
+
+def test_eviction_and_stats():
+    calc: Calc = Calc(shape_cache_size=2, instrument=True)
+    # 3 + 4 refreshes the shape of 1 + 2, so 1 - 2 evicts 1 * 2
+    for program in ["1 + 2", "1 * 2", "3 + 4", "1 - 2", "5 + 6"]:
+        calc.program = program
+        calc.eval()
+
+    info = calc.shapes.info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (2, 3, 1, 2)
+    assert calc.stats.evaluations == 5 and calc.stats.cache_hits == 2
+    assert calc.stats.op_counts["+"] == 3
@@ -0,0 +1,142 @@
+import io
+import struct
+import subprocess
+import sys
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.errors import StoreFormatError
+from expr_calc.parallel import run_parallel
+from expr_calc.store import (ExpressionStore, FORMAT_VERSION, HEADER, build_store, decode, encode,
+                             key_hash, write_store)
+
+
+EXPRESSIONS = [
+    "1 + 2 * 3",
+    "-(x - 1.50) ^ 2 % 7",
+    "--+-y / 0.5",
+    "2 ^ 3 ^ 2",
+    "price * (1 + rate) ^ years",
+    "1.",
+    "max(x, 1) + sqrt(2)",
+]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    source = tmp_path / "formulas.txt"
+    source.write_text("\n".join(EXPRESSIONS + ["", "1 +", "1 + 2  *  3"]) + "\n")
+    path = str(tmp_path / "formulas.store")
+    stored, errors = build_store(str(source), path)
+    assert stored == len(EXPRESSIONS)
+    assert errors == ["line 9: Operator + is missing an operand"]
+    return path
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_record_round_trip(expression):
+    tree = Calc(cache_size=0).parse(expression)
+    key, decoded = decode(encode(expression, tree))
+    assert key == expression and decoded == tree
+
+
+def test_store_matches_parser(store_path):
+    with ExpressionStore(store_path) as store:
+        assert len(store) == len(EXPRESSIONS)
+        for expression in EXPRESSIONS:
+            assert store.get(expression) == Calc(cache_size=0).parse(expression)
+        assert store.get("1 + 2") is None
+        assert (store.hits, store.misses) == (len(EXPRESSIONS), 1)
+
+
+def test_store_lookups(store_path):
+    with ExpressionStore(store_path) as store:
+        assert " 1 +  2 * 3 " in store and "1 + 2" not in store
+        key, tree = store.get_hash(key_hash("2 ^ 3 ^ 2"))
+        assert key == "2 ^ 3 ^ 2" and tree.eval() == 512
+        assert store.get_hash(0) is None
+
+
+def test_store_keeps_literals_as_written(store_path):
+    with ExpressionStore(store_path) as store:
+        assert str(store.get("-(x - 1.50) ^ 2 % 7").eval({"x": Decimal("3.25")})) == "-3.0625"
+        assert store.get("--+-y / 0.5", Fraction).eval({"y": Fraction(1, 3)}) == Fraction(-2, 3)
+
+
+@pytest.mark.parametrize("backend", ["decimal", "float", "int", "fraction"])
+def test_calc_reads_the_store(store_path, backend, monkeypatch):
+    variables = {"x": 3, "y": 2, "price": 100, "rate": 1, "years": 2}
+    expected = [Calc(expression, backend=backend).eval(variables) for expression in EXPRESSIONS]
+
+    calc: Calc = Calc(backend=backend, store=ExpressionStore(store_path))
+    monkeypatch.setattr(calc, "_parse", None)    # the parser must not be needed
+    for expression, result in zip(EXPRESSIONS, expected):
+        calc.program = expression
+        assert calc.eval(variables) == result
+        assert type(calc.eval(variables)) is type(result)
+
+
+def test_calc_parses_missing_expressions(store_path):
+    store = ExpressionStore(store_path)
+    calc: Calc = Calc("4 * 4", store=store)
+    assert calc.eval() == 16 and store.misses == 1
+
+
+def test_many_entries(tmp_path):
+    path = str(tmp_path / "many.store")
+    calc: Calc = Calc(cache_size=0)
+    expressions = [f"x * {i} + {i % 7}" for i in range(5000)]
+    assert write_store(path, ((expression, calc.parse(expression)) for expression in expressions)) == 5000
+
+    with ExpressionStore(path) as store:
+        for i in range(0, 5000, 37):
+            assert store.get(expressions[i]).eval({"x": 2}) == 2 * i + i % 7
+        assert store.get("x * 5000 + 2") is None
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "empty.store")
+    assert write_store(path, []) == 0
+    with ExpressionStore(path) as store:
+        assert len(store) == 0 and store.get("1") is None
+
+
+def test_format_version_is_checked(store_path):
+    with open(store_path, "r+b") as file:
+        magic, version, *rest = HEADER.unpack(file.read(HEADER.size))
+        file.seek(0)
+        file.write(HEADER.pack(magic, FORMAT_VERSION + 1, *rest))
+
+    with pytest.raises(StoreFormatError, match=f"format version {FORMAT_VERSION + 1}"):
+        ExpressionStore(store_path)
+
+
+@pytest.mark.parametrize("content", [b"", b"1 + 2\n" * 10, struct.pack("<8sHHIQ", b"EXPRCALC", FORMAT_VERSION, 0, 10, 24)])
+def test_invalid_files(tmp_path, content):
+    path = tmp_path / "invalid.store"
+    path.write_bytes(content)
+    with pytest.raises(StoreFormatError):
+        ExpressionStore(str(path))
+
+
+def test_run_parallel_with_store(store_path, tmp_path):
+    path = tmp_path / "expressions.txt"
+    path.write_text("1 + 2 * 3\n2 ^ 3 ^ 2\n5 - 1\n")
+    output = io.StringIO()
+    run_parallel(str(path), output, workers=2, chunk_size=1, store=store_path)
+    assert output.getvalue().splitlines() == ["7", "512", "4"]
+
+
+def test_build_tool(tmp_path):
+    source = tmp_path / "formulas.txt"
+    source.write_text("1 + 1\n(2\n")
+    path = tmp_path / "formulas.store"
+    result = subprocess.run([sys.executable, "-m", "expr_calc.store", str(source), str(path)],
+                            capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "line 2: Missing closing parenthesis" in result.stderr
+    assert "1 expressions stored" in result.stderr
+    assert ExpressionStore(str(path)).get("1+1") is None and "1 + 1" in ExpressionStore(str(path))
@@ -0,0 +1,76 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+from expr_calc.calc import Calc, evaluate_tokens
+from expr_calc.backends import get_backend
+from expr_calc.errors import ExcessiveDotError, NoProgramLoaded, TokenError, UndefinedVariable
+from expr_calc.lexer import Lexer
+from expr_calc.stats import DepthList
+
+
+SOURCES = [
+    "1 + 2 * 3",
+    "-(x + 1) ^ 2 % 7 - -x",
+    "2 ^ 3 ^ 2 % 5",
+    "7 ^ 222 % 13 * 2",
+    "1 / 3 + x / 7",
+    "12.75 * (3 - 4.5) / -x",
+    "max(x, -2, 1) * sqrt (4) - abs(-x)",
+]
+
+
+def split(source, size):
+    return [source[start:start + size] for start in range(0, len(source), size)]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 100])
+def test_stream_matches_eval(source, size):
+    variables = {"x": Decimal("1.25")}
+    assert Calc().eval_stream(split(source, size), variables) == Calc(source).eval(variables)
+
+
+@pytest.mark.parametrize("source", SOURCES)
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_scan_stream_matches_scan(source, size):
+    assert list(Lexer.scan_stream(split(source, size))) == list(Lexer.scan(source))
+
+
+@pytest.mark.parametrize("backend", ["float", "int", "fraction"])
+def test_stream_backends(backend):
+    source = "(1 / 3) ^ 2 + 5 ^ 3 % 7"
+    assert Calc(backend=backend).eval_stream(split(source, 2)) == Calc(source, backend=backend).eval()
+
+
+def test_stream_sources():
+    calc: Calc = Calc("1 + 1")
+    assert calc.eval_stream(io.StringIO("2 *\n 3.5")) == calc.eval_stream("2 * 3.5") == 7
+    assert calc.program == "1 + 1"
+
+
+@pytest.mark.parametrize("chunks, error", [
+    ([], NoProgramLoaded),
+    (["  ", " "], NoProgramLoaded),
+    (["1 +", " "], TokenError),
+    (["(1", " + 2"], TokenError),
+    (["1", " 2"], TokenError),
+    (["1.", "2.", "3"], ExcessiveDotError),
+    (["x", "y + 1"], UndefinedVariable),
+])
+def test_stream_errors(chunks, error):
+    with pytest.raises(error):
+        Calc().eval_stream(chunks, {"x": 1})
+
+
+def test_stream_stacks_are_bounded_by_depth():
+    def chunks(terms):
+        yield "0"
+        for term in range(terms):
+            yield f" + {term % 10}.5 * (2 - 1)"
+
+    op_stack, value_stack = DepthList(), DepthList()
+    tokens = Lexer.scan_stream(chunks(100_000))
+    assert evaluate_tokens(tokens, get_backend(), None, op_stack, value_stack) == 500_000
+    assert op_stack.max_depth <= 4 and value_stack.max_depth <= 4
@@ -0,0 +1,58 @@
+import pytest
+
+from expr_calc.calc import Calc
+from expr_calc.errors import UndefinedVariable
+from decimal import Decimal
+
+np = pytest.importorskip("numpy")
+
+
+def test_eval_batch_matches_rows():
+    calc: Calc = Calc()
+    bindings = {"x": np.array([1.0, 2.5, -3.0]), "y": [4, 5, 6]}
+    result = calc.eval_batch(bindings, "x * 2 + y ^ 2")
+
+    expected = [calc.eval({"x": Decimal(str(x)), "y": y}) for x, y in zip(bindings["x"], bindings["y"])]
+    assert result.tolist() == [float(value) for value in expected]
+
+
+def test_eval_batch_remainder_sign():
+    calc: Calc = Calc()
+    assert calc.eval_batch({"x": [-7, 7]}, "x % 3").tolist() == [-1.0, 1.0]
+
+
+@pytest.mark.parametrize("column", [[-3, 2, 5], np.array([Decimal(-3), Decimal(2), Decimal(5)], dtype=object)])
+def test_eval_batch_powmod(column):
+    calc: Calc = Calc()
+    result = calc.eval_batch({"x": column}, "x ^ 3 % 7 + 1")
+    assert [float(value) for value in result] == [-5.0, 2.0, 7.0]
+
+
+def test_eval_batch_decimal_columns():
+    calc: Calc = Calc()
+    column = np.array([Decimal("0.1"), Decimal("0.2")], dtype=object)
+    result = calc.eval_batch({"x": column}, "x + 0.2")
+    assert result.tolist() == [Decimal("0.3"), Decimal("0.4")]
+
+
+def test_eval_batch_broadcasts_constants():
+    calc: Calc = Calc()
+    assert calc.eval_batch({"x": np.zeros(3)}, "x * 0 + 2").tolist() == [2.0, 2.0, 2.0]
+
+
+def test_eval_batch_missing_column():
+    calc: Calc = Calc()
+    with pytest.raises(UndefinedVariable):
+        calc.eval_batch({"x": [1]}, "x + y")
+
+
+@pytest.mark.parametrize("program", ["sqrt(x) + ln(y) * max(x, y, 2)", "min(x) - abs(-y) + log(exp(x))"])
+def test_eval_batch_calls(program):
+    calc: Calc = Calc(program)
+    bindings = {"x": np.array([1.0, 2.5, 4.0]), "y": [4, 5, 6]}
+    expected = [calc.eval({"x": Decimal(str(x)), "y": y}) for x, y in zip(bindings["x"], bindings["y"])]
+    assert calc.eval_batch(bindings) == pytest.approx([float(value) for value in expected])
+
+    exact = {"x": np.array([Decimal(str(x)) for x in bindings["x"]], dtype=object),
+             "y": np.array(bindings["y"], dtype=object)}
+    assert calc.eval_batch(exact).tolist() == expected
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pytest
+
+from expr_calc.errors import CyclicDependency, UndefinedVariable
+from expr_calc.workspace import Workspace
+
+
+@pytest.fixture
+def sheet():
+    workspace = Workspace()
+    workspace.set("price", "2.50")
+    workspace.set("quantity", "4")
+    workspace.set("rate", "0.2")
+    workspace.define("net", "price * quantity")
+    workspace.define("tax", "net * rate")
+    workspace.define("total", "net + tax")
+    workspace.define("report", "(1 + 2 * 3) ^ 2 - total")
+    return workspace
+
+
+def test_values(sheet):
+    assert sheet["total"] == Decimal("12.000")
+    assert sheet.recalculate() == {
+        "price": Decimal("2.50"), "quantity": Decimal("4"), "rate": Decimal("0.2"),
+        "net": Decimal("10.00"), "tax": Decimal("2.000"), "total": Decimal("12.000"),
+        "report": Decimal("37.000"),
+    }
+
+
+def test_only_dirty_path_is_recomputed(sheet):
+    sheet.recalculate()
+    sheet.reset_counters()
+
+    sheet.set("rate", "0.5")
+    assert sheet["report"] == Decimal("34.000")
+    # rate -> tax (2 of 3 nodes), total (2 of 3), report (2 of 9)
+    assert (sheet.recomputed, sheet.reused) == (6, 9)
+
+    sheet.reset_counters()
+    assert sheet["report"] == Decimal("34.000")
+    assert (sheet.recomputed, sheet.reused) == (0, 0)
+
+
+def test_lazy_recompute(sheet):
+    sheet.recalculate()
+    sheet.reset_counters()
+
+    sheet.set("quantity", "2")
+    assert sheet["net"] == Decimal("5.00")
+    assert sheet.recomputed == 2
+    assert sheet.stale == {"tax", "total", "report"}
+
+
+def test_redefine_and_remove(sheet):
+    sheet.define("tax", "0")
+    assert sheet["total"] == Decimal("10.00")
+
+    sheet.remove("price")
+    with pytest.raises(UndefinedVariable):
+        sheet.get("total")
+    sheet.define("price", "3")
+    assert sheet["total"] == Decimal("12")
+
+
+@pytest.mark.parametrize("name, expression, cycle", [
+    ("price", "price + 1", "price -> price"),
+    ("net", "total - tax", "net -> tax -> net"),
+    ("price", "report * 2", "price -> report -> total -> net -> price"),
+])
+def test_cycles(sheet, name, expression, cycle):
+    with pytest.raises(CyclicDependency, match=cycle):
+        sheet.define(name, expression)
+    assert sheet["total"] == Decimal("12.000")